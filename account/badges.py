@@ -0,0 +1,52 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+BADGE_KEY = "account:badges:{}"
+
+
+def badge_counts(user_id):
+    """Return {"cart": units in the cart, "wishlist": products wished} for an account.
+
+    The counts are read from the per-account badge cache, or on a miss from the
+    item_count columns of Cart and Wishlist in a single query.
+    """
+    key = BADGE_KEY.format(user_id)
+    counts = cache.get(key)
+    if counts is None:
+        Account = apps.get_model("account", "Account")
+        Cart = apps.get_model("cart", "Cart")
+        Wishlist = apps.get_model("account", "Wishlist")
+        carts = (
+            Cart.objects.filter(account=OuterRef("pk"))
+            .order_by()
+            .values("account")
+            .annotate(total=Sum("item_count"))
+            .values("total")
+        )
+        wishlist = Wishlist.objects.filter(account=OuterRef("pk")).values("item_count")
+        row = (
+            Account.objects.filter(pk=user_id)
+            .values_list(
+                Coalesce(Subquery(carts, output_field=IntegerField()), 0),
+                Coalesce(Subquery(wishlist), 0),
+            )
+            .first()
+        )
+        counts = dict(zip(("cart", "wishlist"), row or (0, 0)))
+        cache.set(key, counts, settings.BADGE_CACHE_TIMEOUT)
+    return counts
+
+
+def invalidate_badge_counts(user_id):
+    """Drop an account's cached badge counts, now and once the transaction commits.
+
+    A page rendered between the change and the commit could otherwise cache
+    the counts from before the change.
+    """
+    key = BADGE_KEY.format(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
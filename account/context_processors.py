@@ -1,12 +1,8 @@
-from account.models import Wishlist, Account
+from .badges import badge_counts
 
 
 def wishlist_info(request):
     """Get the total count of products inside Wishlist."""
-    try:
-        user = Account.objects.get(username=request.user.username)
-        wishlist = Wishlist.objects.get(account=user)
-        count = wishlist.count()
-    except (Account.DoesNotExist, Wishlist.DoesNotExist):
-        count = 0
-    return {"wishlist_count": count}
+    if not request.user.is_authenticated:
+        return {"wishlist_count": 0}
+    return {"wishlist_count": badge_counts(request.user.pk)["wishlist"]}
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:42
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_count(apps, schema_editor):
+    """Fill the stored counts from the existing wishlist products."""
+    Wishlist = apps.get_model("account", "Wishlist")
+    wished = (
+        Wishlist.product.through.objects.filter(wishlist=models.OuterRef("pk"))
+        .order_by()
+        .values("wishlist")
+        .annotate(total=models.Count("id"))
+        .values("total")
+    )
+    Wishlist.objects.update(item_count=Coalesce(models.Subquery(wished), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("account", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="wishlist",
+            name="item_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="item_count"
+            ),
+        ),
+        migrations.RunPython(backfill_item_count, migrations.RunPython.noop),
+    ]
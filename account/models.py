@@ -1,6 +1,9 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from inventory.models import Product
+from .badges import invalidate_badge_counts
 from django.utils.translation import gettext_lazy as _
 
 
@@ -23,21 +26,64 @@ class Wishlist(models.Model):
 
     product = models.ManyToManyField(Product, blank=True)
     account = models.OneToOneField(Account, on_delete=models.CASCADE)
+    # Number of products wished, kept in step by add(), remove() and clear()
+    item_count = models.PositiveIntegerField(_("item_count"), default=0, editable=False)
 
     def add(self, product: Product):
         """To add a product to the wishlist."""
-        self.product.add(product)
-        self.save()
+        with transaction.atomic():
+            self._lock()
+            self.product.add(product)
+            self._recount()
 
     def remove(self, product: Product):
         """To remove a product from the wishlist."""
-        self.product.remove(product)
-        self.save()
+        with transaction.atomic():
+            self._lock()
+            self.product.remove(product)
+            self._recount()
 
     def clear(self):
         """To clear all products from the wishlist."""
-        self.product.clear()
-        self.save()
+        with transaction.atomic():
+            self._lock()
+            self.product.clear()
+            self._recount()
+
+    def _lock(self):
+        """Lock the wishlist row, so concurrent changes are counted one after the other."""
+        Wishlist.objects.select_for_update().values_list("pk").get(pk=self.pk)
+
+    def _recount(self):
+        """Store the number of wished products in item_count and drop the cached badges."""
+        Wishlist.objects.filter(pk=self.pk).update(item_count=Wishlist._wished())
+        invalidate_badge_counts(self.account_id)
+
+    @classmethod
+    def recount(cls, wishlist_ids):
+        """Lock and recount the given wishlists, dropping their accounts' cached badges.
+
+        For products unwished without add(), remove() or clear(), e.g. by the
+        cascade of a product delete.
+        """
+        with transaction.atomic():
+            wishlists = cls.objects.select_for_update().filter(pk__in=wishlist_ids)
+            account_ids = set(wishlists.values_list("account_id", flat=True))
+            wishlists.update(item_count=cls._wished())
+        for account_id in account_ids:
+            invalidate_badge_counts(account_id)
+
+    @staticmethod
+    def _wished():
+        """Return the expression counting the products in the outer wishlist."""
+        wished = (
+            Wishlist.product.through.objects.filter(wishlist=OuterRef("pk"))
+            .order_by()
+            .values("wishlist")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return Coalesce(Subquery(wished), 0)
 
     def count(self):
         """Returns the number of products in the wishlist."""
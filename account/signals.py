@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from inventory.models import Product
+from .models import Wishlist
+
+
+@receiver(pre_delete, sender=Product)
+def product_wishes_deleting(sender, instance, **kwargs):
+    """Note the wishlists holding a product about to be deleted.
+
+    Its rows in the wishlist table are removed by the cascade without any
+    m2m_changed signal.
+    """
+    instance._wishlist_ids = list(
+        Wishlist.product.through.objects.filter(product=instance).values_list(
+            "wishlist_id", flat=True
+        )
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_wishes_deleted(sender, instance, **kwargs):
+    """Recount the wishlists that lost a product to a product delete."""
+    wishlist_ids = getattr(instance, "_wishlist_ids", None)
+    if wishlist_ids:
+        Wishlist.recount(wishlist_ids)
@@ -76,10 +76,8 @@ def login_submit(request):
             auth_login(request, user)
             cart = get_cart(request)
             session_cart = SessionCart(request)
-            for item in session_cart.items():
-                product = item["product"]
-                quantity = item["quantity"]
-                cart.add(product, quantity=int(quantity))
+            for line in session_cart.items():
+                cart.add(line.product, quantity=line.quantity)
             session_cart.clear()
             return redirect("account:account")
         else:
@@ -98,10 +96,8 @@ def registration(request):
         cart = Cart.objects.create(account=user)
 
         session_cart = SessionCart(request)
-        for item in session_cart.items():
-            product = item["product"]
-            quantity = item["quantity"]
-            cart.add(product, quantity=int(quantity))
+        for line in session_cart.items():
+            cart.add(line.product, quantity=line.quantity)
         session_cart.clear()
 
         return redirect("account:login")
@@ -1,13 +1,16 @@
+from account.badges import badge_counts
 from cart.helpers import get_cart
 
 
 def cart_info(request):
     """
-    Get the total cart count from session or database cart consistently.
+    Get the total cart count from the session or the account's badge counts.
     """
     try:
-        cart = get_cart(request)
-        count = cart.count()
+        if request.user.is_authenticated:
+            count = badge_counts(request.user.pk)["cart"]
+        else:
+            count = get_cart(request).count()
     except Exception:
         count = 0
     return {"cart_count": count}
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from cart.models import StockHold
+
+
+class Command(BaseCommand):
+    help = (
+        "Give back the stock held by checkouts that expired without being paid. "
+        "Run it every minute or so, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Holds released per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        released = StockHold.release_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds."))
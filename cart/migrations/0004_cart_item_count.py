@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:42
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_count(apps, schema_editor):
+    """Fill the stored counts from the existing cart lines."""
+    Cart = apps.get_model("cart", "Cart")
+    CartItem = apps.get_model("cart", "CartItem")
+    units = (
+        CartItem.objects.filter(cart=models.OuterRef("pk"))
+        .order_by()
+        .values("cart")
+        .annotate(total=models.Sum("quantity"))
+        .values("total")
+    )
+    Cart.objects.update(item_count=Coalesce(models.Subquery(units), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0003_stockhold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="item_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="item_count"
+            ),
+        ),
+        migrations.RunPython(backfill_item_count, migrations.RunPython.noop),
+    ]
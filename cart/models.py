@@ -1,12 +1,65 @@
+from inventory.cache import bump_catalog_version, bump_stock_version
 from inventory.models import Product
+from account.badges import invalidate_badge_counts
 from account.models import Account
+from .pricing import price_lines
+import datetime
+import math
 import stripe
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.urls import reverse
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.utils.translation import gettext_lazy as _
 
 
+# Scalar max()/min() of the backends whose INSERT supports ON CONFLICT DO UPDATE
+UPSERT_FUNCTIONS = {"sqlite": ("MAX", "MIN"), "postgresql": ("GREATEST", "LEAST")}
+
+
+# Columns written by Order.fulfill(); name and email are not stored
+FULFILL_FIELDS = [
+    "payment_id",
+    "total_cents",
+    "billing_address_line1",
+    "billing_address_line2",
+    "billing_city",
+    "billing_postal_code",
+    "billing_country",
+    "shipping_address_line1",
+    "shipping_address_line2",
+    "shipping_city",
+    "shipping_postal_code",
+    "shipping_country",
+]
+
+
+def bump_on_stock_change(changes):
+    """Invalidate the cached catalog data that stock changes affect, on commit.
+
+    changes maps product ids to how much their available quantity just moved.
+    Everything showing unit counts follows the stock version; the rest of the
+    catalog caches, such as facets, only move when a product went in or out of
+    stock, so checkouts do not flush them on every step.
+    """
+    if not changes:
+        return
+    transaction.on_commit(bump_stock_version)
+    if Product.availability_changed(changes):
+        transaction.on_commit(bump_catalog_version)
+
+
+class OutOfStock(Exception):
+    """Raised when an order cannot be held or paid because some products are short of stock."""
+
+    def __init__(self, product_ids):
+        super().__init__(f"Not enough stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
 class Order(models.Model):
     """Represents an Order and its Status."""
 
@@ -29,6 +82,8 @@ class Order(models.Model):
         _("status"), max_length=20, choices=STATUS_CHOICES, default="pending"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the order became paid; the recommender picks up orders paid since its last run
+    paid_at = models.DateTimeField(_("paid_at"), null=True, blank=True, db_index=True)
 
     billing_address_line1 = models.CharField(
         _("billing_address_line1"), max_length=255, blank=True, null=True
@@ -71,9 +126,49 @@ class Order(models.Model):
             self.STATUS_CANCELLED,
         }:
             raise ValueError(f"Invalid status: {status}")
+        if current_status == self.STATUS_PAID and self.paid_at is None:
+            self.paid_at = timezone.now()
         self.status = current_status
         self.save()
 
+    def mark_paid(self) -> bool:
+        """Mark a pending order paid and take its items out of stock, all or nothing.
+
+        Both happen in one transaction: the order is claimed with a conditional
+        UPDATE on its pending status, so a webhook delivered twice only takes
+        the stock once and returns False the second time, then every product
+        is decremented with Product.take_stock(), turning the order's stock
+        holds into sales. If any is short, which can only happen once its hold
+        has expired, OutOfStock lists them and nothing is changed.
+        """
+        paid_at = timezone.now()
+        with transaction.atomic():
+            claimed = Order.objects.filter(
+                pk=self.pk, status=self.STATUS_PENDING
+            ).update(status=self.STATUS_PAID, paid_at=paid_at)
+            if not claimed:
+                return False
+            quantities = (
+                self.items.values_list("product_id")
+                .annotate(total=models.Sum("quantity"))
+                .order_by("product_id")  # one lock order for every buyer
+            )
+            held = StockHold.take(self)
+            short = []
+            changes = {}
+            for product_id, quantity in quantities:
+                from_hold = held.get(product_id, 0)
+                if Product.take_stock(product_id, quantity, from_hold):
+                    changes[product_id] = from_hold - quantity
+                else:
+                    short.append(product_id)
+            if short:
+                raise OutOfStock(short)
+            bump_on_stock_change(changes)
+        self.status = self.STATUS_PAID
+        self.paid_at = paid_at
+        return True
+
     def fulfill(
         self,
         name: str,
@@ -106,59 +201,60 @@ class Order(models.Model):
         self.shipping_city = shipping_city
         self.shipping_postal_code = shipping_postal_code
         self.shipping_country = shipping_country
-        self.save()
+        # Only the payment details: a full save from a stale instance would put
+        # back the pending status of an order another delivery has marked paid
+        self.save(update_fields=FULFILL_FIELDS)
 
     @classmethod
     def create_from_cart(cls, request, cart):
-        """Create Order + OrderItems from cart and return Stripe Checkout session."""
-        cart_items = list(cart.items())
-        if not cart_items:
+        """Create Order + OrderItems from cart and return Stripe Checkout session.
+
+        The cart's units are held for STOCK_HOLD_TTL seconds, which outlasts
+        the Stripe session's STRIPE_SESSION_TTL; OutOfStock is raised, and
+        nothing is created, if some of them are no longer available. If Stripe
+        refuses the session, the holds are released, the order is cancelled
+        and the stripe.StripeError is raised.
+        """
+        priced = cart.priced()
+        if not priced:
             return None, None
 
-        # Normalize both SessionCart items (dicts) and DB Cart items (CartItem instances)
-        normalized_items = []
-        for item in cart_items:
-            if isinstance(item, dict):
-                normalized_items.append(item)
-            else:
-                normalized_items.append(
-                    {
-                        "product": item.product,
-                        "quantity": item.quantity,
-                        "unit_cents": item.unit_cents,
-                    }
-                )
-
-        order = cls(total_cents=cart.subtotal_cents())
+        order = cls(total_cents=priced.subtotal_cents)
         if request.user.is_authenticated:
             order.user = request.user
-        order.save()
-
-        for item in normalized_items:
-            OrderItem.objects.create(
-                order=order,
-                product=item["product"],
-                quantity=item["quantity"],
-                unit_price_cents=item["unit_cents"],
+        expires_at = timezone.now() + datetime.timedelta(
+            seconds=settings.STOCK_HOLD_TTL
+        )
+        with transaction.atomic():
+            order.save()
+            OrderItem.objects.bulk_create(
+                OrderItem(
+                    order=order,
+                    product=line.product,
+                    quantity=line.quantity,
+                    unit_price_cents=line.unit_cents,
+                )
+                for line in priced
             )
+            StockHold.place(order, expires_at)
 
         line_items = []
-        for item in normalized_items:
+        for line in priced:
             line_items.append(
                 {
                     "price_data": {
-                        "unit_amount": item["unit_cents"],
+                        "unit_amount": line.unit_cents,
                         "currency": "cad",
                         "product_data": {
-                            "name": item["product"].name,
+                            "name": line.product.name,
                             "images": [
-                                request.build_absolute_uri(item["product"].image.url)
+                                request.build_absolute_uri(line.product.image.url)
                             ]
-                            if item["product"].image
+                            if line.product.image
                             else [],
                         },
                     },
-                    "quantity": item["quantity"],
+                    "quantity": line.quantity,
                 }
             )
 
@@ -180,6 +276,12 @@ class Order(models.Model):
                 "allowed_countries": ["US", "CA"]
             }
 
+        # Counted from the call, as Stripe does, and rounded up
+        session_args["expires_at"] = math.ceil(
+            (
+                timezone.now() + datetime.timedelta(seconds=settings.STRIPE_SESSION_TTL)
+            ).timestamp()
+        )
         try:
             checkout_session = stripe.checkout.Session.create(**session_args)
         except stripe.AuthenticationError:
@@ -192,6 +294,11 @@ class Order(models.Model):
                 id: str = "cs_test_mock"
 
             checkout_session = MockSession()
+        except stripe.StripeError:
+            # Nobody can pay this order, so its units go back at once
+            StockHold.release(order)
+            order.set_status(cls.STATUS_CANCELLED)
+            raise
         return checkout_session, order
 
     def __str__(self):
@@ -214,50 +321,293 @@ class OrderItem(models.Model):
         return self.quantity * self.unit_price_cents
 
 
+class StockHold(models.Model):
+    """Units of a product held for a pending order while its customer pays.
+
+    Product.reserved_quantity is the sum of the holds against a product, kept
+    in step by the classmethods below so listings never aggregate holds. A hold
+    ends when the order is paid, cancelled, or expires and is swept by the
+    release_expired_holds command.
+    """
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="holds")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(_("quantity"))
+    expires_at = models.DateTimeField(_("expires_at"), db_index=True)
+
+    @classmethod
+    def place(cls, order, expires_at):
+        """Hold the order's units until expires_at, all or nothing; call in a transaction.
+
+        Every product is reserved by a single UPDATE and the holds are written
+        by a single INSERT, whatever the number of lines.
+        """
+        quantities = dict(
+            order.items.values_list("product_id")
+            .annotate(total=models.Sum("quantity"))
+            .order_by("product_id")
+        )
+        if not Product.reserve_stock(quantities):
+            available = Product.objects.filter(pk__in=quantities).values_list(
+                "pk", models.F("quantity") - models.F("reserved_quantity")
+            )
+            raise OutOfStock(
+                sorted(pk for pk, units in available if units < quantities[pk])
+            )
+        cls.objects.bulk_create(
+            cls(
+                order=order,
+                product_id=product_id,
+                quantity=quantity,
+                expires_at=expires_at,
+            )
+            for product_id, quantity in quantities.items()
+        )
+        bump_on_stock_change(
+            {product_id: -quantity for product_id, quantity in quantities.items()}
+        )
+
+    @classmethod
+    def take(cls, order):
+        """Remove the order's holds, returning {product id: units held}; call in a transaction.
+
+        The units stay reserved: the caller either sells them or releases them.
+        """
+        holds = list(cls.objects.select_for_update().filter(order=order))
+        cls.objects.filter(pk__in=[hold.pk for hold in holds]).delete()
+        held = {}
+        for hold in holds:
+            held[hold.product_id] = held.get(hold.product_id, 0) + hold.quantity
+        return held
+
+    @classmethod
+    def release(cls, order):
+        """Give back the units held for an order that will not be paid."""
+        with transaction.atomic():
+            held = cls.take(order)
+            if held:
+                Product.release_stock(held)
+                bump_on_stock_change(held)
+        return sum(held.values())
+
+    @classmethod
+    def release_expired(cls, now=None, batch_size=1000):
+        """Give back the units of every expired hold, batch_size holds per transaction.
+
+        Each batch is one SELECT, one UPDATE of the products and one DELETE.
+        Rows locked by a webhook converting them are skipped. Returns the
+        number of holds released.
+        """
+        now = now or timezone.now()
+        released = 0
+        while True:
+            with transaction.atomic():
+                holds = list(
+                    cls.objects.select_for_update(skip_locked=True)
+                    .filter(expires_at__lte=now)
+                    .order_by("expires_at")
+                    .values_list("pk", "product_id", "quantity")[:batch_size]
+                )
+                if not holds:
+                    break
+                held = {}
+                for _pk, product_id, quantity in holds:
+                    held[product_id] = held.get(product_id, 0) + quantity
+                Product.release_stock(held)
+                cls.objects.filter(pk__in=[pk for pk, _id, _qty in holds]).delete()
+                bump_on_stock_change(held)
+            released += len(holds)
+        return released
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} held for order {self.order_id}"
+
+
 class Cart(models.Model):
     """Represents an account related Cart."""
 
     account = models.ForeignKey(Account, on_delete=models.CASCADE)
     products = models.ManyToManyField(Product, through="CartItem")
+    # Units in the cart, kept in step by add(), remove() and clear()
+    item_count = models.PositiveIntegerField(_("item_count"), default=0, editable=False)
 
     def items(self):
-        """Returns all CartItem objects for this cart."""
-        return CartItem.objects.filter(cart=self)
+        """Returns all CartItem objects for this cart, with their products."""
+        return CartItem.objects.filter(cart=self).select_related("product")
+
+    def quantities(self):
+        """Return the (product id, quantity) pairs in the cart, oldest line first."""
+        return (
+            CartItem.objects.filter(cart=self)
+            .order_by("id")
+            .values_list("product_id", "quantity")
+        )
+
+    def priced(self):
+        """Price the cart's lines, returning a PricedCart."""
+        return price_lines(self.quantities())
 
     def add(self, product: Product, quantity=1, replace=False):
-        """Add a product to the cart or update its quantity."""
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=self, product=product, defaults={"quantity": quantity}
-        )
-        if not created:
-            if replace:
-                cart_item.quantity = quantity
+        """Add a product to the cart or update its quantity, clamped to its stock.
+
+        One INSERT ... ON CONFLICT DO UPDATE creates the line or adds to it, so
+        concurrent adds to the same cart can neither lose an increment nor
+        collide on unique_product_per_cartItem. Like SessionCart.add, the new
+        quantity is kept between 1 and the product's available quantity (its
+        stock less the units held by checkouts), read in the same statement.
+        item_count moves by the line's change alongside it (see _upsert);
+        backends without ON CONFLICT lock the cart and recount it instead.
+        """
+        with transaction.atomic():
+            if connection.vendor in UPSERT_FUNCTIONS:
+                self._upsert(product, quantity, replace)
+                invalidate_badge_counts(self.account_id)
             else:
-                cart_item.quantity += quantity
-            cart_item.save()
+                self._lock()
+                self._add_with_update(product, quantity, replace)
+                self._recount()
+
+    def _upsert(self, product, quantity, replace):
+        """Cart.add() for backends with ON CONFLICT DO UPDATE; call in a transaction.
+
+        item_count moves by the line's change rather than being recounted. On
+        PostgreSQL the INSERT runs in a CTE of the UPDATE of the count, once
+        the cart row is locked so the line's previous quantity is current.
+        SQLite has no INSERT in a CTE but locks the whole database on the first
+        write, so there the count is moved first, by the same clamp, and the
+        line written right after.
+        """
+        greatest, least = UPSERT_FUNCTIONS[connection.vendor]
+        items = connection.ops.quote_name(CartItem._meta.db_table)
+        products = connection.ops.quote_name(Product._meta.db_table)
+        carts = connection.ops.quote_name(Cart._meta.db_table)
+        available = f"{greatest}(quantity - reserved_quantity, 1)"
+        new_quantity = (
+            "excluded.quantity" if replace else f"{items}.quantity + excluded.quantity"
+        )
+        upsert = (
+            f"INSERT INTO {items} (cart_id, product_id, quantity) "
+            f"SELECT %s, id, {greatest}(1, {least}(%s, {available})) "
+            f"FROM {products} WHERE id = %s "
+            "ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = "
+            f"{greatest}(1, {least}({new_quantity}, "
+            f"(SELECT {available} FROM {products} WHERE id = excluded.product_id)))"
+        )
+        upsert_params = [self.pk, quantity, product.pk]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                self._lock()
+                cursor.execute(
+                    f"WITH previous AS (SELECT quantity FROM {items} "
+                    "WHERE cart_id = %s AND product_id = %s), "
+                    f"written AS ({upsert} RETURNING quantity) "
+                    f"UPDATE {carts} SET item_count = item_count + COALESCE("
+                    "(SELECT quantity FROM written) - "
+                    "COALESCE((SELECT quantity FROM previous), 0), 0) WHERE id = %s",
+                    [self.pk, product.pk, *upsert_params, self.pk],
+                )
+                return
+            line_quantity = "stock.added" if replace else "line.quantity + stock.added"
+            cursor.execute(
+                f"UPDATE {carts} SET item_count = item_count + COALESCE(("
+                "SELECT CASE WHEN line.quantity IS NULL THEN stock.added "
+                f"ELSE {greatest}(1, {least}({line_quantity}, stock.available)) END "
+                "- COALESCE(line.quantity, 0) "
+                f"FROM (SELECT {greatest}(1, {least}(%s, {available})) AS added, "
+                f"{available} AS available FROM {products} WHERE id = %s) AS stock "
+                f"LEFT JOIN {items} AS line ON line.cart_id = %s "
+                "AND line.product_id = %s), 0) WHERE id = %s",
+                [quantity, product.pk, self.pk, product.pk, self.pk],
+            )
+            cursor.execute(upsert, upsert_params)
+
+    def _add_with_update(self, product, quantity, replace):
+        """Cart.add() for backends without ON CONFLICT: an F() update, else an insert."""
+        stock = Greatest(
+            models.Subquery(
+                Product.objects.filter(pk=product.pk).values(
+                    available=Product.AVAILABLE_QUANTITY
+                )
+            ),
+            1,
+        )
+        line = CartItem.objects.filter(cart=self, product=product)
+        new_quantity = (
+            models.Value(quantity) if replace else models.F("quantity") + quantity
+        )
+        if line.update(quantity=Greatest(1, Least(new_quantity, stock))):
+            return
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(
+                    cart=self,
+                    product=product,
+                    quantity=Greatest(1, Least(models.Value(quantity), stock)),
+                )
+        except IntegrityError:
+            # Another request created the line first; add to it instead
+            line.update(quantity=Greatest(1, Least(new_quantity, stock)))
 
     def remove(self, product: Product):
         """Remove a product completely from the cart."""
-        CartItem.objects.filter(cart=self, product=product).delete()
+        with transaction.atomic():
+            self._lock()
+            CartItem.objects.filter(cart=self, product=product).delete()
+            self._recount()
 
     def clear(self):
         """Remove all products from the cart."""
-        CartItem.objects.filter(cart=self).delete()
+        with transaction.atomic():
+            self._lock()
+            CartItem.objects.filter(cart=self).delete()
+            self._recount()
+
+    def _lock(self):
+        """Lock the cart row, so concurrent changes are counted one after the other."""
+        Cart.objects.select_for_update().values_list("pk").get(pk=self.pk)
+
+    def _recount(self):
+        """Store the cart's number of units in item_count and drop the cached badges."""
+        Cart.objects.filter(pk=self.pk).update(item_count=Cart._units())
+        invalidate_badge_counts(self.account_id)
+
+    @classmethod
+    def recount(cls, cart_ids):
+        """Lock and recount the given carts, dropping their accounts' cached badges.
+
+        For lines removed without add(), remove() or clear(), e.g. by the
+        cascade of a product delete.
+        """
+        with transaction.atomic():
+            carts = cls.objects.select_for_update().filter(pk__in=cart_ids)
+            account_ids = set(carts.values_list("account_id", flat=True))
+            carts.update(item_count=cls._units())
+        for account_id in account_ids:
+            invalidate_badge_counts(account_id)
+
+    @staticmethod
+    def _units():
+        """Return the expression summing the units of the outer cart's lines."""
+        units = (
+            CartItem.objects.filter(cart=OuterRef("pk"))
+            .order_by()
+            .values("cart")
+            .annotate(total=Sum("quantity"))
+            .values("total")
+        )
+        return Coalesce(Subquery(units), 0)
 
     def count(self):
         """Count all items in the cart."""
-        total_quantity = 0
-        for item in CartItem.objects.filter(cart=self):
-            total_quantity += item.quantity
-        return total_quantity
+        return CartItem.objects.filter(cart=self).aggregate(
+            count=Coalesce(Sum("quantity"), 0)
+        )["count"]
 
     def subtotal_cents(self):
-        """Total cents added to the cart."""
-        total = 0
-        items = CartItem.objects.filter(cart=self)
-        for item in items:
-            total += item.total_cents
-        return total
+        """Total cents added to the cart, at the products' sale prices."""
+        return CartItem.objects.filter(cart=self).aggregate(
+            subtotal=Coalesce(Sum(F("quantity") * F("product__effective_price")), 0)
+        )["subtotal"]
 
     def __str__(self):
         return f"This cart belongs to account {self.account.email}"
@@ -273,17 +623,17 @@ class CartItem(models.Model):
     @property
     def total_cents(self):
         """Calculate the total cost of an Item."""
-        return self.quantity * self.product.price
+        return self.quantity * self.product.get_discounted_price()
 
     @property
     def unit_cents(self):
         """Returns the price in cents of a single unit."""
-        return self.product.price
+        return self.product.get_discounted_price()
 
     @property
     def line_cents(self):
         """Calculate the total cost of an Item."""
-        return self.product.price * self.quantity
+        return self.product.get_discounted_price() * self.quantity
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity} cart item"
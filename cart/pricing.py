@@ -0,0 +1,60 @@
+from inventory.models import Product
+
+
+class PricedLine:
+    """A cart line priced at its product's sale price, in cents."""
+
+    __slots__ = ("line_cents", "product", "quantity", "unit_cents")
+
+    def __init__(self, product, quantity, unit_cents, line_cents):
+        self.product = product
+        self.quantity = quantity
+        self.unit_cents = unit_cents
+        self.line_cents = line_cents
+
+    def __repr__(self):
+        return f"<PricedLine {self.product.pk} x {self.quantity}: {self.line_cents}>"
+
+
+class PricedCart:
+    """The priced lines of a cart with their subtotal and unit count."""
+
+    __slots__ = ("count", "lines", "subtotal_cents")
+
+    def __init__(self, lines, subtotal_cents, count):
+        self.lines = lines
+        self.subtotal_cents = subtotal_cents
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def product_ids(self):
+        return [line.product.pk for line in self.lines]
+
+
+def price_lines(quantities):
+    """Price (product id, quantity) pairs, returning a PricedCart.
+
+    The products are fetched in one query and the lines, subtotal and count
+    are computed in the same pass over them. Pairs whose product no longer
+    exists are dropped; the others keep their order.
+    """
+    quantities = list(quantities)
+    products = Product.objects.in_bulk([product_id for product_id, _ in quantities])
+    lines = []
+    subtotal = count = 0
+    for product_id, quantity in quantities:
+        product = products.get(product_id)
+        if product is None:
+            continue
+        unit_cents = product.get_discounted_price()
+        line_cents = unit_cents * quantity
+        lines.append(PricedLine(product, quantity, unit_cents, line_cents))
+        subtotal += line_cents
+        count += quantity
+    return PricedCart(lines, subtotal, count)
@@ -1,6 +1,7 @@
 from dataclasses import dataclass
 from typing import Dict, TypedDict
 from inventory.models import Product
+from .pricing import price_lines
 
 CART_KEY = "cart"  # session key
 
@@ -43,8 +44,8 @@ class SessionCart:
         pid = str(product.id)
         current = self._cart.get(pid, {"qty": 0})
         new_qty = quantity if replace else current["qty"] + quantity
-        # clamp to available stock
-        new_qty = max(1, min(new_qty, max(product.quantity, 1)))
+        # clamp to the stock not held by checkouts in progress
+        new_qty = max(1, min(new_qty, max(product.available_quantity, 1)))
         self._cart[pid] = {"qty": new_qty}
         self.save()
 
@@ -60,24 +61,17 @@ class SessionCart:
         self.session[CART_KEY] = {}
         self.session.modified = True
 
+    def quantities(self):
+        """Return the (product id, quantity) pairs in the cart."""
+        return [(int(pid), data["qty"]) for pid, data in self._cart.items()]
+
+    def priced(self):
+        """Price the cart's lines, returning a PricedCart."""
+        return price_lines(self.quantities())
+
     def items(self):
-        """Yield full product objects with qty and line totals (in cents)."""
-        pids = [int(pid) for pid in self._cart.keys()]
-        products = {p.id: p for p in Product.objects.filter(id__in=pids)}
-        for pid_str, data in self._cart.items():
-            pid = int(pid_str)
-            product = products.get(pid)
-            if not product:
-                continue
-            qty = data["qty"]
-            unit_cents = product.get_discounted_price()  # cents
-            line_cents = unit_cents * qty
-            yield {
-                "product": product,
-                "quantity": qty,
-                "unit_cents": unit_cents,
-                "line_cents": line_cents,
-            }
+        """Yield the priced lines of products that still exist."""
+        yield from self.priced()
 
     def count(self) -> int:
         """Return the total number of items in the user's cart."""
@@ -85,4 +79,4 @@ class SessionCart:
 
     def subtotal_cents(self) -> int:
         """Calculate the subtotal cost of the cart contents in cents."""
-        return sum(item["line_cents"] for item in self.items())
+        return self.priced().subtotal_cents
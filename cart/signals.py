@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from inventory.models import Product
+from .models import Cart, CartItem
+
+
+@receiver(pre_delete, sender=Product)
+def product_lines_deleting(sender, instance, **kwargs):
+    """Note the carts holding a product about to be deleted with its lines."""
+    instance._line_cart_ids = list(
+        CartItem.objects.filter(product=instance)
+        .values_list("cart_id", flat=True)
+        .distinct()
+    )
+
+
+@receiver(post_delete, sender=Product)
+def product_lines_deleted(sender, instance, **kwargs):
+    """Recount the carts that lost a line to a product delete."""
+    cart_ids = getattr(instance, "_line_cart_ids", None)
+    if cart_ids:
+        Cart.recount(cart_ids)
@@ -1,12 +1,17 @@
+import logging
+import stripe
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST, require_GET
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Order
+from .models import Order, OutOfStock
 from .helpers import get_cart, parse_quantity
 from inventory.models import Product
+from inventory.recommender import also_bought_with
 from django.utils.translation import gettext_lazy as _
 
+logger = logging.getLogger(__name__)
+
 
 def add_to_cart(request, product_id):
     """Add a specified product ot the user's shopping cart."""
@@ -20,11 +25,12 @@ def add_to_cart(request, product_id):
 
 def cart_detail(request):
     """Display details of the user's shopping cart."""
-    cart = get_cart(request)
+    priced = get_cart(request).priced()
     context = {
-        "cart_items": list(cart.items()),
-        "subtotal_cents": cart.subtotal_cents(),
-        "cart_count": cart.count(),
+        "cart_items": priced.lines,
+        "subtotal_cents": priced.subtotal_cents,
+        "cart_count": priced.count,
+        "also_bought": also_bought_with(priced.product_ids),
     }
     return render(request, "cart/cart.html", context)
 
@@ -61,11 +67,11 @@ def clear_cart(request):
 
 def checkout(request):
     """Display checkout page with cart summary."""
-    cart = get_cart(request)
+    priced = get_cart(request).priced()
     context = {
-        "cart_items": list(cart.items()),
-        "subtotal_cents": cart.subtotal_cents(),
-        "cart_count": cart.count(),
+        "cart_items": priced.lines,
+        "subtotal_cents": priced.subtotal_cents,
+        "cart_count": priced.count,
     }
     return render(request, "cart/checkout.html", context)
 
@@ -74,7 +80,20 @@ def checkout(request):
 def create_checkout_session(request):
     """Create Stripe Checkout session from cart and redirect to Stripe."""
     cart = get_cart(request)
-    session, order = Order.create_from_cart(request, cart)
+    try:
+        session, order = Order.create_from_cart(request, cart)
+    except OutOfStock:
+        messages.error(
+            request,
+            _("Some items in your cart are no longer available in that quantity."),
+        )
+        return redirect("cart:cart_detail")
+    except stripe.StripeError:
+        logger.exception("Stripe refused a checkout session")
+        messages.error(
+            request, _("Checkout is unavailable right now. Please try again.")
+        )
+        return redirect("cart:cart_detail")
 
     if not session:
         messages.warning(request, _("Your cart is empty."))
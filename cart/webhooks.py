@@ -1,8 +1,11 @@
+import logging
 import os
 import stripe
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
-from .models import Order
+from .models import Order, OutOfStock, StockHold
+
+logger = logging.getLogger(__name__)
 
 
 @csrf_exempt
@@ -32,6 +35,9 @@ def stripe_webhook(request):
             order = Order.objects.get(id=order_id)
         except Order.DoesNotExist:
             return HttpResponse(status=404)
+        if order.status == Order.STATUS_PAID:
+            # Stripe delivers events at least once; this one was handled already
+            return HttpResponse(status=200)
 
         if order.user:
             account = order.user
@@ -76,7 +82,13 @@ def stripe_webhook(request):
                 shipping_country=shipping.get("country"),
             )
 
-        order.set_status("paid")
+        try:
+            order.mark_paid()
+        except OutOfStock as exc:
+            # The order stays pending and Stripe retries the event, which
+            # succeeds once the products are restocked
+            logger.error("Order %s is paid but cannot be fulfilled: %s", order.pk, exc)
+            return HttpResponse(status=409)
 
     elif event["type"] in ("payment_intent.payment_failed", "payment_intent.canceled"):
         payment_intent = event["data"]["object"]
@@ -87,6 +99,15 @@ def stripe_webhook(request):
         except Order.DoesNotExist:
             return HttpResponse(status=200)
 
+        StockHold.release(order)
         order.set_status("cancelled")
 
+    elif event["type"] == "checkout.session.expired":
+        # The customer never paid; give the held units back right away
+        order_id = event["data"]["object"]["client_reference_id"]
+        order = Order.objects.filter(id=order_id, status=Order.STATUS_PENDING).first()
+        if order is not None:
+            StockHold.release(order)
+            order.set_status("cancelled")
+
     return HttpResponse(status=200)
@@ -0,0 +1,266 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from django.utils.translation import get_language
+from django.views.decorators.http import require_GET
+from .cache import stock_key
+from .models import Product
+from .pagination import InvalidCursor, KeysetPaginator, decode_cursor
+
+# API field -> (columns it is computed from, function building it from a .values() row).
+# url has no builder here: serializer() formats it for the request's language.
+API_FIELDS = {
+    "id": (["id"], lambda row: row["id"]),
+    "sku": (["sku"], lambda row: row["sku"]),
+    "name": (["name"], lambda row: row["name"]),
+    "description": (["description"], lambda row: row["description"]),
+    "category": (["category_id"], lambda row: row["category_id"]),
+    "price": (["price"], lambda row: row["price"]),
+    "discount_percentage": (
+        ["discount_percentage"],
+        lambda row: row["discount_percentage"],
+    ),
+    "sale_price": (["effective_price"], lambda row: row["effective_price"]),
+    "quantity": (
+        ["quantity", "reserved_quantity"],
+        lambda row: max(row["quantity"] - row["reserved_quantity"], 0),
+    ),
+    "available": (
+        ["quantity", "reserved_quantity"],
+        lambda row: row["quantity"] > row["reserved_quantity"],
+    ),
+    "rating_average": (["rating_average"], lambda row: row["rating_average"]),
+    "rating_count": (["rating_count"], lambda row: row["rating_count"]),
+    "created_date": (["created_date"], lambda row: row["created_date"].isoformat()),
+    "image": (
+        ["image"],
+        lambda row: default_storage.url(row["image"]) if row["image"] else None,
+    ),
+    "url": (["id"], None),
+}
+DEFAULT_FIELDS = [
+    "id",
+    "sku",
+    "name",
+    "category",
+    "price",
+    "sale_price",
+    "available",
+    "rating_average",
+    "image",
+    "url",
+]
+
+
+class APIError(ValueError):
+    """Raised when API query parameters are invalid; reported as a 400 response."""
+
+
+def requested_fields(request):
+    """Return the fields named by the fields= parameter, or the default ones."""
+    value = request.GET.get("fields")
+    if not value:
+        return DEFAULT_FIELDS
+    fields = list(dict.fromkeys(name.strip() for name in value.split(",")))
+    unknown = [name for name in fields if name not in API_FIELDS]
+    if unknown:
+        raise APIError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def page_size(request):
+    """Return the page size asked for with limit=, within CATALOG_API_MAX_PAGE_SIZE."""
+    value = request.GET.get("limit")
+    if value is None:
+        return settings.CATALOG_API_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise APIError("limit must be an integer") from None
+    if not 1 <= limit <= settings.CATALOG_API_MAX_PAGE_SIZE:
+        raise APIError(
+            f"limit must be between 1 and {settings.CATALOG_API_MAX_PAGE_SIZE}"
+        )
+    return limit
+
+
+def serializer(fields):
+    """Return (columns to select, function turning a .values() row into the API object).
+
+    The field builders are looked up once per request rather than once per row,
+    and product URLs are formatted from a single reverse().
+    """
+    columns = {column for name in fields for column in API_FIELDS[name][0]}
+    link = reverse("inventory:product", args=[0]).replace("/0/", "/{}/")
+    builders = [
+        (name, API_FIELDS[name][1] or (lambda row: link.format(row["id"])))
+        for name in fields
+    ]
+
+    def serialize(row):
+        return {name: build(row) for name, build in builders}
+
+    return columns, serialize
+
+
+def error(message, status=400):
+    return JsonResponse({"error": message}, status=status)
+
+
+def catalog_etag(request):
+    """Return the strong ETag of a successful API response, built without a query.
+
+    Responses only depend on the catalog, its stock, the query string and the
+    language, so a client revalidating with If-None-Match gets a 304 until any
+    of them changes.
+    """
+    return quote_etag(
+        stock_key("api", request.path, sorted(request.GET.lists()), get_language())
+    )
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the client's copy is still current, else None.
+
+    Views call it once the response is known to succeed, so error responses,
+    which carry no ETag, are never revalidated into a 304.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response["ETag"] = etag
+        patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def api_response(data, etag):
+    response = JsonResponse(data)
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def listing_params(request):
+    """Validate the search, category, filter, price and sort parameters without a query."""
+    search_query = request.GET.get("search", "")
+    category = request.GET.get("category")
+    try:
+        category = int(category) if category else None
+    except ValueError:
+        raise APIError("category must be an integer") from None
+    try:
+        low, high = (
+            int(request.GET[name]) if request.GET.get(name) else None
+            for name in ("min_price", "max_price")
+        )
+    except ValueError:
+        raise APIError("min_price and max_price must be integers (cents)") from None
+    return {
+        "search": search_query,
+        "category": category,
+        "filter_criteria": request.GET.getlist("filter_criteria"),
+        "min_price": low,
+        "max_price": high,
+        "sort": request.GET.get("sort", "relevance" if search_query else ""),
+    }
+
+
+def by_relevance(listing):
+    return listing["sort"] == "relevance" and bool(listing["search"])
+
+
+def sort_field(listing):
+    """Return the model field the listing is sorted by, or None for the search rank."""
+    if by_relevance(listing):
+        return None
+    ordering = Product.sort_by(listing["sort"]).query.order_by[0]
+    return Product._meta.get_field(ordering.lstrip("-"))
+
+
+def filtered_products(listing):
+    """Return the ordered queryset selected by validated listing parameters.
+
+    A search queries the database right away, to fall back to typo-tolerant
+    matches when it finds nothing.
+    """
+    products = Product.search_by_name(listing["search"])
+    if listing["category"] is not None:
+        products = products.filter(category_id=listing["category"])
+    products = Product.filter_by(listing["filter_criteria"], products)
+    # max_price is inclusive, filter_by_price's upper bound is not
+    high = listing["max_price"]
+    products = Product.filter_by_price(
+        listing["min_price"], high + 1 if high is not None else None, products
+    )
+    if by_relevance(listing):
+        return products.order_by("-search_rank", "-id")
+    return Product.sort_by(listing["sort"], products=products)
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query["cursor"] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+@require_GET
+def products(request):
+    """List products as JSON, one keyset page at a time.
+
+    Accepts the listing parameters (search, category, filter_criteria, sort),
+    inclusive min_price= and max_price= bounds on the effective price in cents,
+    fields= to select the returned fields, limit= and the cursor from the
+    previous response's next or previous link. Only the columns behind the
+    requested fields, the sort key and the id are selected.
+    """
+    cursor = request.GET.get("cursor")
+    try:
+        fields = requested_fields(request)
+        per_page = page_size(request)
+        listing = listing_params(request)
+        if cursor:
+            decode_cursor(cursor, sort_field(listing))
+    except APIError as exc:
+        return error(str(exc))
+    except InvalidCursor:
+        return error("Invalid cursor")
+    # Only now is the response known to succeed, which is all the ETag vouches
+    # for; a match is answered before the search touches the database
+    etag = catalog_etag(request)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    ordered = filtered_products(listing)
+    columns, serialize = serializer(fields)
+    # Cursors are built from the sort key and the id, so both are always selected
+    sort_key = ordered.query.order_by[0].lstrip("-")
+    paginator = KeysetPaginator(ordered.values(*columns | {sort_key, "id"}), per_page)
+    page = paginator.page(cursor)
+    return api_response(
+        {
+            "results": [serialize(row) for row in page],
+            "next": page_url(request, page.next_cursor),
+            "previous": page_url(request, page.previous_cursor),
+        },
+        etag,
+    )
+
+
+@require_GET
+def product(request, product_id):
+    """Return one product as JSON, limited to the fields= parameter if given."""
+    try:
+        fields = requested_fields(request)
+    except APIError as exc:
+        return error(str(exc))
+    columns, serialize = serializer(fields)
+    row = Product.objects.filter(pk=product_id).values(*columns).first()
+    if row is None:
+        return error("Product not found", status=404)
+    etag = catalog_etag(request)
+    if (response := not_modified(request, etag)) is not None:
+        return response
+    return api_response(serialize(row), etag)
@@ -0,0 +1,8 @@
+from django.urls import path
+from . import api
+
+app_name = "api"
+urlpatterns = [
+    path("products/", api.products, name="products"),
+    path("products/<int:product_id>/", api.product, name="product"),
+]
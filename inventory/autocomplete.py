@@ -0,0 +1,201 @@
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+from django.db.models import Count
+from django.urls import reverse
+from .cache import CATEGORY, PRODUCT, ProcessIndex
+from .trigram import words
+
+
+class PrefixIndex:
+    """In-memory completions for product and category names.
+
+    Every word position of a name is stored as a key in one sorted list, so a
+    prefix is answered with a bisect followed by a walk over the matching range:
+    "yel" completes "Gateron Yellow" as well as "Yellow Keycaps". Matches are
+    ranked by popularity. The top depth matches of recently typed prefixes are
+    memoized and patched in place as items change, so repeated keystrokes never
+    walk the range again.
+    """
+
+    def __init__(self, depth=50, memo_size=4096):
+        self.depth = depth
+        self.memo_size = memo_size
+        self._lock = threading.Lock()
+        self._entries = []  # sorted (key, kind, id)
+        self._items = {}  # (kind, id) -> (label, popularity, keys)
+        self._memo = OrderedDict()  # prefix -> ranked (kind, id) list
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def keys(label):
+        """Return the search keys of a label, one starting at each word."""
+        terms = words(label)
+        return tuple(" ".join(terms[i:]) for i in range(len(terms)))
+
+    def add(self, kind, item_id, label, popularity=0):
+        """Index an item, replacing whatever was indexed for it before."""
+        with self._lock:
+            self._discard(kind, item_id)
+            keys = self.keys(label)
+            self._items[kind, item_id] = (label, popularity, keys)
+            for key in keys:
+                bisect.insort(self._entries, (key, kind, item_id))
+            for ranked in self._memoized(keys):
+                ranked.append((kind, item_id))
+                ranked.sort(key=self._score, reverse=True)
+                del ranked[self.depth :]
+
+    def load(self, items):
+        """Index many new (kind, id, label, popularity) items, sorting a single time."""
+        with self._lock:
+            for kind, item_id, label, popularity in items:
+                keys = self.keys(label)
+                self._items[kind, item_id] = (label, popularity, keys)
+                self._entries.extend((key, kind, item_id) for key in keys)
+            self._entries.sort()
+            self._memo.clear()
+
+    def remove(self, kind, item_id):
+        """Forget an item."""
+        with self._lock:
+            self._discard(kind, item_id)
+
+    def _discard(self, kind, item_id):
+        item = self._items.get((kind, item_id))
+        if item is None:
+            return
+        for key in item[2]:
+            del self._entries[bisect.bisect_left(self._entries, (key, kind, item_id))]
+        for prefix in self._prefixes(item[2]):
+            ranked = self._memo.get(prefix)
+            if ranked and (kind, item_id) in ranked:
+                if len(ranked) < self.depth:
+                    ranked.remove((kind, item_id))
+                else:
+                    # The next best match is unknown, so rank this prefix again
+                    del self._memo[prefix]
+        del self._items[kind, item_id]
+
+    @staticmethod
+    def _prefixes(keys):
+        return {key[:end] for key in keys for end in range(1, len(key) + 1)}
+
+    def _memoized(self, keys):
+        """Yield the memoized rankings of every prefix of the keys."""
+        if self._memo:
+            for prefix in self._prefixes(keys):
+                ranked = self._memo.get(prefix)
+                if ranked is not None:
+                    yield ranked
+
+    def _score(self, match):
+        return (self._items[match][1], match[0] == CATEGORY, match[1])
+
+    def complete(self, text, limit=10):
+        """Return up to limit (kind, id, label) completions for text, most popular first."""
+        prefix = " ".join(words(text))
+        if not prefix:
+            return []
+        with self._lock:
+            ranked = self._memo.get(prefix)
+            if ranked is None:
+                ranked = self._rank(prefix)
+                self._memo[prefix] = ranked
+                if len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+            else:
+                self._memo.move_to_end(prefix)
+            return [(kind, pk, self._items[kind, pk][0]) for kind, pk in ranked[:limit]]
+
+    def _rank(self, prefix):
+        entries = self._entries
+        matches = set()
+        position = bisect.bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            matches.add(entries[position][1:])
+            position += 1
+        return heapq.nlargest(self.depth, matches, key=self._score)
+
+    def suggestions(self, text, limit=10):
+        """Return completions as JSON-ready dicts with the page each one links to."""
+        urls = {
+            PRODUCT: ("inventory:product", "product_id"),
+            CATEGORY: ("inventory:category", "category_id"),
+        }
+        results = []
+        for kind, pk, label in self.complete(text, limit):
+            view, kwarg = urls[kind]
+            results.append(
+                {"type": kind, "label": label, "url": reverse(view, kwargs={kwarg: pk})}
+            )
+        return results
+
+
+def build_autocomplete_index():
+    """Build a prefix index over every product and category name.
+
+    Products are ranked by how many ratings they have, categories by how many
+    products they hold.
+    """
+    from .models import Category, Product
+
+    products = Product.objects.values_list("id", "name", "rating_count")
+    categories = Category.objects.annotate(product_count=Count("product"))
+    index = PrefixIndex()
+    index.load(
+        (PRODUCT, product_id, name, rating_count)
+        for product_id, name, rating_count in products.iterator(chunk_size=5000)
+    )
+    index.load(
+        (CATEGORY, category_id, name, product_count)
+        for category_id, name, product_count in categories.values_list(
+            "id", "name", "product_count"
+        )
+    )
+    return index
+
+
+def patch_autocomplete_index(index, changes):
+    """Re-index the products and categories among (kind, pk) changes logged by other processes."""
+    from .models import Category, Product
+
+    ids = {PRODUCT: set(), CATEGORY: set()}
+    for kind, pk in changes:
+        ids[kind].add(pk)
+    rows = {
+        PRODUCT: Product.objects.filter(pk__in=ids[PRODUCT]).values_list(
+            "id", "name", "rating_count"
+        ),
+        CATEGORY: Category.objects.filter(pk__in=ids[CATEGORY])
+        .annotate(product_count=Count("product"))
+        .values_list("id", "name", "product_count"),
+    }
+    for kind, item_ids in ids.items():
+        found = {pk: (label, popularity) for pk, label, popularity in rows[kind]}
+        for item_id in item_ids:
+            if item_id in found:
+                index.add(kind, item_id, *found[item_id])
+            else:
+                index.remove(kind, item_id)
+
+
+_index = ProcessIndex(build_autocomplete_index, patch_autocomplete_index)
+
+
+def get_autocomplete_index():
+    """Return the process-wide index, building it from the database on first use."""
+    return _index.get()
+
+
+def reset_autocomplete_index():
+    """Drop the process-wide index so the next lookup rebuilds it."""
+    _index.reset()
+
+
+def autocomplete_index_if_built():
+    """Return the process-wide index only if it has been built already."""
+    return _index.if_built()
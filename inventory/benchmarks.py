@@ -0,0 +1,86 @@
+import contextlib
+import datetime
+import random
+import time
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import Category, Product
+from .autocomplete import reset_autocomplete_index
+from .search import get_search_backend
+from .trigram import reset_trigram_index
+
+BRANDS = ["Gateron", "Cherry", "Kailh", "Akko", "Keychron", "Durock", "NovelKeys"]
+LINES = ["MX", "Box", "Ink", "Oil King", "Silent", "Pro", "Milky", "Yellow"]
+KINDS = ["Red", "Brown", "Blue", "Linear", "Tactile", "Clicky", "Keycap Set"]
+
+
+def fake_product_name(rng):
+    """Build a plausible keyboard part name for seeded catalogs."""
+    return f"{rng.choice(BRANDS)} {rng.choice(LINES)} {rng.choice(KINDS)} {rng.randint(1, 999)}"
+
+
+def seed_catalog(product_count, category_count=20, batch_size=5000, seed=0):
+    """Bulk insert a synthetic catalog and return the number of products created."""
+    rng = random.Random(seed)
+    categories = Category.objects.bulk_create(
+        Category(name=f"Benchmark {i}", description="", image="")
+        for i in range(category_count)
+    )
+    now = timezone.now()
+    batch = []
+    for i in range(product_count):
+        batch.append(
+            Product(
+                name=fake_product_name(rng),
+                description=f"{rng.choice(KINDS)} switches, lubed, {i}",
+                quantity=rng.choice([0, 0, 0] + list(range(1, 8))),
+                image="",
+                price=rng.randint(500, 50000),
+                created_date=now - datetime.timedelta(minutes=rng.randint(0, 10**6)),
+                category=rng.choice(categories),
+                discount_percentage=rng.choice([0] * 6 + [5, 10, 15, 25]),
+            )
+        )
+        if len(batch) == batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    # bulk_create skips post_save, so index the new rows in one pass
+    get_search_backend().rebuild()
+    reset_trigram_index()
+    reset_autocomplete_index()
+    if connection.vendor in ("sqlite", "postgresql"):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    return product_count
+
+
+@contextlib.contextmanager
+def seeded_catalog(product_count, **kwargs):
+    """Seed a synthetic catalog inside a transaction that is always rolled back."""
+    with transaction.atomic():
+        seed_catalog(product_count, **kwargs)
+        try:
+            yield
+        finally:
+            transaction.set_rollback(True)
+            reset_trigram_index()
+            reset_autocomplete_index()
+
+
+def timed(func, repeat):
+    """Run func repeatedly and return the sorted per-call latencies in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def percentile(sorted_values, pct):
+    """Return the pct-th percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
@@ -0,0 +1,287 @@
+import datetime
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from .models import Category
+
+CATALOG_VERSION_KEY = "inventory:catalog-version"
+CATALOG_CHANGED_KEY = "inventory:catalog-changed-at"
+LISTING_HITS_KEY = "inventory:listing-cache:hits"
+LISTING_MISSES_KEY = "inventory:listing-cache:misses"
+NAVIGATION_KEY = "inventory:navigation-categories"
+SEARCH_INDEX_GENERATION_KEY = "inventory:search-index-generation"
+STOCK_VERSION_KEY = "inventory:stock-version"
+SEARCH_CHANGE_COUNT_KEY = "inventory:search-changes"
+SEARCH_CHANGE_KEY = "inventory:search-change:{}"
+
+# Kinds of rows recorded in the search change log
+PRODUCT = "product"
+CATEGORY = "category"
+
+# Seconds a product or category change stays in the shared log; a process that
+# falls further behind rebuilds its search indexes instead of patching them
+SEARCH_CHANGE_TIMEOUT = 60 * 60
+
+# Seconds a process trusts its own copy of the navigation categories before
+# checking the shared cache, which bounds how stale other processes can be
+NAVIGATION_LOCAL_TIMEOUT = 30
+
+_navigation = None  # (expires at, categories)
+_navigation_lock = threading.Lock()
+
+
+def catalog_cache():
+    """Return the cache backend selected by CATALOG_CACHE_ALIAS."""
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def catalog_version():
+    """Return the current catalog version, starting a new one if none is cached.
+
+    New versions start from the clock, so a version key lost to eviction can never
+    bring back entries cached under an earlier version.
+    """
+    cache = catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every catalog cache entry at once by moving to a new version."""
+    cache = catalog_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(CATALOG_CHANGED_KEY, time.time(), timeout=None)
+
+
+def stock_version():
+    """Return the current stock version, starting a new one if none is cached."""
+    cache = catalog_cache()
+    version = cache.get(STOCK_VERSION_KEY)
+    if version is None:
+        cache.add(STOCK_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(STOCK_VERSION_KEY)
+    return version
+
+
+def bump_stock_version():
+    """Invalidate the catalog entries that show unit counts, e.g. after a stock hold.
+
+    Entries built with catalog_key alone, such as facets, are kept.
+    """
+    cache = catalog_cache()
+    try:
+        cache.incr(STOCK_VERSION_KEY)
+    except ValueError:
+        cache.add(STOCK_VERSION_KEY, time.time_ns(), timeout=None)
+    cache.set(CATALOG_CHANGED_KEY, time.time(), timeout=None)
+
+
+def catalog_last_modified():
+    """Return when the catalog or stock version last moved, as an aware datetime.
+
+    Like the version, a timestamp lost to eviction restarts from the clock,
+    which can only make pages look newer than they are, never older.
+    """
+    cache = catalog_cache()
+    changed = cache.get(CATALOG_CHANGED_KEY)
+    if changed is None:
+        cache.add(CATALOG_CHANGED_KEY, time.time(), timeout=None)
+        changed = cache.get(CATALOG_CHANGED_KEY)
+    return datetime.datetime.fromtimestamp(changed, tz=datetime.UTC)
+
+
+def search_index_generation():
+    """Return the generation of the in-process search indexes, starting one if needed."""
+    cache = catalog_cache()
+    generation = cache.get(SEARCH_INDEX_GENERATION_KEY)
+    if generation is None:
+        cache.add(SEARCH_INDEX_GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(SEARCH_INDEX_GENERATION_KEY)
+    return generation
+
+
+def bump_search_index_generation():
+    """Make every process rebuild its in-memory search indexes, e.g. after a bulk import."""
+    cache = catalog_cache()
+    try:
+        cache.incr(SEARCH_INDEX_GENERATION_KEY)
+    except ValueError:
+        cache.add(SEARCH_INDEX_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def record_search_change(kind, pk):
+    """Log that a product or category row changed, for every process to patch its indexes."""
+    cache = catalog_cache()
+    try:
+        count = cache.incr(SEARCH_CHANGE_COUNT_KEY)
+    except ValueError:
+        cache.add(SEARCH_CHANGE_COUNT_KEY, 0, timeout=None)
+        count = cache.incr(SEARCH_CHANGE_COUNT_KEY)
+    cache.set(SEARCH_CHANGE_KEY.format(count), (kind, pk), SEARCH_CHANGE_TIMEOUT)
+
+
+def search_change_count():
+    """Return how many changes the search change log has recorded."""
+    return catalog_cache().get(SEARCH_CHANGE_COUNT_KEY, 0)
+
+
+def search_changes(since, until):
+    """Return the (kind, pk) changes logged after since up to until, or None if some expired."""
+    keys = [SEARCH_CHANGE_KEY.format(count) for count in range(since + 1, until + 1)]
+    found = catalog_cache().get_many(keys)
+    if len(found) < len(keys):
+        return None
+    return [found[key] for key in keys]
+
+
+class ProcessIndex:
+    """A per-process index built lazily by a callable.
+
+    Signals patch the index of the process that saved a row and log the change,
+    on commit, for the other processes; every process notices new changes
+    within check_interval seconds and applies them with patch, or rebuilds when
+    it has no patch, fell more than max_patch changes behind or some of them
+    expired. Changes that bypass signals, such as bulk imports, bump the shared
+    search index generation instead, which makes every process rebuild.
+    """
+
+    check_interval = 30
+    max_patch = 1000
+
+    def __init__(self, build, patch=None):
+        self._build = build
+        self._patch = patch
+        self._lock = threading.Lock()
+        self._index = None
+        self._generation = None
+        self._changes = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Return the index, building or rebuilding it when needed."""
+        now = time.monotonic()
+        index = self._index
+        if index is not None and now < self._checked_at + self.check_interval:
+            return index
+        with self._lock:
+            generation = search_index_generation()
+            # Counted before a rebuild reads the rows, so changes committed
+            # meanwhile are applied again at the next check
+            changes = search_change_count()
+            if (
+                self._index is None
+                or generation != self._generation
+                or not self._catch_up(changes)
+            ):
+                self._index = self._build()
+                self._generation = generation
+            self._changes = changes
+            self._checked_at = now
+            return self._index
+
+    def _catch_up(self, changes):
+        """Apply the changes logged since the last check, returning False if it cannot."""
+        if changes == self._changes:
+            return True
+        if self._patch is None or not 0 < changes - self._changes <= self.max_patch:
+            return False
+        logged = search_changes(self._changes, changes)
+        if logged is None:
+            return False
+        self._patch(self._index, logged)
+        return True
+
+    def reset(self):
+        """Drop the index so the next get() rebuilds it."""
+        self._index = None
+
+    def if_built(self):
+        """Return the index only if it has been built already."""
+        return self._index
+
+
+def catalog_key(prefix, *parts):
+    """Build a cache key for catalog data that is tied to the current catalog version."""
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest()
+    return f"inventory:{prefix}:{catalog_version()}:{digest}"
+
+
+def stock_key(prefix, *parts):
+    """Build a cache key for catalog data that shows unit counts.
+
+    It is tied to the stock version as well as the catalog version, so stock
+    moves that leave every product's availability alone still invalidate it.
+    """
+    return catalog_key(prefix, stock_version(), *parts)
+
+
+def _count(key):
+    cache = catalog_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cached_listing(key, render):
+    """Return the listing cached under key, rendering and storing it on a miss."""
+    cache = catalog_cache()
+    html = cache.get(key)
+    if html is None:
+        _count(LISTING_MISSES_KEY)
+        html = render()
+        cache.set(key, html, settings.CATALOG_CACHE_TIMEOUT)
+    else:
+        _count(LISTING_HITS_KEY)
+    return html
+
+
+def listing_cache_stats():
+    """Return the listing cache hit and miss counters."""
+    counters = catalog_cache().get_many([LISTING_HITS_KEY, LISTING_MISSES_KEY])
+    return {
+        "hits": counters.get(LISTING_HITS_KEY, 0),
+        "misses": counters.get(LISTING_MISSES_KEY, 0),
+    }
+
+
+def reset_listing_cache_stats():
+    """Set the listing cache hit and miss counters back to zero."""
+    catalog_cache().delete_many([LISTING_HITS_KEY, LISTING_MISSES_KEY])
+
+
+def navigation_categories():
+    """Return the categories listed in the site navigation.
+
+    They are read from a process-local copy, then from the shared catalog cache,
+    and only then from the database.
+    """
+    global _navigation
+    local = _navigation
+    now = time.monotonic()
+    if local is not None and local[0] > now:
+        return local[1]
+    with _navigation_lock:
+        cache = catalog_cache()
+        categories = cache.get(NAVIGATION_KEY)
+        if categories is None:
+            categories = list(Category.objects.order_by("pk"))
+            cache.set(NAVIGATION_KEY, categories, timeout=None)
+        _navigation = (now + NAVIGATION_LOCAL_TIMEOUT, categories)
+    return categories
+
+
+def invalidate_navigation_categories():
+    """Drop the cached navigation categories in this process and the shared cache."""
+    global _navigation
+    _navigation = None
+    catalog_cache().delete(NAVIGATION_KEY)
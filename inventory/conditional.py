@@ -0,0 +1,112 @@
+import functools
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+from account.context_processors import wishlist_info
+from cart.context_processors import cart_info
+from .cache import catalog_last_modified, stock_key
+from .models import Category, Product
+
+
+def visitor_state(request):
+    """Return what a catalog page shows about the visitor, or None if it must be rendered.
+
+    Pages show the visitor's cart and wishlist counts and embed a CSRF token
+    derived from the CSRF cookie, so all of them belong in the validators.
+    Pending flash messages are shown once, so a page carrying them is never
+    answered with a 304.
+    """
+    if len(get_messages(request)):
+        return None
+    user = request.user
+    return (
+        user.pk,
+        cart_info(request)["cart_count"],
+        wishlist_info(request)["wishlist_count"] if user.is_authenticated else 0,
+        request.META.get("CSRF_COOKIE", ""),
+    )
+
+
+def page_validators(request, updated_at=None):
+    """Return the (ETag, Last-Modified) pair of a catalog page, either of which may be None.
+
+    The ETag covers the catalog and stock versions, the page's own updated_at, the path,
+    query string and language, and the visitor's state. Last-Modified cannot
+    tell visitors apart, so it is only given to anonymous visitors with an
+    empty cart, who all see the same page.
+    """
+    state = visitor_state(request)
+    if state is None:
+        return None, None
+    etag = stock_key(
+        "page",
+        request.path,
+        sorted(request.GET.lists()),
+        get_language(),
+        updated_at,
+        state,
+    )
+    last_modified = None
+    if state[:3] == (None, 0, 0):
+        last_modified = catalog_last_modified()
+        if updated_at is not None:
+            last_modified = max(last_modified, updated_at)
+    return etag, last_modified
+
+
+def product_updated_at(product_id):
+    return (
+        Product.objects.filter(pk=product_id)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def category_updated_at(category_id):
+    return (
+        Category.objects.filter(pk=category_id)
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def conditional_page(updated_at=None):
+    """Answer conditional GETs of a catalog page with 304 before the view runs.
+
+    updated_at, if given, is called with the view's arguments and returns the
+    updated_at of the object the page shows, or None if it does not exist, in
+    which case the view runs and can raise its 404. Responses are marked
+    no-cache, so browsers and shared caches revalidate them on every use.
+    """
+
+    def validators(request, *args, **kwargs):
+        # condition() asks for the ETag and Last-Modified separately
+        if not hasattr(request, "_page_validators"):
+            changed = updated_at(*args, **kwargs) if updated_at else None
+            if updated_at is not None and changed is None:
+                request._page_validators = (None, None)
+            else:
+                request._page_validators = page_validators(request, changed)
+        return request._page_validators
+
+    def etag(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validators(request, *args, **kwargs)[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(
+            view
+        )
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,7 +1,11 @@
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+from .cache import navigation_categories
 from .forms import SearchForm
 
 
 def categories_processor(request):
-    categories = Category.objects.all()
-    return {"categories": categories, "search_form": SearchForm()}
+    """Provide the navigation categories and search form, built only if a template uses them."""
+    return {
+        "categories": SimpleLazyObject(navigation_categories),
+        "search_form": SimpleLazyObject(SearchForm),
+    }
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils.translation import gettext_lazy as _
+from .cache import catalog_cache, catalog_key
+from .models import Product
+
+# (label, lower bound, upper bound) of the effective price in cents, bounds are
+# inclusive-exclusive
+PRICE_BUCKETS = [
+    (_("Under $50"), None, 5000),
+    (_("$50 to $100"), 5000, 10000),
+    (_("$100 to $250"), 10000, 25000),
+    (_("$250 and over"), 25000, None),
+]
+
+
+def price_bucket_condition(low, high):
+    """Return the Q object matching effective prices in [low, high)."""
+    condition = Q()
+    if low is not None:
+        condition &= Q(effective_price__gte=low)
+    if high is not None:
+        condition &= Q(effective_price__lt=high)
+    return condition
+
+
+def price_bucket(value):
+    """Return the (low, high) bounds of the bucket whose index is value, or None."""
+    try:
+        _label, low, high = PRICE_BUCKETS[int(value)]
+    except (TypeError, ValueError, IndexError):
+        return None
+    return low, high
+
+
+def compute_facets(products, filter_criteria_list, price_range=None):
+    """Count the results of every filter, category and price bucket in one query.
+
+    products is the listing before filters are applied (e.g. a category or the
+    search matches), and price_range the (low, high) bounds of the selected
+    price bucket, if any. Filter counts are what the listing would hold if that
+    filter were added to the active ones, and category counts break down the
+    current results, both within the selected price bucket. Price-bucket counts
+    are what the listing would hold with that bucket selected instead. The
+    query groups by category and counts conditionally, and the totals are
+    summed from the per-category rows.
+    """
+    conditions = Product.filter_conditions()
+    filtered = Q(
+        *[conditions[name] for name in filter_criteria_list if name in conditions]
+    )
+    active = filtered
+    if price_range is not None:
+        active &= price_bucket_condition(*price_range)
+    counts = {"total": Count("id", filter=active)}
+    for name, condition in conditions.items():
+        counts[f"filter_{name}"] = Count("id", filter=active & condition)
+    for i, (_label, low, high) in enumerate(PRICE_BUCKETS):
+        counts[f"price_{i}"] = Count(
+            "id", filter=filtered & price_bucket_condition(low, high)
+        )
+    rows = (
+        products.order_by()
+        .values("category_id", "category__name")
+        .annotate(**counts)
+        .order_by("category__name")
+    )
+
+    facets = {
+        "total": 0,
+        "filters": dict.fromkeys(conditions, 0),
+        "categories": [],
+        "price_buckets": [[label, 0] for label, _low, _high in PRICE_BUCKETS],
+    }
+    for row in rows:
+        facets["total"] += row["total"]
+        for name in conditions:
+            facets["filters"][name] += row[f"filter_{name}"]
+        for i, bucket in enumerate(facets["price_buckets"]):
+            bucket[1] += row[f"price_{i}"]
+        if row["total"]:
+            facets["categories"].append(
+                (row["category_id"], row["category__name"], row["total"])
+            )
+    return facets
+
+
+def get_facets(products, filter_criteria_list, scope, price_range=None):
+    """Return compute_facets for a listing, cached for the current catalog version.
+
+    scope identifies the unfiltered listing, e.g. ("category", 3) or
+    ("search", "gateron"), and is part of the cache key along with the filters
+    and price range.
+    """
+    cache = catalog_cache()
+    key = catalog_key("facets", scope, sorted(filter_criteria_list), price_range)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(products, filter_criteria_list, price_range)
+        cache.set(key, facets, settings.CATALOG_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,193 @@
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import tempfile
+import zlib
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.translation import get_language, override
+from .cache import catalog_version, stock_version
+from .models import Product
+
+FEED_FORMATS = ("csv", "jsonl", "xml")
+FEED_FIELDS = [
+    "id",
+    "sku",
+    "title",
+    "description",
+    "category",
+    "price",
+    "sale_price",
+    "availability",
+    "quantity",
+    "link",
+    "image_link",
+]
+CHUNK_SIZE = 2000
+
+
+def _money(cents):
+    return f"{cents / 100:.2f} CAD"
+
+
+def feed_rows(base_url, language=None):
+    """Yield one dict per product, reading the catalog in chunks.
+
+    Product links are built for the given language, which defaults to the
+    active one.
+    """
+    base_url = base_url.rstrip("/")
+    language = language or get_language()
+    products = (
+        Product.objects.select_related("category")
+        .only(
+            "id",
+            "sku",
+            "name",
+            "description",
+            "quantity",
+            "reserved_quantity",
+            "price",
+            "effective_price",
+            "image",
+            "image_variants",
+            "category__name",
+        )
+        .order_by("pk")
+    )
+    with override(language):
+        yield from _product_rows(products, base_url)
+
+
+def _product_rows(products, base_url):
+    # Reversing once instead of per row keeps URL resolution out of the loop
+    link = base_url + reverse("inventory:product", args=[0]).replace("/0/", "/{}/")
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        image = ""
+        if product.image:
+            # Marketplaces want a large JPEG, which the detail variant provides
+            detail = product.image_variants.get("variants", {}).get("detail", {})
+            image = base_url + default_storage.url(
+                detail.get("jpeg") or product.image.name
+            )
+        yield {
+            "id": product.pk,
+            "sku": product.sku or "",
+            "title": product.name,
+            "description": product.description,
+            "category": product.category.name,
+            "price": _money(product.price),
+            "sale_price": _money(product.effective_price),
+            "availability": "in stock" if product.is_available else "out of stock",
+            # Units held by checkouts in progress cannot be sold again
+            "quantity": product.available_quantity,
+            "link": link.format(product.pk),
+            "image_link": image,
+        }
+
+
+def serialize_csv(rows):
+    """Yield the rows as CSV text, one record at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FEED_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def serialize_jsonl(rows):
+    """Yield the rows as JSON lines."""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def serialize_xml(rows):
+    """Yield the rows as an XML document of <item> elements."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<products>\n'
+    for row in rows:
+        fields = "".join(
+            f"<{name}>{escape(str(value))}</{name}>" for name, value in row.items()
+        )
+        yield f"<item>{fields}</item>\n"
+    yield "</products>\n"
+
+
+SERIALIZERS = {"csv": serialize_csv, "jsonl": serialize_jsonl, "xml": serialize_xml}
+
+
+def gzip_chunks(chunks, min_size=64 * 1024):
+    """Gzip text chunks on the fly, yielding compressed blocks of at least min_size."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = []
+    size = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= min_size:
+            yield b"".join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b"".join(pending)
+
+
+def feed_path(file_format, base_url):
+    """Return where the feed for the current catalog and stock versions is cached on disk."""
+    digest = hashlib.md5(base_url.encode(), usedforsecurity=False).hexdigest()[:8]
+    version = f"{catalog_version()}.{stock_version()}"
+    name = f"products-{version}-{get_language()}-{digest}.{file_format}.gz"
+    return os.path.join(settings.CATALOG_FEED_DIR, name)
+
+
+def cached_feed(path, chunks):
+    """Yield chunks while writing them to path, which appears only once complete.
+
+    Older feeds of the same format are deleted after the new one is in place.
+    If the consumer stops early, e.g. because the client disconnected, the
+    partial file is discarded.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as temp:
+            for chunk in chunks:
+                temp.write(chunk)
+                yield chunk
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    # products-<version>-<language>-<site>.<format>.gz
+    variant = os.path.basename(path).split("-", 2)[2]
+    for old in glob.glob(os.path.join(directory, f"products-*-{variant}")):
+        if old != path:
+            try:
+                os.unlink(old)
+            except FileNotFoundError:
+                pass
+
+
+def read_file(path, block_size=64 * 1024):
+    """Yield a file's bytes in blocks."""
+    with open(path, "rb") as feed:
+        while block := feed.read(block_size):
+            yield block
+
+
+def product_feed(file_format, base_url):
+    """Return (path, gzip chunks) for the catalog feed, reusing the cached file if any."""
+    path = feed_path(file_format, base_url)
+    if os.path.exists(path):
+        return path, read_file(path)
+    rows = feed_rows(base_url, get_language())
+    return path, cached_feed(path, gzip_chunks(SERIALIZERS[file_format](rows)))
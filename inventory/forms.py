@@ -8,6 +8,8 @@ class ProductFilterForm(forms.Form):
         ("old-new", _("Oldest first")),
         ("price-high-low", _("Price: High to low")),
         ("price-low-high", _("Price: Low to high")),
+        ("final-price-high-low", _("Final price: High to low")),
+        ("final-price-low-high", _("Final price: Low to high")),
         ("discount-high-low", _("Discount: High to low")),
         ("discount-low-high", _("Discount: Low to high")),
         ("a-z", _("A to Z")),
@@ -35,10 +37,33 @@ class ProductFilterForm(forms.Form):
         label=_("Filters"),
     )
 
+    def __init__(self, *args, facets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if facets is not None:
+            counts = facets["filters"]
+            self.fields["filter_criteria"].choices = [
+                (value, f"{label} ({counts.get(value, 0)})")
+                for value, label in self.FILTER_CHOICES
+            ]
+
+
+class SearchFilterForm(ProductFilterForm):
+    SORT_CHOICES = [("relevance", _("Relevance"))] + ProductFilterForm.SORT_CHOICES
+
+    sort = forms.ChoiceField(
+        choices=SORT_CHOICES,
+        required=False,
+        initial="relevance",
+        label=_("Sort by"),
+    )
+
 
 class SearchForm(forms.Form):
     search = forms.CharField(
         required=True,
         max_length=200,
         label=_("Search"),
+        widget=forms.TextInput(
+            attrs={"list": "search-suggestions", "autocomplete": "off"}
+        ),
     )
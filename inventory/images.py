@@ -0,0 +1,213 @@
+import base64
+import collections
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from .cache import bump_catalog_version
+
+# Variant name -> maximum width in pixels; images are never upscaled
+VARIANT_WIDTHS = {"thumbnail": 160, "card": 480, "detail": 1200}
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+PLACEHOLDER_WIDTH = 16
+QUALITY = 80
+
+
+def _encode(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=QUALITY, **options)
+    return buffer.getvalue()
+
+
+def render_variants(data):
+    """Resize encoded image bytes into every variant and format.
+
+    Runs in worker processes, so it only deals with bytes: it returns the
+    metadata to store on the model and a {suffix: bytes} mapping of files to
+    write, where suffix looks like "card.webp".
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+    width, height = image.size
+    files = {}
+    variants = {}
+    for name, max_width in VARIANT_WIDTHS.items():
+        if max_width < width:
+            resized = image.resize(
+                (max_width, round(height * max_width / width)), Image.LANCZOS
+            )
+        else:
+            resized = image
+        variants[name] = {"width": resized.width, "height": resized.height}
+        for extension, image_format in FORMATS.items():
+            files[f"{name}.{extension}"] = _encode(resized, image_format, optimize=True)
+    tiny = image.resize(
+        (PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width)))
+    )
+    placeholder = base64.b64encode(_encode(tiny, "JPEG")).decode()
+    meta = {
+        "width": width,
+        "height": height,
+        "placeholder": f"data:image/jpeg;base64,{placeholder}",
+        "variants": variants,
+    }
+    return meta, files
+
+
+def variant_name(source_name, suffix):
+    """Return the storage name of a variant of the source image."""
+    stem = os.path.splitext(source_name)[0]
+    return f"variants/{stem}-{suffix}"
+
+
+def write_variants(instance, meta, files):
+    """Write rendered variants to storage and set the metadata on the instance."""
+    source = instance.image.name
+    for variant in meta["variants"].values():
+        variant.update(dict.fromkeys(FORMATS))
+    for suffix, content in files.items():
+        name = variant_name(source, suffix)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        variant, extension = suffix.split(".")
+        meta["variants"][variant][extension] = default_storage.save(
+            name, ContentFile(content)
+        )
+    meta["source"] = source
+    instance.image_variants = meta
+    return meta
+
+
+def store_variants(instance, meta, files):
+    """Write rendered variants next to the source image and record them on the row."""
+    write_variants(instance, meta, files)
+    # update() skips post_save, so recording variants never triggers a new render
+    type(instance).objects.filter(pk=instance.pk).update(image_variants=meta)
+    # Cached listings and page validators still point at the original image
+    transaction.on_commit(bump_catalog_version)
+    return meta
+
+
+def needs_variants(instance):
+    """Return whether the instance has an image whose variants are missing or stale."""
+    return bool(instance.image) and (
+        instance.image_variants.get("source") != instance.image.name
+    )
+
+
+def _read(instance):
+    with instance.image.open("rb") as image:
+        return image.read()
+
+
+class VariantRenderer:
+    """Render variants of many instances in a process pool, saving rows in batches.
+
+    Only a few images per worker are read ahead, so memory stays flat however
+    many instances are submitted. The metadata is written with bulk_update,
+    which, like update(), skips post_save. Instances that cannot be rendered,
+    e.g. because their source file is missing or is not an image, are collected
+    in failed.
+    """
+
+    def __init__(self, workers=None, batch_size=200):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.failed = []
+        self.rendered = 0
+        self._pending = collections.deque()
+        self._done = []
+        self._pool = None
+
+    def __enter__(self):
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            while self._pending:
+                self._store_next()
+            self.flush()
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+
+    def submit(self, instance):
+        """Queue an instance for rendering, storing earlier results if too many are queued."""
+        try:
+            data = _read(instance)
+        except OSError:
+            self.failed.append(instance)
+            return
+        self._pending.append((instance, self._pool.submit(render_variants, data)))
+        while len(self._pending) >= 4 * self.workers or (
+            self._pending and self._pending[0][1].done()
+        ):
+            self._store_next()
+
+    def _store_next(self):
+        instance, future = self._pending.popleft()
+        try:
+            write_variants(instance, *future.result())
+        except OSError:
+            self.failed.append(instance)
+            return
+        self._done.append(instance)
+        if len(self._done) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Save the metadata of every instance rendered since the last flush."""
+        by_model = collections.defaultdict(list)
+        for instance in self._done:
+            by_model[type(instance)].append(instance)
+        for model, instances in by_model.items():
+            model.objects.bulk_update(instances, ["image_variants"])
+        if self._done:
+            transaction.on_commit(bump_catalog_version)
+        self.rendered += len(self._done)
+        self._done = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=settings.CATALOG_IMAGE_WORKERS)
+    return _pool
+
+
+def schedule_variants(instance):
+    """Render an instance's variants in the background process pool after an upload.
+
+    With CATALOG_IMAGE_VARIANTS_ASYNC disabled, the variants are rendered inline.
+    """
+    if not needs_variants(instance):
+        return
+    try:
+        data = _read(instance)
+        if not settings.CATALOG_IMAGE_VARIANTS_ASYNC:
+            store_variants(instance, *render_variants(data))
+            return
+    except OSError:
+        # Listings fall back to the original image until a backfill succeeds
+        return
+
+    def stored(future):
+        # Runs on the pool's result thread, which needs its own connection
+        if future.exception() is None:
+            try:
+                store_variants(instance, *future.result())
+            finally:
+                connections.close_all()
+
+    _get_pool().submit(render_variants, data).add_done_callback(stored)
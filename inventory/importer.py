@@ -0,0 +1,154 @@
+import csv
+import json
+from django.conf import settings
+from django.db import transaction
+from .cache import (
+    bump_catalog_version,
+    bump_search_index_generation,
+    invalidate_navigation_categories,
+)
+from .images import needs_variants
+from .models import Category, Product
+from .related import rebuild_related_products, refresh_related_products
+from .search import get_search_backend
+
+# Columns written on insert and overwritten when the sku already exists
+UPDATE_FIELDS = [
+    "name",
+    "description",
+    "quantity",
+    "price",
+    "discount_percentage",
+    "image",
+    "category",
+    "updated_at",
+]
+INTEGER_FIELDS = ["quantity", "price", "discount_percentage"]
+
+
+class RowError(ValueError):
+    """Raised when an import row cannot be turned into a product."""
+
+
+def read_rows(stream, file_format):
+    """Yield one dict per CSV record or JSON line without reading the whole stream."""
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+    elif file_format == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+class CatalogImporter:
+    """Upsert products by sku from a stream of rows, one transaction per batch.
+
+    Categories are resolved through a name -> id map loaded in a single query
+    (unknown names are created once), and each batch is written with a single
+    INSERT ... ON CONFLICT (sku) DO UPDATE. bulk_create skips post_save, so the
+    importer refreshes the search index for each batch itself and, at the end,
+    bumps the catalog version and search index generation so caches and the
+    in-memory indexes of every process catch up.
+    """
+
+    def __init__(self, batch_size=2000, renderer=None):
+        self.batch_size = batch_size
+        self.renderer = renderer
+        self.categories = dict(Category.objects.values_list("name", "id"))
+        self.imported = 0
+        self.errors = []
+        self._product_ids = set()
+        self._created_categories = False
+
+    def category_id(self, name):
+        """Return the id of the named category, creating it on first sight."""
+        name = (name or "").strip()
+        if not name:
+            raise RowError("missing category")
+        if name not in self.categories:
+            category = Category.objects.create(name=name, description="", image="")
+            self.categories[name] = category.pk
+            self._created_categories = True
+        return self.categories[name]
+
+    def product_from_row(self, row):
+        """Build an unsaved Product from an import row."""
+        sku = str(row.get("sku") or "").strip()
+        name = str(row.get("name") or "").strip()
+        if not sku or not name:
+            raise RowError("missing sku or name")
+        values = {}
+        for field in INTEGER_FIELDS:
+            raw = row.get(field)
+            try:
+                values[field] = int(raw) if raw not in (None, "") else 0
+            except (TypeError, ValueError):
+                raise RowError(f"{field} is not an integer: {raw!r}") from None
+        if not 0 <= values["discount_percentage"] <= 100:
+            raise RowError("discount_percentage must be between 0 and 100")
+        return Product(
+            sku=sku,
+            name=name,
+            description=row.get("description") or "",
+            image=row.get("image") or "",
+            category_id=self.category_id(row.get("category")),
+            **values,
+        )
+
+    def run(self, rows):
+        """Import every row, yielding the running total after each batch."""
+        batch = {}
+        for line, row in enumerate(rows, start=1):
+            try:
+                product = self.product_from_row(row)
+            except RowError as exc:
+                self.errors.append((line, str(exc)))
+                continue
+            # A sku may only be upserted once per statement; the last row wins
+            batch[product.sku] = product
+            if len(batch) >= self.batch_size:
+                self.write(list(batch.values()))
+                batch = {}
+                yield self.imported
+        if batch:
+            self.write(list(batch.values()))
+            yield self.imported
+        self.finish()
+
+    def write(self, products):
+        """Upsert one batch and refresh its search rows in a single transaction."""
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=UPDATE_FIELDS,
+            )
+            get_search_backend().index_products(products)
+        self.imported += len(products)
+        self._product_ids.update(product.pk for product in products)
+        if self.renderer is not None:
+            with_images = [p.pk for p in products if p.image]
+            for product in Product.objects.filter(pk__in=with_images).only(
+                "id", "image", "image_variants"
+            ):
+                if needs_variants(product):
+                    self.renderer.submit(product)
+
+    def finish(self):
+        """Invalidate everything that was built from the catalog before the import."""
+        bump_catalog_version()
+        bump_search_index_generation()
+        # bulk_create skips the signals that keep related products fresh; only
+        # the imported products and those listing them or priced near them
+        # move, refreshed a batch at a time to bound the ids in each query
+        product_ids = sorted(self._product_ids)
+        if len(product_ids) > settings.CATALOG_RELATED_REFRESH_LIMIT:
+            rebuild_related_products()
+        else:
+            for start in range(0, len(product_ids), self.batch_size):
+                refresh_related_products(product_ids[start : start + self.batch_size])
+        if self._created_categories:
+            invalidate_navigation_categories()
@@ -0,0 +1,42 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from inventory.benchmarks import percentile, seeded_catalog, timed
+from inventory.trigram import build_trigram_index
+
+QUERIES = ["gateron", "gaterom", "cherri mx", "kailh boxx", "akko oil kng", "durok"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway catalog, build the in-memory trigram index over it and "
+        "report its memory footprint and fuzzy query latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=200)
+
+    def handle(self, *args, **options):
+        with seeded_catalog(options["products"]):
+            tracemalloc.start()
+            start = time.perf_counter()
+            index = build_trigram_index()
+            build_ms = (time.perf_counter() - start) * 1000
+            memory, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f"indexed {len(index)} products in {build_ms:.0f} ms, "
+                f"{memory / 2**20:.1f} MiB "
+                f"({memory / max(len(index), 1):.0f} bytes per product)"
+            )
+            self.stdout.write(
+                f"{'query':18} {'hits':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+            )
+            for query in QUERIES:
+                timings = timed(lambda q=query: index.search(q), options["repeat"])
+                self.stdout.write(
+                    f"{query:18} {len(index.search(query)):6d} "
+                    f"{percentile(timings, 50):9.3f} {percentile(timings, 95):9.3f} "
+                    f"{percentile(timings, 99):9.3f}"
+                )
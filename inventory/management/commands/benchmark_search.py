@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from inventory.benchmarks import percentile, seeded_catalog, timed
+from inventory.models import Product
+from inventory.search import IContainsSearchBackend, get_search_backend
+
+QUERIES = ["gateron", "cherry red", "oil king linear", "milky", "keycap set", "durok"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway catalog and compare the configured search backend with "
+        "the icontains scan on first-page latency and hit counts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        backends = {
+            "icontains": (IContainsSearchBackend(), ("-created_date", "-id")),
+            type(get_search_backend()).__name__: (
+                get_search_backend(),
+                ("-search_rank", "-id"),
+            ),
+        }
+        page_size = settings.CATALOG_PAGE_SIZE
+        with seeded_catalog(options["products"]):
+            self.stdout.write(
+                f"{'backend':26} {'query':18} {'hits':>7} {'p50 ms':>9} {'p95 ms':>9}"
+            )
+            for query in QUERIES:
+                for name, (backend, ordering) in backends.items():
+                    products = backend.search(query, Product.objects.all())
+                    first_page = products.order_by(*ordering)[:page_size]
+                    timings = timed(
+                        lambda qs=first_page: list(qs.all()), options["repeat"]
+                    )
+                    self.stdout.write(
+                        f"{name:26} {query:18} {products.count():7d} "
+                        f"{percentile(timings, 50):9.2f} {percentile(timings, 95):9.2f}"
+                    )
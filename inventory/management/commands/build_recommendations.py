@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from inventory.recommender import build_recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        'Update the "customers who bought this also bought" products from paid '
+        "orders, incrementally unless --full is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="Recompute every product."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, help="Order items read per chunk."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        run = build_recommendations(
+            full=options["full"], chunk_size=options["chunk_size"]
+        )
+        kind = "Full" if run.full else "Incremental"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{kind} run: {run.orders} orders, {run.products} products updated "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,30 @@
+import shutil
+from django.core.management.base import BaseCommand
+from django.utils import translation
+from inventory.feeds import FEED_FORMATS, product_feed
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the gzipped product feed (cached on disk per catalog version) to a "
+        "file, or print the cached feed's path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FEED_FORMATS, default="csv")
+        parser.add_argument(
+            "--base-url",
+            required=True,
+            help="Site root used for product and image links, e.g. https://example.com",
+        )
+        parser.add_argument("--language", default="en")
+        parser.add_argument("--output", help="Copy the feed here as well.")
+
+    def handle(self, *args, **options):
+        with translation.override(options["language"]):
+            path, chunks = product_feed(options["format"], options["base_url"])
+            for _chunk in chunks:
+                pass
+        if options["output"]:
+            shutil.copyfile(path, options["output"])
+        self.stdout.write(path)
@@ -0,0 +1,41 @@
+import itertools
+from django.core.management.base import BaseCommand
+from inventory.images import VariantRenderer, needs_variants
+from inventory.models import Category, Product
+
+# Rows read from the database at a time; only the current chunk and the few
+# images the renderer reads ahead are held in memory
+CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Render the responsive WebP/JPEG variants of product and category images "
+        "that do not have up-to-date variants yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--force", action="store_true", help="Re-render images that have variants."
+        )
+
+    def handle(self, *args, **options):
+        for model in (Category, Product):
+            rows = model.objects.exclude(image="").iterator(chunk_size=CHUNK_SIZE)
+            failed = 0
+            with VariantRenderer(options["workers"]) as renderer:
+                while chunk := list(itertools.islice(rows, CHUNK_SIZE)):
+                    for obj in chunk:
+                        if options["force"]:
+                            obj.image_variants = {}
+                        elif not needs_variants(obj):
+                            continue
+                        renderer.submit(obj)
+                    failed += len(renderer.failed)
+                    renderer.failed.clear()
+            failed += len(renderer.failed)
+            self.stdout.write(
+                f"{model._meta.verbose_name_plural}: "
+                f"{renderer.rendered} rendered, {failed} failed"
+            )
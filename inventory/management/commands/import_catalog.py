@@ -0,0 +1,67 @@
+import contextlib
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from inventory.images import VariantRenderer
+from inventory.importer import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream products from a CSV or JSONL file (or - for stdin) and upsert them "
+        "by sku. Columns: sku, name, description, category, price (cents), "
+        "quantity, discount_percentage, image (storage name)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Image variant worker processes."
+        )
+        parser.add_argument(
+            "--skip-images",
+            action="store_true",
+            help="Leave image variants to generate_image_variants.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".")
+        if file_format not in ("csv", "jsonl"):
+            raise CommandError("Pass --format csv or --format jsonl.")
+
+        with contextlib.ExitStack() as stack:
+            if path == "-":
+                stream = sys.stdin
+            else:
+                try:
+                    stream = stack.enter_context(
+                        open(path, newline="", encoding="utf-8")
+                    )
+                except OSError as exc:
+                    raise CommandError(exc) from exc
+            renderer = None
+            if not options["skip_images"]:
+                renderer = stack.enter_context(VariantRenderer(options["workers"]))
+            importer = CatalogImporter(options["batch_size"], renderer)
+
+            started = time.perf_counter()
+            for imported in importer.run(read_rows(stream, file_format)):
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{imported} rows, {imported / elapsed:.0f} rows/s")
+
+        elapsed = time.perf_counter() - started
+        for line, error in importer.errors[:20]:
+            self.stderr.write(f"row {line}: {error}")
+        self.stdout.write(
+            f"Imported {importer.imported} rows in {elapsed:.1f} s "
+            f"({importer.imported / elapsed if elapsed else 0:.0f} rows/s), "
+            f"{len(importer.errors)} skipped"
+        )
+        if renderer is not None:
+            self.stdout.write(
+                f"Rendered {renderer.rendered} images, {len(renderer.failed)} failed"
+            )
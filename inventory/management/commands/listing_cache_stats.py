@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from inventory.cache import (
+    catalog_version,
+    listing_cache_stats,
+    reset_listing_cache_stats,
+)
+
+
+class Command(BaseCommand):
+    help = "Show the listing cache hit and miss counters of CATALOG_CACHE_ALIAS."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters after printing."
+        )
+
+    def handle(self, *args, **options):
+        stats = listing_cache_stats()
+        lookups = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / lookups if lookups else 0.0
+        self.stdout.write(
+            f"catalog version {catalog_version()}: {stats['hits']} hits, "
+            f"{stats['misses']} misses, {ratio:.1%} hit ratio"
+        )
+        if options["reset"]:
+            reset_listing_cache_stats()
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from inventory.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = "Recompute the top related products of every product."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, help="Related products kept per product."
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild_related_products(options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ranked related products for {count} products "
+                f"in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0002_product_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_average",
+            field=models.FloatField(default=0, verbose_name="rating_average"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.IntegerField(default=0, verbose_name="rating_count"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.IntegerField(default=0, verbose_name="rating_sum"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["rating_average", "id"], name="product_rating_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "rating_average", "id"],
+                name="product_cat_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", 0)),
+                fields=["rating_average", "id"],
+                name="product_instock_rating_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_product_fts(apps, schema_editor):
+    """Create and fill the FTS5 table used by SQLiteFTSSearchBackend."""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE inventory_product_fts USING fts5("
+        "name, description, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    # Persist the rank function so the hidden rank column weights name hits higher
+    schema_editor.execute(
+        "INSERT INTO inventory_product_fts (inventory_product_fts, rank) "
+        "VALUES ('rank', 'bm25(10.0, 1.0)')"
+    )
+    schema_editor.execute(
+        "INSERT INTO inventory_product_fts (rowid, name, description) "
+        "SELECT id, name, description FROM inventory_product"
+    )
+
+
+def drop_product_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE inventory_product_fts")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0003_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchEntry",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="inventory.product",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("description", models.TextField()),
+                ("document", models.TextField(db_column="inventory_product_fts")),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "inventory_product_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_product_fts, drop_product_fts),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0007_related_products"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecommenderRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("paid_until", models.DateTimeField(verbose_name="paid_until")),
+                ("full", models.BooleanField(verbose_name="full")),
+                ("products", models.IntegerField(verbose_name="products")),
+                ("orders", models.IntegerField(verbose_name="orders")),
+            ],
+            options={
+                "get_latest_by": "paid_until",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductNeighbour",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField(verbose_name="rank")),
+                ("similarity", models.FloatField(verbose_name="similarity")),
+                (
+                    "neighbour",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbour_of_entries",
+                        to="inventory.product",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="neighbour_entries",
+                        to="inventory.product",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("product", "rank"), name="product_neighbour_rank_unique"
+                    )
+                ],
+            },
+        ),
+    ]
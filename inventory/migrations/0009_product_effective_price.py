@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:05
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0008_co_purchase_recommender"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    models.F("price"),
+                    "-",
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.expressions.CombinedExpression(
+                            models.F("price"), "*", models.F("discount_percentage")
+                        ),
+                        "/",
+                        models.Value(100),
+                    ),
+                ),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["effective_price", "id"], name="product_effective_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "effective_price", "id"],
+                name="product_cat_eff_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", 0)),
+                fields=["effective_price", "id"],
+                name="product_instock_eff_price_idx",
+            ),
+        ),
+    ]
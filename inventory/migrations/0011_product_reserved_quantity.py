@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0010_category_product_updated_at"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_price_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_discount_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_name_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_rating_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="product_instock_eff_price_idx",
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="reserved_quantity",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="reserved_quantity"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["created_date", "id"],
+                name="product_instock_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["price", "id"],
+                name="product_instock_price_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["discount_percentage", "id"],
+                name="product_instock_discount_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["name", "id"],
+                name="product_instock_name_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["rating_average", "id"],
+                name="product_instock_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("quantity__gt", models.F("reserved_quantity"))),
+                fields=["effective_price", "id"],
+                name="product_instock_eff_price_idx",
+            ),
+        ),
+    ]
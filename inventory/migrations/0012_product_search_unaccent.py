@@ -0,0 +1,38 @@
+from django.db import migrations
+
+SEARCH_CONFIG = "catalog_unaccent"
+
+
+def create_unaccent_config(apps, schema_editor):
+    """Create the accent-insensitive text search configuration of PostgresSearchBackend.
+
+    It is the "simple" configuration with words passed through the unaccent
+    dictionary first. Creating the unaccent extension needs a role allowed to
+    create extensions, or the extension installed beforehand.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    schema_editor.execute(
+        f"CREATE TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} (COPY = simple)"
+    )
+    schema_editor.execute(
+        f"ALTER TEXT SEARCH CONFIGURATION {SEARCH_CONFIG} "
+        "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, simple"
+    )
+
+
+def drop_unaccent_config(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP TEXT SEARCH CONFIGURATION {SEARCH_CONFIG}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0011_product_reserved_quantity"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_unaccent_config, drop_unaccent_config),
+    ]
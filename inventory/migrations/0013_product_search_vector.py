@@ -0,0 +1,63 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+SEARCH_CONFIG = "catalog_unaccent"
+
+
+def create_search_vectors(apps, schema_editor):
+    """Create and fill the tsvector table and GIN index of PostgresSearchBackend."""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE TABLE inventory_product_search ("
+        "product_id bigint PRIMARY KEY "
+        "REFERENCES inventory_product (id) ON DELETE CASCADE, "
+        "vector tsvector NOT NULL)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX inventory_product_search_vector "
+        "ON inventory_product_search USING gin (vector)"
+    )
+    schema_editor.execute(
+        "INSERT INTO inventory_product_search (product_id, vector) "
+        f"SELECT id, setweight(to_tsvector('{SEARCH_CONFIG}', name), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', description), 'B') "
+        "FROM inventory_product"
+    )
+
+
+def drop_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP TABLE inventory_product_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0012_product_search_unaccent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchVector",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_vector",
+                        serialize=False,
+                        to="inventory.product",
+                    ),
+                ),
+                ("vector", models.TextField()),
+            ],
+            options={
+                "db_table": "inventory_product_search",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(create_search_vectors, drop_search_vectors),
+    ]
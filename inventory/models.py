@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Cast
+from django.db.models.lookups import GreaterThan
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import datetime
@@ -11,6 +13,11 @@ class Category(models.Model):
     name = models.CharField(_("name"), max_length=100)
     description = models.TextField(_("description"))
     image = models.ImageField(_("image"))
+    # Resized WebP/JPEG copies of the image, written by inventory.images
+    image_variants = models.JSONField(
+        _("image_variants"), default=dict, blank=True, editable=False
+    )
+    updated_at = models.DateTimeField(_("updated_at"), auto_now=True)
 
     def __str__(self):
         return self.name
@@ -20,22 +27,57 @@ class Product(models.Model):
     """Represents a single Product."""
 
     name = models.CharField(_("name"), max_length=200)
+    # Supplier stock keeping unit, the key import_catalog upserts on
+    sku = models.CharField(_("sku"), max_length=64, unique=True, null=True, blank=True)
     description = models.TextField(_("description"))
     quantity = models.IntegerField(_("quantity"), default=0)
+    # Units held by checkouts in progress (cart.models.StockHold); only the
+    # rest can be sold, so listings compare it with quantity
+    reserved_quantity = models.IntegerField(
+        _("reserved_quantity"), default=0, editable=False
+    )
     image = models.ImageField(_("image"))
+    image_variants = models.JSONField(
+        _("image_variants"), default=dict, blank=True, editable=False
+    )
     price = models.IntegerField(_("price"), default=0)
     created_date = models.DateTimeField(default=timezone.now)
+    # Also moved forward when its reviews, votes or comments change, so the
+    # product page's validators follow everything the page shows
+    updated_at = models.DateTimeField(_("updated_at"), auto_now=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     discount_percentage = models.IntegerField(
         _("discount_percentage"),
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(100)],
     )
+    # Aggregates over the reviews that count towards the rating, kept in sync by
+    # review.signals so listings and product pages never aggregate reviews.
+    rating_sum = models.IntegerField(_("rating_sum"), default=0)
+    rating_count = models.IntegerField(_("rating_count"), default=0)
+    rating_average = models.FloatField(_("rating_average"), default=0)
+    # What the customer pays, computed and stored by the database so listings can
+    # sort and filter on it; integer division matches get_discounted_price().
+    effective_price = models.GeneratedField(
+        expression=models.F("price")
+        - models.F("price") * models.F("discount_percentage") / 100,
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+
+    # Units that can still be added to carts: the stock less the units held by
+    # checkouts in progress
+    AVAILABLE_QUANTITY = models.F("quantity") - models.F("reserved_quantity")
 
     @property
     def is_available(self):
         """To check if the product is available or not."""
-        return self.quantity > 0
+        return self.quantity > self.reserved_quantity
+
+    @property
+    def available_quantity(self):
+        """Return the units that can still be sold, never below zero."""
+        return max(self.quantity - self.reserved_quantity, 0)
 
     @property
     def price_in_dollars(self):
@@ -50,12 +92,33 @@ class Product(models.Model):
         cents = discounted % 100
         return f"${dollars}.{cents:02d}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The price and discount effective_price was generated from
+        instance._priced_from = (
+            instance.__dict__.get("price"),
+            instance.__dict__.get("discount_percentage"),
+        )
+        return instance
+
     def get_discounted_price(self):
         """if there is a discount, return the discounted price"""
-        if self.discount_percentage > 0:
-            discount_amount = (self.price * self.discount_percentage) // 100
-            return self.price - discount_amount
-        return self.price
+        if "effective_price" in self.__dict__ and getattr(
+            self, "_priced_from", None
+        ) == (self.price, self.discount_percentage):
+            # Loaded from the database and not edited since; unsaved, just saved
+            # or edited instances compute it
+            return self.effective_price
+        return self.discounted_price(self.price, self.discount_percentage)
+
+    @staticmethod
+    def discounted_price(price, discount_percentage):
+        """Return a cent price with the percentage discount applied, e.g. for .values() rows."""
+        if discount_percentage > 0:
+            discount_amount = (price * discount_percentage) // 100
+            return price - discount_amount
+        return price
 
     def created_recently(self):
         """Return if the Product was created recently."""
@@ -65,61 +128,356 @@ class Product(models.Model):
         """Return if the Product is a new arrival - time window 30 days."""
         return self.created_date >= timezone.now() - datetime.timedelta(days=30)
 
+    SORT_ORDERINGS = {
+        "new-old": "-created_date",
+        "old-new": "created_date",
+        "price-high-low": "-price",
+        "price-low-high": "price",
+        "final-price-high-low": "-effective_price",
+        "final-price-low-high": "effective_price",
+        "discount-high-low": "-discount_percentage",
+        "discount-low-high": "discount_percentage",
+        "a-z": "name",
+        "z-a": "-name",
+        "rating-high-low": "-rating_average",
+    }
+
     @classmethod
     def sort_by(cls, sort_criteria, products=None):
-        """Sort products by various criteria on any queryset."""
+        """Sort products by various criteria on any queryset.
+
+        Every ordering ends with the id in the same direction as the sort key, so
+        ties are deterministic and listings can be paginated with keyset cursors.
+        """
         if products is None:
             products = cls.objects.all()
-        if sort_criteria == "new-old":
-            return products.order_by("-created_date")
-        if sort_criteria == "old-new":
-            return products.order_by("created_date")
-        if sort_criteria == "price-high-low":
-            return products.order_by("-price")
-        if sort_criteria == "price-low-high":
-            return products.order_by("price")
-        if sort_criteria == "discount-high-low":
-            return products.order_by("-discount_percentage")
-        if sort_criteria == "discount-low-high":
-            return products.order_by("discount_percentage")
-        if sort_criteria == "a-z":
-            return products.order_by("name")
-        if sort_criteria == "z-a":
-            return products.order_by("-name")
-        if sort_criteria == "rating-high-low":
-            return products.annotate(avg_rating=models.Avg("reviews__rating")).order_by(
-                "-avg_rating"
+        ordering = cls.SORT_ORDERINGS.get(sort_criteria, "-created_date")
+        tiebreaker = "-id" if ordering.startswith("-") else "id"
+        return products.order_by(ordering, tiebreaker)
+
+    @classmethod
+    def add_rating(cls, product_id, rating, count=1):
+        """Atomically add ratings to (or, with negative values, remove them from) the stored aggregate."""
+        new_sum = models.F("rating_sum") + rating
+        new_count = models.F("rating_count") + count
+        return cls.objects.filter(pk=product_id).update(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating_average=models.Case(
+                models.When(
+                    GreaterThan(new_count, 0),
+                    then=Cast(new_sum, models.FloatField()) / new_count,
+                ),
+                default=models.Value(0.0),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def take_stock(cls, product_id, quantity, held=0):
+        """Atomically sell quantity units, held of them from the buyer's own hold.
+
+        Returns False, changing nothing, if fewer units are left once the other
+        buyers' holds are set aside. The check and the decrement are one
+        conditional UPDATE, so concurrent buyers can never both take the last
+        unit.
+        """
+        return bool(
+            cls.objects.filter(
+                pk=product_id,
+                quantity__gte=models.F("reserved_quantity") - held + quantity,
+            ).update(
+                quantity=models.F("quantity") - quantity,
+                reserved_quantity=models.F("reserved_quantity") - held,
+                updated_at=timezone.now(),
             )
-        return products.order_by("-created_date")
+        )
+
+    @classmethod
+    def availability_changed(cls, changes):
+        """Return whether a product went in or out of stock after {product id: change}.
+
+        changes holds how much each product's available quantity has just
+        moved by; only those crossing zero change what listings show.
+        """
+        available = cls.objects.filter(pk__in=changes).values_list(
+            "pk", cls.AVAILABLE_QUANTITY
+        )
+        return any((units > 0) != (units - changes[pk] > 0) for pk, units in available)
+
+    @staticmethod
+    def _per_product(quantities):
+        """Return a CASE expression giving each product id its quantity."""
+        return models.Case(
+            *[
+                models.When(pk=product_id, then=models.Value(quantity))
+                for product_id, quantity in quantities.items()
+            ],
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        )
+
+    @classmethod
+    def reserve_stock(cls, quantities):
+        """Hold {product id: quantity} units for a checkout in one UPDATE, all or nothing.
+
+        Returns False if any product has fewer unreserved units than asked for,
+        in which case the caller must roll back its transaction.
+        """
+        wanted = cls._per_product(quantities)
+        reserved = cls.objects.filter(
+            pk__in=quantities,
+            quantity__gte=models.F("reserved_quantity") + wanted,
+        ).update(
+            reserved_quantity=models.F("reserved_quantity") + wanted,
+            updated_at=timezone.now(),
+        )
+        return reserved == len(quantities)
+
+    @classmethod
+    def release_stock(cls, quantities):
+        """Give {product id: quantity} held units back, in one UPDATE."""
+        return cls.objects.filter(pk__in=quantities).update(
+            reserved_quantity=models.F("reserved_quantity")
+            - cls._per_product(quantities),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def filter_conditions(cls):
+        """Return the Q object behind each filter criterion, keyed by criterion name."""
+        return {
+            "quantity": models.Q(quantity__gt=models.F("reserved_quantity")),
+            "discount_percentage": models.Q(discount_percentage__gt=0),
+            "created_recently": models.Q(
+                created_date__gte=timezone.now() - datetime.timedelta(days=30)
+            ),
+        }
 
     @classmethod
     def filter_by(cls, filter_criteria_list, products=None):
         """Filter products by multiple criteria on any queryset."""
         if products is None:
             products = cls.objects.all()
-        if not filter_criteria_list:
-            return products
+        conditions = cls.filter_conditions()
         for filter_criteria in filter_criteria_list:
-            if filter_criteria == "quantity":
-                products = products.filter(quantity__gt=0)
-            elif filter_criteria == "discount_percentage":
-                products = products.filter(discount_percentage__gt=0)
-            elif filter_criteria == "created_recently":
-                products = products.filter(
-                    created_date__gte=timezone.now() - datetime.timedelta(days=30)
-                )
+            if filter_criteria in conditions:
+                products = products.filter(conditions[filter_criteria])
+        return products
+
+    @classmethod
+    def filter_by_price(cls, low=None, high=None, products=None):
+        """Keep products whose effective price, in cents, is within [low, high)."""
+        if products is None:
+            products = cls.objects.all()
+        if low is not None:
+            products = products.filter(effective_price__gte=low)
+        if high is not None:
+            products = products.filter(effective_price__lt=high)
         return products
 
     @classmethod
     def search_by_name(cls, search_name, products=None):
-        """function to search products by name"""
+        """Search products through the configured search backend, annotating search_rank."""
+        from .search import search_products
+
         if products is None:
             products = cls.objects.all()
 
         if search_name:
-            products = products.filter(name__icontains=search_name)
+            products = search_products(search_name, products)
 
         return products
 
     def __str__(self):
         return self.name
+
+    class Meta:
+        # One (sort key, id) index per listing ordering, scanned forwards or
+        # backwards, plus category-prefixed and in-stock partial variants so the
+        # category page and the Availability filter never sort in memory.
+        indexes = [
+            models.Index(fields=["created_date", "id"], name="product_created_idx"),
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            models.Index(
+                fields=["discount_percentage", "id"], name="product_discount_idx"
+            ),
+            models.Index(fields=["name", "id"], name="product_name_idx"),
+            models.Index(fields=["rating_average", "id"], name="product_rating_idx"),
+            models.Index(
+                fields=["effective_price", "id"], name="product_effective_price_idx"
+            ),
+            models.Index(
+                fields=["category", "created_date", "id"],
+                name="product_cat_created_idx",
+            ),
+            models.Index(
+                fields=["category", "price", "id"], name="product_cat_price_idx"
+            ),
+            models.Index(
+                fields=["category", "discount_percentage", "id"],
+                name="product_cat_discount_idx",
+            ),
+            models.Index(
+                fields=["category", "name", "id"], name="product_cat_name_idx"
+            ),
+            models.Index(
+                fields=["category", "rating_average", "id"],
+                name="product_cat_rating_idx",
+            ),
+            models.Index(
+                fields=["category", "effective_price", "id"],
+                name="product_cat_eff_price_idx",
+            ),
+            models.Index(
+                fields=["created_date", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_created_idx",
+            ),
+            models.Index(
+                fields=["price", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_price_idx",
+            ),
+            models.Index(
+                fields=["discount_percentage", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_discount_idx",
+            ),
+            models.Index(
+                fields=["name", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_name_idx",
+            ),
+            models.Index(
+                fields=["rating_average", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_rating_idx",
+            ),
+            models.Index(
+                fields=["effective_price", "id"],
+                condition=models.Q(quantity__gt=models.F("reserved_quantity")),
+                name="product_instock_eff_price_idx",
+            ),
+        ]
+
+
+class RelatedProduct(models.Model):
+    """One entry of a product's precomputed top-K related products.
+
+    Rows are written by inventory.related; the unique (product, rank) index lets
+    the product page read the ranked list with a single range scan.
+    """
+
+    # Covered by the (product, rank) unique index
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="related_entries",
+        db_index=False,
+    )
+    related = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="related_to_entries"
+    )
+    rank = models.PositiveSmallIntegerField(_("rank"))
+    score = models.FloatField(_("score"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="related_product_rank_unique"
+            )
+        ]
+
+
+class ProductNeighbour(models.Model):
+    """One of a product's top-K "customers who bought this also bought" products.
+
+    Rows are written offline by inventory.recommender from paid order history,
+    ranked by item-item cosine similarity.
+    """
+
+    # Covered by the (product, rank) unique index
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="neighbour_entries",
+        db_index=False,
+    )
+    neighbour = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="neighbour_of_entries"
+    )
+    rank = models.PositiveSmallIntegerField(_("rank"))
+    similarity = models.FloatField(_("similarity"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "rank"], name="product_neighbour_rank_unique"
+            )
+        ]
+
+
+class RecommenderRun(models.Model):
+    """A completed run of the co-purchase recommender.
+
+    The next incremental run only looks at orders paid after the latest
+    run's paid_until.
+    """
+
+    paid_until = models.DateTimeField(_("paid_until"))
+    full = models.BooleanField(_("full"))
+    products = models.IntegerField(_("products"))
+    orders = models.IntegerField(_("orders"))
+
+    class Meta:
+        get_latest_by = "paid_until"
+
+
+class ProductSearchEntry(models.Model):
+    """Read-only view of the FTS5 table mirroring Product names and descriptions.
+
+    Only exists on SQLite; ``document`` is FTS5's hidden table-named column, so
+    filtering on it runs a MATCH, and ``rank`` is the configured bm25 score.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_entry",
+    )
+    name = models.TextField()
+    description = models.TextField()
+    document = models.TextField(db_column="inventory_product_fts")
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "inventory_product_fts"
+
+
+class ProductSearchVector(models.Model):
+    """Read-only view of the tsvectors PostgresSearchBackend stores per product.
+
+    Only exists on PostgreSQL, where the inventory migrations create the table
+    with a GIN index on ``vector``: name words weighted A and description words
+    B, in the catalog_unaccent configuration. The column is a tsvector; the
+    backend casts it when querying, since the postgres field types cannot be
+    imported without a PostgreSQL driver.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_vector",
+    )
+    vector = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = "inventory_product_search"
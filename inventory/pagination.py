@@ -0,0 +1,157 @@
+import base64
+import binascii
+import datetime
+import json
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+def _json_default(value):
+    """Serialize datetimes with full microsecond precision for exact seeks."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def decode_cursor(cursor, key_field=None):
+    """Decode a token produced by KeysetPaginator.encode_cursor into (direction, key, pk).
+
+    key_field, the model field behind the sort key if there is one, turns the
+    key back into its Python type. Nothing is queried, so callers can validate
+    a cursor before building the queryset it pages through.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, key, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in ("n", "p"):
+            raise InvalidCursor(cursor)
+        if key_field is not None:
+            key = key_field.to_python(key)
+        return direction, key, int(pk)
+    except (
+        binascii.Error,
+        UnicodeDecodeError,
+        ValueError,
+        TypeError,
+        ValidationError,
+    ) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+class KeysetPage:
+    """A single page of results produced by a KeysetPaginator."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate an ordered queryset with (sort key, id) cursors instead of OFFSET.
+
+    The queryset must be ordered by exactly one sort key followed by the primary
+    key in the same direction, e.g. ``order_by("-price", "-id")``. Every page is
+    then a range scan starting at the cursor, so page 500 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, per_page):
+        ordering = tuple(queryset.query.order_by)
+        if len(ordering) != 2:
+            raise ValueError("Queryset must be ordered by (sort key, id).")
+        self.queryset = queryset
+        self.per_page = per_page
+        self.key_field = ordering[0].lstrip("-")
+        self.descending = ordering[0].startswith("-")
+
+    def page(self, cursor=None):
+        """Return the page that starts right after (or ends right before) the cursor."""
+        direction = self.decode_cursor(cursor)[0] if cursor else "n"
+        rows = list(self.seek(cursor))
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if direction == "n":
+            return KeysetPage(
+                rows,
+                next_cursor=self.encode_cursor("n", rows[-1]) if has_more else None,
+                previous_cursor=self.encode_cursor("p", rows[0])
+                if cursor and rows
+                else None,
+            )
+        rows.reverse()
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor("n", rows[-1]) if rows else None,
+            previous_cursor=self.encode_cursor("p", rows[0]) if has_more else None,
+        )
+
+    def encode_cursor(self, direction, obj):
+        """Encode the position of an object as an opaque, URL-safe token."""
+        if isinstance(obj, dict):
+            # A .values() row, which must include the sort key and the id
+            position = [obj[self.key_field], obj[self.queryset.model._meta.pk.attname]]
+        else:
+            position = [getattr(obj, self.key_field), obj.pk]
+        payload = json.dumps(
+            [direction, *position],
+            default=_json_default,
+            separators=(",", ":"),
+        )
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Decode a token produced by encode_cursor into (direction, key, pk)."""
+        try:
+            field = self.queryset.model._meta.get_field(self.key_field)
+        except FieldDoesNotExist:
+            # An annotation, such as a search rank, stays as JSON decoded it
+            field = None
+        return decode_cursor(cursor, field)
+
+    def _seek(self, queryset, position, forward):
+        """Restrict the queryset to rows strictly past the position.
+
+        The redundant inclusive bound on the sort key lets the database turn the
+        seek into an index range scan instead of filtering every row.
+        """
+        key, pk = position
+        lookup = "lt" if self.descending == forward else "gt"
+        return queryset.filter(
+            Q(**{f"{self.key_field}__{lookup}e": key}),
+            Q(**{f"{self.key_field}__{lookup}": key}) | Q(**{f"pk__{lookup}": pk}),
+        )
+
+    def seek(self, cursor=None):
+        """Return the unevaluated queryset that fetches the page at the cursor."""
+        if not cursor:
+            return self.queryset[: self.per_page + 1]
+        direction, key, pk = self.decode_cursor(cursor)
+        queryset = self._seek(self.queryset, (key, pk), forward=direction == "n")
+        if direction == "p":
+            queryset = queryset.reverse()
+        return queryset[: self.per_page + 1]
@@ -0,0 +1,230 @@
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from .models import Product, ProductNeighbour, RecommenderRun
+
+# Product ids per DELETE ... IN (...) statement, within SQLite's parameter limit
+DELETE_BATCH = 5000
+
+
+def paid_order_items():
+    """Return the order items of paid orders; cart depends on inventory, not the reverse."""
+    Order = apps.get_model("cart", "Order")
+    OrderItem = apps.get_model("cart", "OrderItem")
+    return OrderItem.objects.filter(order__status=Order.STATUS_PAID)
+
+
+def baskets(items, chunk_size):
+    """Yield (order ids, product ids) arrays for whole orders, about chunk_size items at a time.
+
+    Rows are streamed with iterator() in order id order, so an order is never
+    split between two chunks and memory is bounded by the chunk size.
+    """
+    rows = (
+        items.order_by("order_id")
+        .values_list("order_id", "product_id")
+        .iterator(chunk_size=chunk_size)
+    )
+    orders, products = [], []
+    for order_id, product_id in rows:
+        if len(orders) >= chunk_size and order_id != orders[-1]:
+            yield np.array(orders, dtype=np.int64), np.array(products, dtype=np.int64)
+            orders, products = [], []
+        orders.append(order_id)
+        products.append(product_id)
+    if orders:
+        yield np.array(orders, dtype=np.int64), np.array(products, dtype=np.int64)
+
+
+class CoPurchaseMatrix:
+    """Sparse product x product co-purchase counts, accumulated one chunk of orders at a time.
+
+    This is X.T @ X for the binary order x product matrix X, restricted to the
+    rows of the target products, without ever materializing X: each chunk's
+    pairs are encoded as row * n + column keys and counted with np.unique.
+    """
+
+    def __init__(self, product_ids, targets=None):
+        self.product_ids = product_ids  # sorted, maps a column index back to an id
+        self.size = len(product_ids)
+        self.is_target = np.ones(self.size, dtype=bool)
+        if targets is not None:
+            self.is_target[:] = False
+            self.is_target[self.index(targets)] = True
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def index(self, ids):
+        """Return the column indexes of product ids."""
+        return np.searchsorted(self.product_ids, ids)
+
+    def add(self, orders, products):
+        """Count the pairs of distinct products bought in the same order."""
+        # One entry per (order, product), even if a product is on two lines
+        basket = np.unique(np.stack([orders, self.index(products)], axis=1), axis=0)
+        orders, columns = basket[:, 0], basket[:, 1]
+        starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+        sizes = np.diff(np.r_[starts, len(orders)])
+        # Pair every target item with each item of its order, itself excluded
+        item_start = np.repeat(starts, sizes)
+        item_size = np.repeat(sizes, sizes)
+        left = np.flatnonzero(self.is_target[columns])
+        pair_counts = item_size[left]
+        offsets = np.arange(pair_counts.sum()) - np.repeat(
+            np.cumsum(pair_counts) - pair_counts, pair_counts
+        )
+        right = np.repeat(item_start[left], pair_counts) + offsets
+        left = np.repeat(left, pair_counts)
+        distinct = left != right
+        keys = columns[left[distinct]] * self.size + columns[right[distinct]]
+        keys, counts = np.unique(keys, return_counts=True)
+        self.keys, inverse = np.unique(
+            np.concatenate([self.keys, keys]), return_inverse=True
+        )
+        self.counts = np.bincount(
+            inverse, weights=np.concatenate([self.counts, counts])
+        ).astype(np.int64)
+
+    def top_neighbours(self, order_counts, limit):
+        """Return (product ids, neighbour ids, ranks, similarities) of each row's best pairs.
+
+        Similarity is the cosine of the two products' order columns: orders with
+        both, divided by the square root of the product of their order counts.
+        """
+        rows, columns = np.divmod(self.keys, self.size)
+        similarities = self.counts / np.sqrt(order_counts[rows] * order_counts[columns])
+        # Group by row, best first, ties broken by the lowest neighbour id
+        order = np.lexsort((columns, -similarities, rows))
+        rows, columns, similarities = rows[order], columns[order], similarities[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        ranks = np.arange(len(rows)) - np.repeat(starts, sizes)
+        keep = ranks < limit
+        return (
+            self.product_ids[rows[keep]],
+            self.product_ids[columns[keep]],
+            ranks[keep],
+            similarities[keep],
+        )
+
+
+def order_counts(product_ids):
+    """Return, for each product id, the number of paid orders that include it."""
+    counts = np.zeros(len(product_ids), dtype=np.int64)
+    rows = list(
+        paid_order_items()
+        .values_list("product_id")
+        .annotate(orders=Count("order_id", distinct=True))
+        .order_by()
+    )
+    if rows:
+        ids, orders = np.array(rows, dtype=np.int64).T
+        counts[np.searchsorted(product_ids, ids)] = orders
+    return counts
+
+
+def save_neighbours(neighbours, targets=None):
+    """Replace the stored neighbours of targets (every product if None)."""
+    table = connection.ops.quote_name(ProductNeighbour._meta.db_table)
+    rows = zip(*(column.tolist() for column in neighbours), strict=True)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if targets is None:
+            ProductNeighbour.objects.all().delete()
+        else:
+            targets = targets.tolist()
+            for start in range(0, len(targets), DELETE_BATCH):
+                ProductNeighbour.objects.filter(
+                    product_id__in=targets[start : start + DELETE_BATCH]
+                ).delete()
+        cursor.executemany(
+            f"INSERT INTO {table} (product_id, neighbour_id, rank, similarity) "
+            "VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+def build_recommendations(full=False, chunk_size=None, limit=None):
+    """Update the stored "also bought" neighbours from paid orders and record the run.
+
+    The first run, and any run with full=True, reads every paid order. Later
+    runs only recompute the products of orders paid since the previous run and
+    the products ever bought together with them, the only ones whose
+    similarities can have changed, reading just the orders that include them.
+    """
+    chunk_size = chunk_size or settings.CATALOG_RECOMMENDER_CHUNK_SIZE
+    limit = limit or settings.CATALOG_RECOMMENDATIONS
+    paid_until = timezone.now()
+    items = paid_order_items()
+    targets = None
+    orders = None
+    if not full:
+        try:
+            last_run = RecommenderRun.objects.latest()
+        except RecommenderRun.DoesNotExist:
+            full = True
+        else:
+            new_orders = items.filter(
+                order__paid_at__gt=last_run.paid_until,
+                order__paid_at__lte=paid_until,
+            ).values("order_id")
+            orders = new_orders.distinct().count()
+            bought_with = items.filter(
+                order_id__in=items.filter(
+                    product_id__in=items.filter(order_id__in=new_orders).values(
+                        "product_id"
+                    )
+                ).values("order_id")
+            )
+            targets = np.array(
+                sorted(set(bought_with.values_list("product_id", flat=True))),
+                dtype=np.int64,
+            )
+            items = items.filter(
+                order_id__in=items.filter(
+                    product_id__in=bought_with.values("product_id")
+                ).values("order_id")
+            )
+    if full:
+        orders = items.values("order_id").distinct().count()
+
+    product_ids = np.array(
+        Product.objects.order_by("pk").values_list("pk", flat=True), dtype=np.int64
+    )
+    if targets is None or len(targets):
+        matrix = CoPurchaseMatrix(product_ids, targets)
+        for basket_orders, basket_products in baskets(items, chunk_size):
+            matrix.add(basket_orders, basket_products)
+        neighbours = matrix.top_neighbours(order_counts(product_ids), limit)
+        save_neighbours(neighbours, targets)
+    return RecommenderRun.objects.create(
+        paid_until=paid_until,
+        full=full,
+        products=len(product_ids) if targets is None else len(targets),
+        orders=orders,
+    )
+
+
+def also_bought(product, limit=None):
+    """Return the products most often bought with a product, best first, in one query."""
+    limit = limit or settings.CATALOG_RECOMMENDATIONS
+    return list(
+        Product.objects.filter(neighbour_of_entries__product=product).order_by(
+            "neighbour_of_entries__rank"
+        )[:limit]
+    )
+
+
+def also_bought_with(product_ids, limit=None):
+    """Return the products most often bought with any of product_ids, e.g. a cart's."""
+    limit = limit or settings.CATALOG_RECOMMENDATIONS
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.filter(neighbour_of_entries__product_id__in=product_ids)
+        .exclude(pk__in=product_ids)
+        .annotate(affinity=Sum("neighbour_of_entries__similarity"))
+        .order_by("-affinity", "-id")[:limit]
+    )
@@ -0,0 +1,193 @@
+import bisect
+import heapq
+from collections import Counter, defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F
+from .models import Product, RelatedProduct
+
+# A related product scores up to 1 per signal; co-purchases weigh the most
+CATEGORY_WEIGHT = 1.0
+PRICE_WEIGHT = 1.0
+COPURCHASE_WEIGHT = 2.0
+
+
+def price_proximity(price, other):
+    """Return how close two prices are, from 0 (far apart) to 1 (equal)."""
+    if price > other:
+        return other / price
+    return price / other if other else 1.0
+
+
+def co_purchase_counts(product_ids=None):
+    """Return {product id: Counter(other product id: paid orders with both)}.
+
+    With product_ids, only the pairs starting from those products are counted.
+    """
+    OrderItem = apps.get_model("cart", "OrderItem")
+    Order = apps.get_model("cart", "Order")
+    pairs = OrderItem.objects.filter(order__status=Order.STATUS_PAID).annotate(
+        other_id=F("order__items__product_id")
+    )
+    if product_ids is not None:
+        pairs = pairs.filter(product_id__in=product_ids)
+    pairs = (
+        pairs.exclude(other_id=F("product_id"))
+        .values_list("product_id", "other_id")
+        .annotate(orders=Count("order_id", distinct=True))
+        .order_by()
+    )
+    counts = defaultdict(Counter)
+    for product_id, other_id, orders in pairs:
+        counts[product_id][other_id] = orders
+    return counts
+
+
+class RelatedCatalog:
+    """The (category, sale price) of products, with each category sorted by price."""
+
+    def __init__(self, rows):
+        self.products = {}
+        by_category = defaultdict(list)
+        for pk, category_id, sale_price in rows:
+            self.products[pk] = (category_id, sale_price)
+            by_category[category_id].append((sale_price, pk))
+        self.categories = {}
+        for category_id, entries in by_category.items():
+            entries.sort()
+            self.categories[category_id] = (
+                [price for price, _pk in entries],
+                [pk for _price, pk in entries],
+            )
+
+    @classmethod
+    def load(cls, products):
+        return cls(products.values_list("id", "category_id", "effective_price"))
+
+    def price_neighbours(self, pk, count):
+        """Return up to count products of pk's category on each side of its price."""
+        category_id, price = self.products[pk]
+        prices, ids = self.categories[category_id]
+        position = bisect.bisect_left(prices, price)
+        window = ids[max(0, position - count) : position + count + 1]
+        return [other for other in window if other != pk]
+
+    def rank(self, pk, co_purchases, limit):
+        """Return the limit best (score, related id) pairs for a product.
+
+        Price proximity only falls as prices move away, so without co-purchases
+        the best products of the category are among the limit nearest prices on
+        each side; those and the limit most co-purchased products are scored.
+        """
+        category_id, price = self.products[pk]
+        candidates = self.price_neighbours(pk, limit)
+        bought = {}
+        most_bought = 1
+        if co_purchases:
+            bought = dict(co_purchases.most_common(limit))
+            most_bought = max(bought.values())
+            candidates = set(candidates)
+            candidates.update(other for other in bought if other in self.products)
+        products = self.products
+        scored = []
+        for other in candidates:
+            other_category, other_price = products[other]
+            score = (
+                CATEGORY_WEIGHT * (other_category == category_id)
+                + PRICE_WEIGHT * price_proximity(price, other_price)
+                + COPURCHASE_WEIGHT * bought.get(other, 0) / most_bought
+            )
+            scored.append((score, other))
+        return heapq.nlargest(limit, scored)
+
+
+def save_related(catalog, product_ids, co_purchases, limit):
+    """Replace the stored related products of product_ids.
+
+    The rows are inserted with executemany rather than bulk_create, which
+    would build a model instance per row: a full rebuild writes limit rows
+    per product.
+    """
+    rows = [
+        (pk, other, rank, score)
+        for pk in product_ids
+        for rank, (score, other) in enumerate(
+            catalog.rank(pk, co_purchases.get(pk, Counter()), limit)
+        )
+    ]
+    table = connection.ops.quote_name(RelatedProduct._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        cursor.executemany(
+            f"INSERT INTO {table} (product_id, related_id, rank, score) "
+            "VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+    return len(rows)
+
+
+def rebuild_related_products(limit=None):
+    """Recompute the related products of the whole catalog, returning the product count."""
+    limit = limit or settings.CATALOG_RELATED_PRODUCTS
+    catalog = RelatedCatalog.load(Product.objects.all())
+    co_purchases = co_purchase_counts()
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        ids = list(catalog.products)
+        for start in range(0, len(ids), 5000):
+            save_related(catalog, ids[start : start + 5000], co_purchases, limit)
+    return len(catalog.products)
+
+
+def refresh_related_products(product_ids, limit=None):
+    """Recompute the related products affected by changes to product_ids.
+
+    Besides the changed products themselves, that is the products that list one
+    of them and those whose price window now includes one of them. Only the
+    categories involved are loaded, so the cost depends on their size rather
+    than the catalog's. Returns the number of products refreshed.
+    """
+    limit = limit or settings.CATALOG_RELATED_PRODUCTS
+    changed = set(product_ids)
+    affected = changed | set(
+        RelatedProduct.objects.filter(related_id__in=changed).values_list(
+            "product_id", flat=True
+        )
+    )
+    categories = Product.objects.filter(pk__in=affected).values("category_id")
+    catalog = RelatedCatalog.load(Product.objects.filter(category_id__in=categories))
+    targets = affected & catalog.products.keys()
+    for pk in changed & catalog.products.keys():
+        targets.update(catalog.price_neighbours(pk, limit))
+    co_purchases = co_purchase_counts(targets)
+    bought = {other for counts in co_purchases.values() for other in counts}
+    if bought - catalog.products.keys():
+        # Co-purchased products from other categories only need their own row
+        extra = RelatedCatalog.load(
+            Product.objects.filter(pk__in=bought - catalog.products.keys())
+        )
+        catalog.products.update(extra.products)
+    save_related(catalog, targets, co_purchases, limit)
+    return len(targets)
+
+
+def related_products(product, limit=None):
+    """Return the product's precomputed related products, best first, in one query.
+
+    Products whose list has not been computed yet fall back to the best rated
+    products of their category.
+    """
+    limit = limit or settings.CATALOG_RELATED_PRODUCTS
+    related = list(
+        Product.objects.filter(related_to_entries__product=product).order_by(
+            "related_to_entries__rank"
+        )[:limit]
+    )
+    if not related:
+        related = list(
+            Product.objects.filter(category_id=product.category_id)
+            .exclude(pk=product.pk)
+            .order_by("-rating_average", "-id")[:limit]
+        )
+    return related
@@ -0,0 +1,177 @@
+import functools
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.utils.module_loading import import_string
+
+FTS_TABLE = "inventory_product_fts"
+VECTOR_TABLE = "inventory_product_search"
+WORD_RE = re.compile(r"\w+")
+
+
+class IContainsSearchBackend:
+    """Unindexed LIKE '%term%' search on product names, kept as a portable fallback."""
+
+    def search(self, query, products):
+        """Filter products by name and annotate a constant search_rank."""
+        return products.filter(name__icontains=query).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    def index_products(self, products):
+        """Nothing to index for LIKE scans."""
+
+    def remove_products(self, product_ids):
+        """Nothing to index for LIKE scans."""
+
+    def rebuild(self):
+        """Nothing to index for LIKE scans."""
+
+
+class SQLiteFTSSearchBackend:
+    """Relevance-ranked search over an FTS5 table mirroring product names and descriptions.
+
+    The table is created by the inventory migrations with the unicode61 tokenizer
+    and ``remove_diacritics 2``, so matching is case and accent insensitive, and
+    its rank is configured as bm25 with name hits weighted above descriptions.
+    """
+
+    @staticmethod
+    def match_expression(query):
+        """Turn free text into an FTS5 query of quoted prefix terms that must all match."""
+        return " ".join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+    def search(self, query, products):
+        """Join products to their full-text matches and annotate search_rank (higher is better)."""
+        match = self.match_expression(query)
+        if not match:
+            return products.none()
+        return products.filter(search_entry__document=match).annotate(
+            search_rank=-F("search_entry__rank")
+        )
+
+    def index_products(self, products):
+        """Insert or replace the full-text rows of the given products."""
+        rows = [(p.id, p.name, p.description) for p in products]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(r[0],) for r in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove_products(self, product_ids):
+        """Delete the full-text rows of the given product ids."""
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(pk,) for pk in product_ids],
+            )
+
+    def rebuild(self):
+        """Repopulate the full-text table from every product."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, description) "
+                "SELECT id, name, description FROM inventory_product"
+            )
+
+
+class PostgresSearchBackend:
+    """Relevance-ranked search with PostgreSQL tsvector/tsquery over name and description.
+
+    Like the FTS5 table, matching is case and accent insensitive: the
+    catalog_unaccent text search configuration, created by the inventory
+    migrations, runs words through the unaccent extension before the simple
+    dictionary. The migration needs a role allowed to CREATE EXTENSION, or
+    unaccent installed in the database beforehand. Each product's vector is
+    stored in a table with a GIN index, so a search reads the index rather
+    than parsing every product's text.
+    """
+
+    CONFIG = "catalog_unaccent"
+    VECTOR = (
+        f"setweight(to_tsvector('{CONFIG}', name), 'A') || "
+        f"setweight(to_tsvector('{CONFIG}', description), 'B')"
+    )
+
+    def search(self, query, products):
+        """Join products to their matching vectors and annotate search_rank (higher is better)."""
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVectorField,
+        )
+
+        # A no-op cast that gives the tsvector column its postgres field type
+        vector = Cast("search_vector__vector", SearchVectorField())
+        search_query = SearchQuery(query, search_type="websearch", config=self.CONFIG)
+        return (
+            products.annotate(search_document=vector)
+            .filter(search_document=search_query)
+            .annotate(search_rank=SearchRank(vector, search_query))
+        )
+
+    def index_products(self, products):
+        """Insert or replace the vectors of the given products."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {VECTOR_TABLE} (product_id, vector) "
+                f"SELECT id, {self.VECTOR} FROM inventory_product WHERE id = ANY(%s) "
+                "ON CONFLICT (product_id) DO UPDATE SET vector = excluded.vector",
+                [[p.id for p in products]],
+            )
+
+    def remove_products(self, product_ids):
+        """Delete the vectors of the given product ids."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {VECTOR_TABLE} WHERE product_id = ANY(%s)",
+                [list(product_ids)],
+            )
+
+    def rebuild(self):
+        """Recompute the vector of every product."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {VECTOR_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {VECTOR_TABLE} (product_id, vector) "
+                f"SELECT id, {self.VECTOR} FROM inventory_product"
+            )
+
+
+def search_products(query, products):
+    """Search products with the configured backend, falling back to typo-tolerant matching.
+
+    When the backend finds nothing, the in-memory trigram index suggests product
+    ids for misspelled words; they are loaded in one id__in query and annotated
+    with a search_rank that preserves the index's ranking.
+    """
+    from .trigram import get_trigram_index
+
+    results = get_search_backend().search(query, products)
+    if results.exists():
+        return results
+    ids = get_trigram_index().search(query)
+    if not ids:
+        return results
+    rank = Case(
+        *[When(id=pk, then=Value(float(-i))) for i, pk in enumerate(ids)],
+        output_field=FloatField(),
+    )
+    return products.filter(id__in=ids).annotate(search_rank=rank)
+
+
+@functools.lru_cache
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_search_backend():
+    """Return the product search backend selected by CATALOG_SEARCH_BACKEND."""
+    return _load_backend(settings.CATALOG_SEARCH_BACKEND)
@@ -0,0 +1,114 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from .autocomplete import CATEGORY, PRODUCT, autocomplete_index_if_built
+from .cache import (
+    bump_catalog_version,
+    invalidate_navigation_categories,
+    record_search_change,
+)
+from .images import needs_variants, schedule_variants
+from .models import Category, Product, RelatedProduct
+from .related import refresh_related_products
+from .search import get_search_backend
+from .trigram import trigram_index_if_built
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """Keep the search indexes in sync with the product's name and description.
+
+    This process patches its in-memory indexes at once; the others patch theirs
+    from the search change log once the save is committed.
+    """
+    if raw:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: record_search_change(PRODUCT, pk))
+    get_search_backend().index_products([instance])
+    index = trigram_index_if_built()
+    if index is not None:
+        index.add(instance.pk, instance.name)
+    completions = autocomplete_index_if_built()
+    if completions is not None:
+        completions.add(PRODUCT, instance.pk, instance.name, instance.rating_count)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Remove a deleted product from the search indexes, here and in other processes."""
+    pk = instance.pk
+    transaction.on_commit(lambda: record_search_change(PRODUCT, pk))
+    get_search_backend().remove_products([instance.pk])
+    index = trigram_index_if_built()
+    if index is not None:
+        index.remove(instance.pk)
+    completions = autocomplete_index_if_built()
+    if completions is not None:
+        completions.remove(PRODUCT, instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, raw=False, **kwargs):
+    """Keep the autocomplete index and navigation in sync with the category's name."""
+    invalidate_navigation_categories()
+    transaction.on_commit(invalidate_navigation_categories)
+    if not raw:
+        pk = instance.pk
+        transaction.on_commit(lambda: record_search_change(CATEGORY, pk))
+    completions = autocomplete_index_if_built()
+    if completions is not None and not raw:
+        completions.add(
+            CATEGORY, instance.pk, instance.name, instance.product_set.count()
+        )
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    """Remove a deleted category from the autocomplete index and navigation."""
+    invalidate_navigation_categories()
+    transaction.on_commit(invalidate_navigation_categories)
+    pk = instance.pk
+    transaction.on_commit(lambda: record_search_change(CATEGORY, pk))
+    completions = autocomplete_index_if_built()
+    if completions is not None:
+        completions.remove(CATEGORY, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def catalog_changed(sender, **kwargs):
+    """Move to a new catalog version so everything cached for the old one is ignored.
+
+    The version is bumped again on commit, so a request that cached data read
+    before the transaction committed cannot serve it under the new version.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def image_saved(sender, instance, raw=False, **kwargs):
+    """Render responsive variants of a new or replaced image once the upload is committed."""
+    if not raw and needs_variants(instance):
+        transaction.on_commit(lambda: schedule_variants(instance))
+
+
+@receiver(post_save, sender=Product)
+def product_related_changed(sender, instance, raw=False, **kwargs):
+    """Refresh the related products around a saved product once it is committed."""
+    if not raw:
+        transaction.on_commit(lambda: refresh_related_products([instance.pk]))
+
+
+@receiver(pre_delete, sender=Product)
+def product_related_deleted(sender, instance, **kwargs):
+    """Refill the related products of the products that listed a deleted product."""
+    listing = list(
+        RelatedProduct.objects.filter(related=instance).values_list(
+            "product_id", flat=True
+        )
+    )
+    if listing:
+        transaction.on_commit(lambda: refresh_related_products(listing))
@@ -0,0 +1,53 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+def _srcset(variants, extension):
+    widths = {}
+    for variant in variants.values():
+        if variant.get(extension):
+            widths.setdefault(variant["width"], variant[extension])
+    return ", ".join(
+        f"{default_storage.url(name)} {width}w"
+        for width, name in sorted(widths.items())
+    )
+
+
+@register.simple_tag
+def responsive_image(obj, variant="card", sizes="100vw", alt="", css_class=""):
+    """Render a product or category image as a WebP/JPEG <picture> with srcset.
+
+    Falls back to the original upload while its variants have not been rendered.
+    """
+    if not obj.image:
+        return ""
+    meta = obj.image_variants
+    if meta.get("source") != obj.image.name:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async" />',
+            obj.image.url,
+            alt,
+            css_class,
+        )
+    chosen = meta["variants"][variant]
+    return format_html(
+        "<picture>"
+        '<source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'class="{}" loading="lazy" decoding="async" '
+        "style=\"background: center / cover no-repeat url('{}')\" />"
+        "</picture>",
+        _srcset(meta["variants"], "webp"),
+        sizes,
+        default_storage.url(chosen["jpeg"]),
+        _srcset(meta["variants"], "jpeg"),
+        sizes,
+        chosen["width"],
+        chosen["height"],
+        alt,
+        css_class,
+        meta["placeholder"],
+    )
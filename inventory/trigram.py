@@ -0,0 +1,187 @@
+import bisect
+import functools
+import heapq
+import itertools
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from .cache import PRODUCT, ProcessIndex
+from .search import WORD_RE
+
+
+def normalize(text):
+    """Casefold text and strip accents so "Gatéron" and "gateron" compare equal."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def words(text):
+    """Split text into normalized words."""
+    return WORD_RE.findall(normalize(text))
+
+
+@functools.lru_cache(maxsize=65536)
+def trigrams(word):
+    """Return the padded trigrams of a word, the way pg_trgm builds them."""
+    padded = f"  {word} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+class TrigramIndex:
+    """In-memory typo-tolerant index over product names.
+
+    Names are split into words; each distinct word (the vocabulary) is indexed by
+    its trigrams, and each word maps to the sorted ids of the products whose name
+    uses it. A query word is matched against the vocabulary by trigram similarity,
+    so "cherri" finds "cherry", and only the posting lists of the matched words are
+    walked, newest first, until the best results are known.
+    """
+
+    def __init__(self, threshold=0.3):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._products = {}  # product id -> tuple of its name's words
+        self._postings = {}  # word -> sorted product ids
+        self._vocabulary = defaultdict(set)  # trigram -> words
+
+    def __len__(self):
+        return len(self._products)
+
+    def add(self, product_id, name):
+        """Index a product's name, replacing whatever was indexed for it before."""
+        with self._lock:
+            self._discard(product_id)
+            terms = tuple(dict.fromkeys(words(name)))
+            self._products[product_id] = terms
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = []
+                    for trigram in trigrams(term):
+                        self._vocabulary[trigram].add(term)
+                bisect.insort(postings, product_id)
+
+    def remove(self, product_id):
+        """Forget a product."""
+        with self._lock:
+            self._discard(product_id)
+
+    def _discard(self, product_id):
+        for term in self._products.pop(product_id, ()):
+            postings = self._postings[term]
+            del postings[bisect.bisect_left(postings, product_id)]
+            if not postings:
+                del self._postings[term]
+                for trigram in trigrams(term):
+                    self._vocabulary[trigram].discard(term)
+
+    def similar_terms(self, word):
+        """Return {term: similarity} for vocabulary words close to the word."""
+        query = trigrams(word)
+        shared = Counter()
+        for trigram in query:
+            shared.update(self._vocabulary.get(trigram, ()))
+        matches = {}
+        for term, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            similarity = count / (len(query) + len(trigrams(term)) - count)
+            if similarity >= self.threshold:
+                matches[term] = similarity
+        return matches
+
+    def search(self, query, limit=100):
+        """Return up to limit product ids matching every recognised query word, best first.
+
+        Query words that resemble nothing in the vocabulary are ignored. Products
+        are ranked by the summed similarity of their best match for each word and
+        then by newest id.
+        """
+        with self._lock:
+            per_word = [m for m in map(self.similar_terms, words(query)) if m]
+            if not per_word:
+                return []
+            best_score = sum(max(m.values()) for m in per_word)
+            lists = [[self._postings[t] for t in m] for m in per_word]
+            newest = max(p[-1] for p in lists[0]) + 1
+            oldest = min(p[0] for p in lists[0])
+            # Start with an id window expected to hold a few pages of matches for
+            # the rarest word and widen it until the best results are settled
+            rarest = min(sum(map(len, postings)) for postings in lists)
+            span = max(4 * limit * (newest - oldest) // rarest, 1)
+            fuzzy = any(len(m) > 1 for m in per_word)
+            zeros = itertools.repeat(0.0)
+            top = []
+            high = newest
+            while high > oldest:
+                low = high - span
+                window = None
+                for postings in lists:
+                    ids = set()
+                    for p in postings:
+                        ids.update(
+                            p[bisect.bisect_left(p, low) : bisect.bisect_left(p, high)]
+                        )
+                    window = ids if window is None else window & ids
+                    if not window:
+                        break
+                for product_id in sorted(window, reverse=True):
+                    if len(top) == limit and top[0][0] >= best_score:
+                        break
+                    score = best_score
+                    if fuzzy:
+                        terms = self._products[product_id]
+                        score = sum(max(map(m.get, terms, zeros)) for m in per_word)
+                    if len(top) < limit:
+                        heapq.heappush(top, (score, product_id))
+                    elif score > top[0][0]:
+                        heapq.heapreplace(top, (score, product_id))
+                # Ids only get older from here, so nothing can outrank a full page
+                # of best possible scores
+                if len(top) == limit and top[0][0] >= best_score:
+                    break
+                high = low
+                span *= 2
+            return [product_id for _, product_id in sorted(top, reverse=True)]
+
+
+def build_trigram_index():
+    """Build a trigram index over every product name."""
+    from .models import Product
+
+    index = TrigramIndex()
+    for product_id, name in Product.objects.values_list("id", "name").iterator(
+        chunk_size=5000
+    ):
+        index.add(product_id, name)
+    return index
+
+
+def patch_trigram_index(index, changes):
+    """Re-index the products among (kind, pk) changes logged by other processes."""
+    from .models import Product
+
+    product_ids = {pk for kind, pk in changes if kind == PRODUCT}
+    names = dict(Product.objects.filter(pk__in=product_ids).values_list("id", "name"))
+    for product_id in product_ids:
+        if product_id in names:
+            index.add(product_id, names[product_id])
+        else:
+            index.remove(product_id)
+
+
+_index = ProcessIndex(build_trigram_index, patch_trigram_index)
+
+
+def get_trigram_index():
+    """Return the process-wide index, building it from the database on first use."""
+    return _index.get()
+
+
+def reset_trigram_index():
+    """Drop the process-wide index so the next search rebuilds it."""
+    _index.reset()
+
+
+def trigram_index_if_built():
+    """Return the process-wide index only if it has been built already."""
+    return _index.if_built()
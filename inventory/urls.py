@@ -7,4 +7,6 @@ urlpatterns = [
     path("category/<int:category_id>/", views.category, name="category"),
     path("product/<int:product_id>/", views.product, name="product"),
     path("results/", views.results, name="results"),
+    path("autocomplete/", views.autocomplete, name="autocomplete"),
+    path("feeds/products.<str:file_format>.gz", views.feed, name="feed"),
 ]
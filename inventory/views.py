@@ -1,26 +1,87 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import get_template
+from django.utils.cache import patch_cache_control
+from django.utils.translation import get_language
+from django.views.decorators.http import require_GET
 from .models import Product, Category
+from .forms import ProductFilterForm, SearchFilterForm
+from .pagination import KeysetPaginator, InvalidCursor
+from .autocomplete import get_autocomplete_index
+from .facets import get_facets, price_bucket
+from .feeds import FEED_FORMATS, product_feed
+from .recommender import also_bought
+from .related import related_products
+from .cache import cached_listing, stock_key
+from .conditional import category_updated_at, conditional_page, product_updated_at
 from review.models import Review
-from .forms import ProductFilterForm
-from django.db.models import Count
 
 
+def paginate_products(request, products):
+    """Return the keyset page of products selected by the request's cursor."""
+    paginator = KeysetPaginator(products, per_page=settings.CATALOG_PAGE_SIZE)
+    try:
+        return paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        return paginator.page()
+
+
+def filter_by_price_bucket(request, products):
+    """Narrow products to the effective price bucket selected with price=, if any."""
+    bounds = price_bucket(request.GET.get("price"))
+    if bounds is None:
+        return products
+    return Product.filter_by_price(*bounds, products=products)
+
+
+def render_product_grid(request, template_name, scope, products, context=None):
+    """Render a listing's product grid, cached per query string and language.
+
+    The key includes the catalog and stock versions, so product, category,
+    review and stock changes invalidate every cached grid at once. On a hit, the products
+    queryset is never evaluated.
+    """
+    key = stock_key(
+        "listing", template_name, scope, sorted(request.GET.lists()), get_language()
+    )
+
+    def render_grid():
+        page = paginate_products(request, products)
+        grid_context = {"request": request, "products": page, "page": page}
+        return get_template(template_name).render({**(context or {}), **grid_context})
+
+    return cached_listing(key, render_grid)
+
+
+@conditional_page()
 def index(request):
     """Display Home, showing the different products and categories."""
     sort_criteria = request.GET.get("sort", "created_date")
     filter_criteria_list = request.GET.getlist("filter_criteria")
 
-    filtered = Product.filter_by(filter_criteria_list)
+    filtered = filter_by_price_bucket(request, Product.filter_by(filter_criteria_list))
     products = Product.sort_by(sort_criteria, products=filtered)
+    product_grid = render_product_grid(
+        request, "inventory/product_grid.html", ("index",), products
+    )
+    facets = get_facets(
+        Product.objects.all(),
+        filter_criteria_list,
+        ("index",),
+        price_bucket(request.GET.get("price")),
+    )
 
     categories = Category.objects.order_by("name")
 
     filter_sort_form = ProductFilterForm(
-        initial={"sort": sort_criteria, "filter_criteria": filter_criteria_list}
+        initial={"sort": sort_criteria, "filter_criteria": filter_criteria_list},
+        facets=facets,
     )
     context = {
         "categories": categories,
-        "products": products,
+        "product_grid": product_grid,
+        "facets": facets,
         "current_sort": sort_criteria,
         "filter_sort_form": filter_sort_form,
         "current_filters": filter_criteria_list,
@@ -29,6 +90,7 @@ def index(request):
     return render(request, "inventory/index.html", context)
 
 
+@conditional_page(category_updated_at)
 def category(request, category_id):
     """Display Category Detail page, showing all the products inside a single category."""
     category = get_object_or_404(Category, pk=category_id)
@@ -36,16 +98,29 @@ def category(request, category_id):
     filter_criteria_list = request.GET.getlist("filter_criteria")
 
     base_qs = category.product_set.all()
-    filtered = Product.filter_by(filter_criteria_list, products=base_qs)
+    filtered = filter_by_price_bucket(
+        request, Product.filter_by(filter_criteria_list, products=base_qs)
+    )
     products = Product.sort_by(sort_criteria, products=filtered)
+    product_grid = render_product_grid(
+        request, "inventory/product_grid.html", ("category", category.pk), products
+    )
+    facets = get_facets(
+        base_qs,
+        filter_criteria_list,
+        ("category", category.pk),
+        price_bucket(request.GET.get("price")),
+    )
 
     filter_sort_form = ProductFilterForm(
-        initial={"sort": sort_criteria, "filter_criteria": filter_criteria_list}
+        initial={"sort": sort_criteria, "filter_criteria": filter_criteria_list},
+        facets=facets,
     )
 
     context = {
         "category": category,
-        "products": products,
+        "product_grid": product_grid,
+        "facets": facets,
         "current_sort": sort_criteria,
         "filter_sort_form": filter_sort_form,
         "current_filters": filter_criteria_list,
@@ -53,38 +128,101 @@ def category(request, category_id):
     return render(request, "inventory/category.html", context)
 
 
+@conditional_page(product_updated_at)
 def product(request, product_id):
     """Display Product Detail page, showing all the details of the product."""
     product = get_object_or_404(Product, pk=product_id)
-    reviews = product.reviews.annotate(votes_count=Count("votes")).order_by(
-        "-votes_count"
+    review_sort = request.GET.get("review_sort")
+    if review_sort not in Review.SORT_ORDERINGS:
+        review_sort = "helpful"
+    paginator = KeysetPaginator(
+        Review.feed(product, review_sort), per_page=settings.REVIEW_PAGE_SIZE
     )
-    rating_average = Review.rating_average(product)
+    try:
+        reviews = paginator.page(request.GET.get("review_cursor"))
+    except InvalidCursor:
+        reviews = paginator.page()
+    rating_average = product.rating_average
     category = product.category
-    products = category.product_set.all()
+    products = related_products(product)
     context = {
         "product": product,
         "category": category,
         "products": products,
+        "also_bought": also_bought(product),
         "reviews": reviews,
+        "review_sort": review_sort,
         "rating_average": rating_average,
     }
     return render(request, "inventory/product.html", context)
 
 
+@conditional_page()
 def results(request):
-    """Display the search results done by the user."""
+    """Display the search results done by the user, most relevant first by default."""
     search_query = request.GET.get("search", "")
-    products = Product.search_by_name(search_query)
+    matches = Product.search_by_name(search_query)
 
-    sort_criteria = request.GET.get("sort", "created_date")
+    sort_criteria = request.GET.get("sort", "relevance")
     filter_criteria_list = request.GET.getlist("filter_criteria")
 
-    filtered = Product.filter_by(filter_criteria_list, products=products)
-    products = Product.sort_by(sort_criteria, products=filtered)
+    filtered = filter_by_price_bucket(
+        request, Product.filter_by(filter_criteria_list, products=matches)
+    )
+    if sort_criteria == "relevance" and search_query:
+        products = filtered.order_by("-search_rank", "-id")
+    else:
+        products = Product.sort_by(sort_criteria, products=filtered)
+    product_grid = render_product_grid(
+        request,
+        "inventory/results_grid.html",
+        ("search",),
+        products,
+        {"current_search": search_query},
+    )
+    facets = get_facets(
+        matches,
+        filter_criteria_list,
+        ("search", search_query),
+        price_bucket(request.GET.get("price")),
+    )
+
+    filter_sort_form = SearchFilterForm(
+        initial={"sort": sort_criteria, "filter_criteria": filter_criteria_list},
+        facets=facets,
+    )
 
     context = {
-        "products": products,
+        "product_grid": product_grid,
+        "facets": facets,
         "current_search": search_query,
+        "current_sort": sort_criteria,
+        "filter_sort_form": filter_sort_form,
+        "current_filters": filter_criteria_list,
     }
     return render(request, "inventory/results.html", context)
+
+
+@require_GET
+def autocomplete(request):
+    """Return product and category name completions for the search box as JSON."""
+    suggestions = get_autocomplete_index().suggestions(
+        request.GET.get("q", ""), limit=settings.CATALOG_AUTOCOMPLETE_RESULTS
+    )
+    response = JsonResponse({"results": suggestions})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+@require_GET
+def feed(request, file_format):
+    """Stream the gzipped product feed for marketplaces, generating it at most once per catalog version."""
+    if file_format not in FEED_FORMATS:
+        raise Http404("Unknown feed format")
+    _path, chunks = product_feed(file_format, request.build_absolute_uri("/"))
+    response = StreamingHttpResponse(chunks, content_type="application/gzip")
+    response["Content-Disposition"] = (
+        f'attachment; filename="products.{file_format}.gz"'
+    )
+    patch_cache_control(response, public=True, max_age=300)
+    return response
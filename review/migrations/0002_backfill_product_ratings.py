@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:10
+
+from django.db import migrations, models
+
+FLAG_THRESHOLD = 5
+
+
+def backfill_product_ratings(apps, schema_editor):
+    """Fill the stored rating aggregates from the existing, non over-flagged reviews."""
+    Product = apps.get_model("inventory", "Product")
+    Review = apps.get_model("review", "Review")
+    Flag = apps.get_model("review", "Flag")
+
+    over_flagged = (
+        Flag.objects.values("review")
+        .annotate(flag_count=models.Count("id"))
+        .filter(flag_count__gt=FLAG_THRESHOLD)
+        .values("review")
+    )
+    totals = (
+        Review.objects.exclude(pk__in=over_flagged)
+        .values("product")
+        .annotate(total=models.Sum("rating"), count=models.Count("id"))
+    )
+    for row in totals.iterator():
+        Product.objects.filter(pk=row["product"]).update(
+            rating_sum=row["total"],
+            rating_count=row["count"],
+            rating_average=row["total"] / row["count"],
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0003_product_rating_aggregates"),
+        ("review", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_product_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_votes_count(apps, schema_editor):
+    """Fill the stored vote counts from the existing votes."""
+    Review = apps.get_model("review", "Review")
+    Vote = apps.get_model("review", "Vote")
+    votes = (
+        Vote.objects.filter(review=models.OuterRef("pk"))
+        .order_by()
+        .values("review")
+        .annotate(total=models.Count("id"))
+        .values("total")
+    )
+    Review.objects.update(votes_count=Coalesce(models.Subquery(votes), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("inventory", "0009_product_effective_price"),
+        ("review", "0002_backfill_product_ratings"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="review",
+            name="votes_count",
+            field=models.IntegerField(
+                default=0, editable=False, verbose_name="votes_count"
+            ),
+        ),
+        migrations.RunPython(backfill_votes_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["review", "created_date", "id"],
+                name="comment_review_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "votes_count", "id"], name="review_product_votes_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "created_date", "id"],
+                name="review_product_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(
+                fields=["product", "rating", "id"], name="review_product_rating_idx"
+            ),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models, IntegrityError, transaction
+from django.db.models.functions import Coalesce
 from inventory.models import Product
 from django.core.validators import MinValueValidator, MaxValueValidator
 from account.models import Account
 from cart.models import OrderItem
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -18,6 +20,17 @@ class Review(models.Model):
     )
     message = models.TextField(_("message"))
     created_date = models.DateTimeField(auto_now_add=True)
+    # Kept up to date by the Vote signals so reviews can be sorted by an index
+    votes_count = models.IntegerField(_("votes_count"), default=0, editable=False)
+
+    # Reviews flagged more than this many times stop counting towards the rating.
+    FLAG_THRESHOLD = 5
+    # Product page review orderings, each backed by a (product, key, id) index
+    SORT_ORDERINGS = {
+        "helpful": "-votes_count",
+        "newest": "-created_date",
+        "rating": "-rating",
+    }
 
     @classmethod
     def create_review(cls, user, product, rating, message):
@@ -39,18 +52,88 @@ class Review(models.Model):
 
     @classmethod
     def rating_average(cls, product):
-        """Calculate the average rating for a given product, excluding reviews with >5 flags."""
-        reviews = (
+        """Return the stored average rating for a given product, excluding reviews with >5 flags."""
+        average = (
+            Product.objects.filter(pk=product.pk)
+            .values_list("rating_average", flat=True)
+            .first()
+        )
+        return average or 0
+
+    @classmethod
+    def feed(cls, product, sort_criteria=None):
+        """Return a product's reviews for display, ordered for keyset pagination.
+
+        Each review comes with its author, flags_count and comments_count, the
+        latter two computed by correlated subqueries so that a page of reviews
+        is fetched in one query. Comments themselves are loaded separately, a
+        page at a time, by Comment.thread().
+        """
+
+        def count(model):
+            return Coalesce(
+                models.Subquery(
+                    model.objects.filter(review=models.OuterRef("pk"))
+                    .order_by()
+                    .values("review")
+                    .annotate(total=models.Count("id"))
+                    .values("total")
+                ),
+                0,
+            )
+
+        ordering = cls.SORT_ORDERINGS.get(sort_criteria, cls.SORT_ORDERINGS["helpful"])
+        return (
             cls.objects.filter(product=product)
-            .annotate(flag_count=models.Count("flags"))
-            .filter(flag_count__lte=5)
+            .select_related("user")
+            .annotate(flags_count=count(Flag), comments_count=count(Comment))
+            .order_by(ordering, "-id")
         )
 
-        if not reviews.exists():
-            return 0
+    @classmethod
+    def counted(cls):
+        """Reviews that count towards their product's rating."""
+        over_flagged = (
+            Flag.objects.values("review")
+            .annotate(flag_count=models.Count("id"))
+            .filter(flag_count__gt=cls.FLAG_THRESHOLD)
+            .values("review")
+        )
+        return cls.objects.exclude(pk__in=over_flagged)
 
-        total_rating = sum(review.rating for review in reviews)
-        return total_rating / reviews.count()
+    @classmethod
+    def refresh_product_rating(cls, product_id):
+        """Recompute a product's stored rating aggregate from its counted reviews in one UPDATE."""
+        counted = cls.counted().filter(product=models.OuterRef("pk"))
+        rating_sum = Coalesce(
+            models.Subquery(
+                counted.values("product")
+                .annotate(total=models.Sum("rating"))
+                .values("total")
+            ),
+            0,
+        )
+        rating_count = Coalesce(
+            models.Subquery(
+                counted.values("product")
+                .annotate(total=models.Count("id"))
+                .values("total")
+            ),
+            0,
+        )
+        Product.objects.filter(pk=product_id).update(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_average=Coalesce(
+                models.Subquery(
+                    counted.values("product")
+                    .annotate(average=models.Avg("rating"))
+                    .values("average")
+                ),
+                0.0,
+            ),
+            updated_at=timezone.now(),
+        )
 
     class Meta:
         constraints = [
@@ -58,6 +141,19 @@ class Review(models.Model):
                 fields=["user", "product"], name="unique_review_per_user_per_product"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["product", "votes_count", "id"],
+                name="review_product_votes_idx",
+            ),
+            models.Index(
+                fields=["product", "created_date", "id"],
+                name="review_product_created_idx",
+            ),
+            models.Index(
+                fields=["product", "rating", "id"], name="review_product_rating_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Review for {self.product.name} - {self.rating} stars"
@@ -105,8 +201,23 @@ class Comment(models.Model):
     message = models.TextField(_("message"))
     created_date = models.DateTimeField(auto_now_add=True)
 
+    @classmethod
+    def thread(cls, review):
+        """Return a review's comments with their authors, newest first, for keyset pagination."""
+        return (
+            cls.objects.filter(review=review)
+            .select_related("user")
+            .order_by("-created_date", "-id")
+        )
+
     class Meta:
         ordering = ["-created_date"]
+        indexes = [
+            models.Index(
+                fields=["review", "created_date", "id"],
+                name="comment_review_created_idx",
+            )
+        ]
 
     def __str__(self):
         return f"{self.user.email} wrote a comment on the review '{self.review}'"
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from inventory.cache import bump_catalog_version
+from inventory.models import Product
+from .models import Comment, Flag, Review, Vote
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    """Add a new review to its product's rating, or recompute it after an edit."""
+    if raw:
+        return
+    if created:
+        Product.add_rating(instance.product_id, instance.rating)
+    else:
+        Review.refresh_product_rating(instance.product_id)
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Recompute the rating, since cascaded flag deletes hide whether the review counted."""
+    Review.refresh_product_rating(instance.product_id)
+
+
+@receiver(post_save, sender=Flag)
+def flag_saved(sender, instance, created, raw=False, **kwargs):
+    """Drop a review from its product's rating once it crosses the flag threshold."""
+    if raw or not created:
+        return
+    with transaction.atomic():
+        # Lock the review so concurrent flags agree on which one crossed the threshold
+        review = Review.objects.select_for_update().get(pk=instance.review_id)
+        if Flag.objects.filter(review=review).count() == Review.FLAG_THRESHOLD + 1:
+            Product.add_rating(review.product_id, -review.rating, count=-1)
+
+
+@receiver(post_delete, sender=Flag)
+def flag_deleted(sender, instance, **kwargs):
+    """Recompute the rating, since removing a flag may bring a review back."""
+    review = Review.objects.filter(pk=instance.review_id).first()
+    if review is not None:
+        Review.refresh_product_rating(review.product_id)
+
+
+@receiver(post_save, sender=Vote)
+def vote_saved(sender, instance, created, raw=False, **kwargs):
+    """Count a new vote in its review's stored votes_count."""
+    if raw or not created:
+        return
+    Review.objects.filter(pk=instance.review_id).update(
+        votes_count=F("votes_count") + 1
+    )
+
+
+@receiver(post_delete, sender=Vote)
+def vote_deleted(sender, instance, **kwargs):
+    """Remove a deleted vote from its review's stored votes_count."""
+    Review.objects.filter(pk=instance.review_id).update(
+        votes_count=F("votes_count") - 1
+    )
+
+
+@receiver([post_save, post_delete], sender=Vote)
+@receiver([post_save, post_delete], sender=Comment)
+def review_feedback_changed(sender, instance, raw=False, **kwargs):
+    """Move the product's updated_at forward, since its page shows vote and comment counts."""
+    if raw:
+        return
+    Product.objects.filter(reviews=instance.review_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=Flag)
+def ratings_changed(sender, **kwargs):
+    """Move to a new catalog version, since listings sort and show by rating."""
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
@@ -8,6 +8,7 @@ urlpatterns = [
     path("product/<int:product_id>/submit/", views.review_submit, name="review_submit"),
     path("<int:review_id>/vote/", views.vote, name="vote"),
     path("<int:review_id>/vote/submit/", views.vote_submit, name="vote_submit"),
+    path("<int:review_id>/comments/", views.comments, name="comments"),
     path("<int:review_id>/comment/", views.comment, name="comment"),
     path(
         "<int:review_id>/comment/submit/", views.comment_submit, name="comment_submit"
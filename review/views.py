@@ -1,10 +1,12 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_POST, require_GET
 from inventory.models import Product
 from cart.models import OrderItem
-from .models import Review, Flag, Vote
+from inventory.pagination import InvalidCursor, KeysetPaginator
+from .models import Comment, Review, Flag, Vote
 from .forms import ReviewForm, VoteForm, CommentForm, FlagForm
 
 
@@ -82,6 +84,20 @@ def vote_submit(request, review_id):
     return redirect("inventory:product", product_id=review.product.id)
 
 
+@require_GET
+def comments(request, review_id):
+    """Render one page of a review's comments as a fragment for the product page."""
+    review = get_object_or_404(Review, pk=review_id)
+    paginator = KeysetPaginator(
+        Comment.thread(review), per_page=settings.REVIEW_COMMENTS_PAGE_SIZE
+    )
+    try:
+        page = paginator.page(request.GET.get("cursor"))
+    except InvalidCursor:
+        page = paginator.page()
+    return render(request, "review/comments.html", {"review": review, "page": page})
+
+
 @login_required(login_url="account:login")
 @require_GET
 def comment(request, review_id):
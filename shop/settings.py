@@ -151,6 +151,67 @@ STATICFILES_DIRS = [
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Number of products per keyset-paginated catalog listing page
+CATALOG_PAGE_SIZE = 24
+
+# Product search backend used by Product.search_by_name; use
+# "inventory.search.PostgresSearchBackend" on PostgreSQL (which needs the
+# unaccent extension, see inventory migration 0012) or
+# "inventory.search.IContainsSearchBackend" where FTS5 is unavailable. Run
+# manage.py rebuild_search_index after switching backends
+CATALOG_SEARCH_BACKEND = "inventory.search.SQLiteFTSSearchBackend"
+
+# Default and maximum number of products per page of the JSON catalog API
+CATALOG_API_PAGE_SIZE = 50
+CATALOG_API_MAX_PAGE_SIZE = 200
+
+# Number of precomputed related products shown on each product page
+CATALOG_RELATED_PRODUCTS = 8
+
+# Imports touching more products than this rebuild every product's related
+# products once, rather than refreshing the imported ones batch by batch
+CATALOG_RELATED_REFRESH_LIMIT = 50_000
+
+# Number of "customers who bought this also bought" products kept per product,
+# and the order items read per chunk by the build_recommendations command
+CATALOG_RECOMMENDATIONS = 8
+CATALOG_RECOMMENDER_CHUNK_SIZE = 100_000
+
+# Number of completions returned by the search box autocomplete endpoint
+CATALOG_AUTOCOMPLETE_RESULTS = 8
+
+# Cache (from CACHES) holding rendered listings, facet counts and the catalog
+# version that invalidates them; point it at a shared backend such as Redis or
+# Memcached when running several processes
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 60 * 5
+
+# Product and category image variants are rendered in a pool of this many worker
+# processes after an upload; set CATALOG_IMAGE_VARIANTS_ASYNC to False to render
+# them inline instead
+CATALOG_IMAGE_VARIANTS_ASYNC = True
+CATALOG_IMAGE_WORKERS = 2
+
+# Directory where gzipped marketplace feeds are cached per catalog version
+CATALOG_FEED_DIR = BASE_DIR / "feeds"
+
+# Seconds before a Stripe Checkout session expires, counted from the call that
+# creates it; Stripe requires at least 30 minutes, so keep a margin above that
+STRIPE_SESSION_TTL = 31 * 60
+
+# Seconds a checkout holds its cart's units while the customer pays; longer than
+# the Stripe session, so a late checkout.session.completed still finds its hold
+STOCK_HOLD_TTL = STRIPE_SESSION_TTL + 15 * 60
+
+# Seconds an account's cart and wishlist badge counts stay in the default cache;
+# changes drop them at once, so this only bounds a count cached by a page
+# rendered while the change was committing
+BADGE_CACHE_TIMEOUT = 60 * 5
+
+# Reviews per product page and comments per lazily loaded page under a review
+REVIEW_PAGE_SIZE = 10
+REVIEW_COMMENTS_PAGE_SIZE = 10
+
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 7  # 7 days, tweak as you like
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
@@ -23,6 +23,7 @@ from django.conf.urls.i18n import i18n_patterns
 
 urlpatterns = [
     path("i18n/", include("django.conf.urls.i18n")),
+    path("api/", include("inventory.api_urls")),
 ]
 
 urlpatterns += i18n_patterns(
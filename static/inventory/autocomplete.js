@@ -0,0 +1,30 @@
+// Fill the nav search box's datalist from the autocomplete endpoint as the user types.
+document.querySelectorAll("form[data-autocomplete-url]").forEach((form) => {
+	const input = form.querySelector("input[list]");
+	const datalist = document.getElementById(input.getAttribute("list"));
+	let timer;
+	let controller;
+
+	input.addEventListener("input", () => {
+		clearTimeout(timer);
+		timer = setTimeout(async () => {
+			const query = input.value.trim();
+			if (!query) {
+				datalist.replaceChildren();
+				return;
+			}
+			controller?.abort();
+			controller = new AbortController();
+			const url = `${form.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+			try {
+				const response = await fetch(url, { signal: controller.signal });
+				const { results } = await response.json();
+				datalist.replaceChildren(
+					...results.map(({ label }) => new Option(label)),
+				);
+			} catch (error) {
+				if (error.name !== "AbortError") throw error;
+			}
+		}, 150);
+	});
+});
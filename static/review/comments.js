@@ -0,0 +1,30 @@
+// Load a review's comments the first time it is expanded, then one page per "more" link.
+async function loadComments(link) {
+	link.setAttribute("aria-busy", "true");
+	const response = await fetch(link.href);
+	if (!response.ok) {
+		link.removeAttribute("aria-busy");
+		return;
+	}
+	const page = document.createRange().createContextualFragment(
+		await response.text(),
+	);
+	link.replaceWith(page);
+}
+
+document.querySelectorAll("details[data-comments-url]").forEach((details) => {
+	details.addEventListener("toggle", () => {
+		const link = details.querySelector(".comments__more");
+		if (details.open && link && !details.dataset.loaded) {
+			details.dataset.loaded = "true";
+			loadComments(link);
+		}
+	});
+	details.addEventListener("click", (event) => {
+		const link = event.target.closest(".comments__more");
+		if (link) {
+			event.preventDefault();
+			loadComments(link);
+		}
+	});
+});
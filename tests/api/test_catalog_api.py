@@ -1,6 +1,9 @@
+import datetime
 import pytest
 import requests
 from django.urls import reverse
+from django.utils import timezone
+from cart.models import Order, OrderItem, StockHold
 
 
 @pytest.mark.django_db
@@ -53,3 +56,108 @@ def test_catalog_filter_api(live_server, seed_data):
     assert response.status_code == 200
     assert "Keychron Q1" in response.text
     assert "MX Master 3S" not in response.text
+
+
+@pytest.mark.django_db
+def test_products_json_api_pages_and_projects_fields(live_server, seed_data):
+    category, p1, p2, p3 = seed_data
+    url = f"{live_server.url}{reverse('api:products')}"
+    params = {"sort": "price-high-low", "fields": "id,sale_price,url", "limit": 2}
+    response = requests.get(url, params=params)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["results"] == [
+        {"id": p1.id, "sale_price": 13500, "url": f"/en/product/{p1.id}/"},
+        {"id": p2.id, "sale_price": 9900, "url": f"/en/product/{p2.id}/"},
+    ]
+    assert data["previous"] is None
+
+    next_page = requests.get(f"{live_server.url}{data['next']}").json()
+    assert [product["id"] for product in next_page["results"]] == [p3.id]
+    assert next_page["next"] is None
+
+    etag = response.headers["ETag"]
+    cached = requests.get(url, params=params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+
+    p3.price = 20000
+    p3.save()
+    changed = requests.get(url, params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["results"][0]["id"] == p3.id
+
+    assert requests.get(url, params={"fields": "id,secret"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_product_json_api_returns_one_product(live_server, seed_data):
+    category, p1, p2, p3 = seed_data
+    url = f"{live_server.url}{reverse('api:product', args=[p3.id])}"
+    response = requests.get(url, params={"fields": "name,available,category"})
+    assert response.json() == {
+        "name": "Cable Organizer",
+        "available": False,
+        "category": category.id,
+    }
+    missing = requests.get(f"{live_server.url}{reverse('api:product', args=[0])}")
+    assert missing.status_code == 404
+
+
+@pytest.mark.django_db
+def test_product_json_api_follows_held_units(
+    live_server, seed_data, django_capture_on_commit_callbacks
+):
+    """Holds that leave a product in stock still change its units and ETag."""
+    category, p1, p2, p3 = seed_data
+    url = f"{live_server.url}{reverse('api:product', args=[p1.id])}"
+    params = {"fields": "quantity,available"}
+    response = requests.get(url, params=params)
+    assert response.json() == {"quantity": p1.quantity, "available": True}
+    etag = response.headers["ETag"]
+
+    order = Order.objects.create(total_cents=0)
+    OrderItem.objects.create(order=order, product=p1, quantity=2, unit_price_cents=0)
+    with django_capture_on_commit_callbacks(execute=True):
+        StockHold.place(order, timezone.now() + datetime.timedelta(minutes=30))
+
+    changed = requests.get(url, params=params, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"quantity": p1.quantity - 2, "available": True}
+
+
+@pytest.mark.django_db
+def test_api_errors_carry_no_etag(live_server, seed_data):
+    products = f"{live_server.url}{reverse('api:products')}"
+    missing = f"{live_server.url}{reverse('api:product', args=[0])}"
+    for url, params, status in [
+        (products, {"fields": "id,secret"}, 400),
+        (products, {"cursor": "not-a-cursor"}, 400),
+        (missing, {}, 404),
+    ]:
+        response = requests.get(url, params=params)
+        assert response.status_code == status
+        assert "ETag" not in response.headers
+        # Even a client matching any ETag gets the error again, not a 304
+        revalidated = requests.get(url, params=params, headers={"If-None-Match": "*"})
+        assert revalidated.status_code == status
+
+
+@pytest.mark.django_db
+def test_products_json_api_revalidates_searches_without_queries(
+    client, seed_data, django_assert_num_queries
+):
+    url = reverse("api:products")
+    params = {"search": "keychron", "fields": "id,name"}
+    response = client.get(url, params)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    with django_assert_num_queries(0):
+        cached = client.get(url, params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    # A typo runs the trigram fallback too, after the ETag comparison
+    params["search"] = "keychorn"
+    etag = client.get(url, params).headers["ETag"]
+    with django_assert_num_queries(0):
+        cached = client.get(url, params, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
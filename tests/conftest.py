@@ -2,10 +2,14 @@ import os
 import pytest
 import datetime
 from django.utils import timezone
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from faker import Faker
 from account.models import Account, Wishlist
 from inventory.models import Category, Product
+from inventory.autocomplete import reset_autocomplete_index
+from inventory.cache import invalidate_navigation_categories
+from inventory.trigram import reset_trigram_index
 from cart.models import Order, Cart
 from review.models import Review, Vote, Comment, Flag
 
@@ -17,6 +21,22 @@ os.environ.setdefault("STRIPE_WEBHOOK_SECRET", "whsec_mock")
 os.environ.setdefault("DJANGO_ALLOW_ASYNC_UNSAFE", "true")
 
 
+@pytest.fixture(autouse=True)
+def fresh_catalog_caches():
+    """
+    Rebuild in-memory indexes and cached catalog data from each test's own rows.
+    """
+    cache.clear()
+    invalidate_navigation_categories()
+    reset_trigram_index()
+    reset_autocomplete_index()
+    yield
+    cache.clear()
+    invalidate_navigation_categories()
+    reset_trigram_index()
+    reset_autocomplete_index()
+
+
 @pytest.fixture
 def fake_user() -> dict[str, str]:
     """
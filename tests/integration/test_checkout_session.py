@@ -1,7 +1,10 @@
+import time
 import pytest
+import stripe
 from django.urls import reverse
 from django.test import Client
 from unittest.mock import patch, MagicMock
+from cart.models import Order, StockHold
 from inventory.models import Category, Product
 
 
@@ -52,3 +55,55 @@ def test_checkout_and_session_creation(
         called_kwargs["line_items"][0]["price_data"]["unit_amount"]
         == p1.get_discounted_price()
     )
+
+    # 4. The session expires at least 30 minutes from the call, as Stripe
+    # requires, and the unit is held for longer than that
+    assert called_kwargs["expires_at"] >= time.time() + 30 * 60
+    p1.refresh_from_db()
+    assert p1.reserved_quantity == 1
+    hold = StockHold.objects.get(product=p1)
+    assert hold.expires_at.timestamp() > called_kwargs["expires_at"]
+
+
+@pytest.mark.django_db
+@patch("stripe.checkout.Session.create")
+def test_refused_checkout_session_releases_the_hold(
+    mock_stripe_create: MagicMock,
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+) -> None:
+    """A session Stripe refuses gives the held units back and returns to the cart."""
+    category, p1, p2, p3 = seed_data
+    mock_stripe_create.side_effect = stripe.InvalidRequestError(
+        "expires_at must be at least 30 minutes from now", "expires_at"
+    )
+    test_client.post(reverse("cart:add_to_cart", args=[p1.id]), {"quantity": "1"})
+
+    response = test_client.get(reverse("cart:create_checkout_session"))
+
+    assert response.status_code == 302
+    assert response.url == reverse("cart:cart_detail")
+    p1.refresh_from_db()
+    assert p1.reserved_quantity == 0
+    assert not StockHold.objects.exists()
+    assert Order.objects.get().status == Order.STATUS_CANCELLED
+
+
+@pytest.mark.django_db
+@patch("stripe.checkout.Session.create")
+def test_checkout_refuses_units_held_by_others(
+    mock_stripe_create: MagicMock,
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+) -> None:
+    """A checkout asking for more units than are left unheld goes back to the cart."""
+    category, p1, p2, p3 = seed_data
+    Product.objects.filter(pk=p1.pk).update(reserved_quantity=p1.quantity)
+    test_client.post(reverse("cart:add_to_cart", args=[p1.id]), {"quantity": "1"})
+
+    response = test_client.get(reverse("cart:create_checkout_session"))
+
+    assert response.status_code == 302
+    assert response.url == reverse("cart:cart_detail")
+    mock_stripe_create.assert_not_called()
+    assert not Order.objects.exists()
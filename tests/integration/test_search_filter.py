@@ -1,6 +1,10 @@
+import csv
+import gzip
+import io
 import pytest
 from django.urls import reverse
 from django.test import Client
+from inventory.cache import listing_cache_stats
 from inventory.models import Category, Product
 
 
@@ -36,3 +40,203 @@ def test_catalog_search_and_filter(
     assert "Keychron Q1" in content
     # MX Master 3S has no discount -> should not be present
     assert "MX Master 3S" not in content
+
+
+@pytest.mark.django_db
+def test_catalog_pagination_keeps_sort_and_filters(
+    test_client: Client, seed_data: tuple[Category, Product, Product, Product], settings
+) -> None:
+    """
+    Integration test for cursor pagination links on the catalog index.
+    """
+    settings.CATALOG_PAGE_SIZE = 1
+    category, p1, p2, p3 = seed_data
+    params = {"sort": "price-high-low", "filter_criteria": ["quantity"]}
+
+    response = test_client.get(reverse("inventory:index"), params)
+    assert list(response.context["products"]) == [p1]
+    page = response.context["page"]
+    assert page.has_next and not page.has_previous
+    content = response.content.decode()
+    assert "sort=price-high-low" in content
+    assert "filter_criteria=quantity" in content
+
+    response = test_client.get(
+        reverse("inventory:index"), {**params, "cursor": page.next_cursor}
+    )
+    assert list(response.context["products"]) == [p2]
+    assert not response.context["page"].has_next
+
+    # An invalid cursor falls back to the first page
+    response = test_client.get(reverse("inventory:index"), {"cursor": "bogus"})
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_search_results_default_to_relevance(
+    test_client: Client, seed_data: tuple[Category, Product, Product, Product]
+) -> None:
+    """
+    Integration test for relevance ordering of search results.
+    """
+    category, p1, p2, p3 = seed_data
+    response = test_client.get(reverse("inventory:results"), {"search": "mouse"})
+    assert list(response.context["products"]) == [p2]
+    assert response.context["filter_sort_form"]["sort"].value() == "relevance"
+
+
+@pytest.mark.django_db
+def test_autocomplete_answers_from_memory(
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+    django_assert_num_queries,
+) -> None:
+    """
+    Autocomplete suggests products and categories without querying per keystroke.
+    """
+    category, p1, p2, p3 = seed_data
+    url = reverse("inventory:autocomplete")
+    test_client.get(url, {"q": "k"})
+
+    with django_assert_num_queries(0):
+        response = test_client.get(url, {"q": "ke"})
+    assert response.status_code == 200
+    assert response.json()["results"] == [
+        {
+            "type": "category",
+            "label": "Keyboards",
+            "url": reverse("inventory:category", args=[category.id]),
+        },
+        {
+            "type": "product",
+            "label": "Keychron Q1",
+            "url": reverse("inventory:product", args=[p1.id]),
+        },
+    ]
+
+    p2.name = "Keychron K2"
+    p2.save()
+    labels = [
+        r["label"] for r in test_client.get(url, {"q": "keychron"}).json()["results"]
+    ]
+    assert labels == ["Keychron K2", "Keychron Q1"]
+
+
+@pytest.mark.django_db
+def test_listings_render_facet_counts(
+    test_client: Client, seed_data: tuple[Category, Product, Product, Product]
+) -> None:
+    """
+    Filters, categories and price buckets show how many products they hold.
+    """
+    response = test_client.get(reverse("inventory:index"))
+    content = response.content.decode()
+    assert "Availability (2)" in content
+    assert "With Discount (1)" in content
+
+    response = test_client.get(reverse("inventory:results"), {"search": "keychron"})
+    content = response.content.decode()
+    assert "Availability (1)" in content
+    assert "Keyboards</a>" in content
+
+
+@pytest.mark.django_db
+def test_listing_cache_is_invalidated_by_catalog_changes(
+    test_client: Client, seed_data: tuple[Category, Product, Product, Product]
+) -> None:
+    """
+    Repeated listings are served from the cache until the catalog changes.
+    """
+    category, p1, p2, p3 = seed_data
+    url = reverse("inventory:category", args=[category.id])
+    params = {"sort": "price-low-high", "filter_criteria": ["quantity"]}
+    test_client.get(url, params)
+    assert listing_cache_stats() == {"hits": 0, "misses": 1}
+
+    response = test_client.get(url, params)
+    assert response.content.decode().count("product-card__title") == 2
+    assert listing_cache_stats() == {"hits": 1, "misses": 1}
+
+    p3.quantity = 4
+    p3.save()
+    response = test_client.get(url, params)
+    assert response.content.decode().count("product-card__title") == 3
+    assert listing_cache_stats() == {"hits": 1, "misses": 2}
+
+
+@pytest.mark.django_db
+def test_product_feed_is_streamed_and_cached_per_catalog_version(
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+    settings,
+    tmp_path,
+    django_assert_num_queries,
+) -> None:
+    """
+    The gzipped feed lists discounted prices and availability and is generated
+    once per catalog version.
+    """
+    category, p1, p2, p3 = seed_data
+    settings.CATALOG_FEED_DIR = tmp_path
+    url = reverse("inventory:feed", args=["csv"])
+
+    response = test_client.get(url)
+    assert response.streaming
+    assert response["Content-Type"] == "application/gzip"
+    body = b"".join(response.streaming_content)
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(body).decode())))
+    assert [row["title"] for row in rows] == [
+        "Keychron Q1",
+        "MX Master 3S",
+        "Cable Organizer",
+    ]
+    assert (rows[0]["price"], rows[0]["sale_price"]) == ("150.00 CAD", "135.00 CAD")
+    assert rows[0]["link"] == f"http://testserver/en/product/{p1.id}/"
+    assert rows[2]["availability"] == "out of stock"
+
+    with django_assert_num_queries(0):
+        cached = b"".join(test_client.get(url).streaming_content)
+    assert cached == body
+
+    p3.quantity = 4
+    p3.save()
+    response = test_client.get(url)
+    rows = list(
+        csv.DictReader(
+            io.StringIO(gzip.decompress(b"".join(response.streaming_content)).decode())
+        )
+    )
+    assert rows[2]["availability"] == "in stock"
+    assert len(list(tmp_path.glob("products-*.csv.gz"))) == 1
+
+    assert test_client.get(reverse("inventory:feed", args=["pdf"])).status_code == 404
+
+
+@pytest.mark.django_db
+def test_final_price_sort_and_price_buckets_use_effective_price(
+    test_client: Client, seed_data: tuple[Category, Product, Product, Product]
+) -> None:
+    """
+    Sorting and price filters follow the discounted price customers pay.
+    """
+    category, p1, p2, p3 = seed_data
+    p4 = Product.objects.create(
+        name="Plain Board", quantity=1, price=14000, category=category
+    )
+    assert Product.objects.get(pk=p1.pk).effective_price == p1.get_discounted_price()
+
+    response = test_client.get(
+        reverse("api:products"), {"sort": "final-price-high-low", "fields": "id"}
+    )
+    assert [row["id"] for row in response.json()["results"]] == [
+        p4.id,
+        p1.id,
+        p2.id,
+        p3.id,
+    ]
+
+    response = test_client.get(reverse("inventory:index"), {"price": 2})
+    content = response.content.decode()
+    assert content.count("product-card__title") == 2
+    assert "Keychron Q1" in content and "Plain Board" in content
+    assert "$135.00" in content
@@ -81,20 +81,19 @@ class KeyboardCollectiveUser(HttpUser):
         )
 
     def discover_products(self) -> None:
-        """Scrapes the localized shop catalog view to collect active product and category item layers."""
-        response = self.client.get("/en/")
+        """Collects product and category URLs from the JSON catalog API."""
+        response = self.client.get(
+            "/api/products/",
+            params={"fields": "url,category", "limit": 200},
+            headers={"Accept-Language": "en"},
+            name="/api/products/",
+        )
         if response.status_code == 200:
-            found_products: list[str] = re.findall(
-                r'href="((?:/[a-z]{2})?/product/\d+/)"', response.text
-            )
-            if found_products:
-                self.product_urls = list(set(found_products))
-
-            found_categories: list[str] = re.findall(
-                r'href="((?:/[a-z]{2})?/category/\d+/)"', response.text
+            results = response.json()["results"]
+            self.product_urls = [product["url"] for product in results]
+            self.category_urls = sorted(
+                {f"/en/category/{product['category']}/" for product in results}
             )
-            if found_categories:
-                self.category_urls = list(set(found_categories))
 
     def extract_csrf(self, html_text: str) -> str:
         """Helper utility using regex parsing to pull csrf token parameters out of layouts."""
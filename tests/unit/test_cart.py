@@ -1,5 +1,18 @@
+import threading
+from io import StringIO
+import time
 import pytest
-from cart.models import Order, OrderItem, CartItem
+from django.db import OperationalError, connection
+from cart.models import FULFILL_FIELDS, Order, OrderItem, CartItem, OutOfStock
+from inventory.models import Category, Product
+
+
+def _order(product, quantity, user=None):
+    order = Order.objects.create(user=user, total_cents=product.price * quantity)
+    OrderItem.objects.create(
+        order=order, product=product, quantity=quantity, unit_price_cents=product.price
+    )
+    return order
 
 
 @pytest.mark.django_db
@@ -113,3 +126,313 @@ def test_cart_item_str_and_price_properties(cart_item_setup):
     assert item.unit_cents == 1500
     assert item.line_cents == 1500 * 3
     assert item.total_cents == 1500 * 3
+
+
+@pytest.mark.django_db
+def test_mark_paid_takes_stock_once(cart_setup):
+    cart, product1, product2 = cart_setup
+    order = _order(product1, 3)
+    OrderItem.objects.create(
+        order=order, product=product1, quantity=2, unit_price_cents=1000
+    )
+    OrderItem.objects.create(
+        order=order, product=product2, quantity=1, unit_price_cents=2000
+    )
+
+    assert order.mark_paid() is True
+    assert order.status == Order.STATUS_PAID and order.paid_at is not None
+    # A second delivery of the payment webhook changes nothing
+    assert Order.objects.get(pk=order.pk).mark_paid() is False
+    product1.refresh_from_db()
+    product2.refresh_from_db()
+    assert (product1.quantity, product2.quantity) == (95, 99)
+
+
+@pytest.mark.django_db
+def test_interleaved_deliveries_take_stock_once(cart_setup):
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product1.pk).update(quantity=5)
+    order = _order(product1, 2)
+    # Both deliveries load the order while it is still pending
+    first = Order.objects.get(pk=order.pk)
+    second = Order.objects.get(pk=order.pk)
+    details = {field: "x" for field in FULFILL_FIELDS if field != "total_cents"}
+    details.update(name="Buyer", email="buyer@example.com")
+
+    first.fulfill(total_cents=2000, **details)
+    assert first.mark_paid() is True
+    second.fulfill(total_cents=2000, **details)
+    assert second.mark_paid() is False
+
+    order.refresh_from_db()
+    assert order.status == Order.STATUS_PAID and order.paid_at is not None
+    assert Product.objects.get(pk=product1.pk).quantity == 3
+
+
+@pytest.mark.django_db
+def test_mark_paid_out_of_stock_changes_nothing(cart_setup):
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product2.pk).update(quantity=1)
+    order = _order(product1, 2)
+    OrderItem.objects.create(
+        order=order, product=product2, quantity=2, unit_price_cents=2000
+    )
+
+    with pytest.raises(OutOfStock) as excinfo:
+        order.mark_paid()
+    assert excinfo.value.product_ids == [product2.pk]
+    order.refresh_from_db()
+    assert order.status == Order.STATUS_PENDING
+    assert Product.objects.get(pk=product1.pk).quantity == 100
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_buyers_never_oversell():
+    category = Category.objects.create(name="Keyboards")
+    product = Product.objects.create(
+        name="Last units", price=1000, quantity=5, category=category
+    )
+    orders = [_order(product, 1 + i % 2) for i in range(16)]
+    barrier = threading.Barrier(len(orders))
+    paid, short = [], []
+
+    def buy(order):
+        try:
+            barrier.wait()
+            while True:
+                try:
+                    order.mark_paid()
+                    paid.append(order)
+                except OutOfStock:
+                    short.append(order)
+                except OperationalError:
+                    # The shared in-memory test database reports a lock held
+                    # by another thread instead of waiting for it
+                    time.sleep(0.001)
+                    continue
+                break
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=buy, args=(order,)) for order in orders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    product.refresh_from_db()
+    sold = sum(order.items.get().quantity for order in paid)
+    assert len(paid) + len(short) == len(orders)
+    assert product.quantity == 5 - sold >= 0
+    assert not short or product.quantity < 2
+    assert Order.objects.filter(status=Order.STATUS_PAID).count() == len(paid)
+
+
+@pytest.mark.django_db
+def test_stock_holds_reserve_convert_and_expire(cart_setup):
+    import datetime
+    from django.core.management import call_command
+    from django.utils import timezone
+    from cart.models import StockHold
+
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product1.pk).update(quantity=5)
+    later = timezone.now() + datetime.timedelta(minutes=30)
+
+    held = _order(product1, 3)
+    OrderItem.objects.create(
+        order=held, product=product2, quantity=1, unit_price_cents=2000
+    )
+    StockHold.place(held, later)
+    product1.refresh_from_db()
+    assert (product1.quantity, product1.reserved_quantity) == (5, 3)
+
+    # Only 2 units are left for everyone else, and a failed hold changes nothing
+    with pytest.raises(OutOfStock) as excinfo:
+        StockHold.place(_order(product1, 3), later)
+    assert excinfo.value.product_ids == [product1.pk]
+    assert Product.objects.get(pk=product2.pk).reserved_quantity == 1
+
+    assert held.mark_paid()
+    product1.refresh_from_db()
+    assert (product1.quantity, product1.reserved_quantity) == (2, 0)
+    assert not StockHold.objects.filter(order=held).exists()
+
+    # An abandoned checkout makes the product unavailable until its hold expires
+    StockHold.place(_order(product1, 2), timezone.now())
+    product1.refresh_from_db()
+    assert not product1.is_available
+    assert product1 not in Product.filter_by(["quantity"])
+    out = StringIO()
+    call_command("release_expired_holds", stdout=out)
+    assert "Released 1 expired holds." in out.getvalue()
+    product1.refresh_from_db()
+    assert product1.is_available and product1 in Product.filter_by(["quantity"])
+    assert product1.reserved_quantity == 0
+
+
+@pytest.mark.django_db
+def test_holds_bump_stock_always_and_catalog_when_availability_flips(
+    cart_setup, django_capture_on_commit_callbacks
+):
+    import datetime
+    from django.utils import timezone
+    from cart.models import StockHold
+    from inventory.cache import catalog_version, stock_version
+
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product1.pk).update(quantity=3)
+    later = timezone.now() + datetime.timedelta(minutes=30)
+    versions = (catalog_version(), stock_version())
+
+    def bumped():
+        """Return which of the (catalog, stock) versions moved since the last call."""
+        nonlocal versions
+        previous, versions = versions, (catalog_version(), stock_version())
+        return tuple(now != before for now, before in zip(versions, previous))
+
+    # Units left on both sides: only what shows unit counts is invalidated
+    first = _order(product1, 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        StockHold.place(first, later)
+    assert bumped() == (False, True)
+    with django_capture_on_commit_callbacks(execute=True):
+        first.mark_paid()
+    assert bumped() == (False, True)
+
+    # Holding the last units takes the product out of stock, releasing them
+    # brings it back
+    last = _order(product1, 2)
+    with django_capture_on_commit_callbacks(execute=True):
+        StockHold.place(last, later)
+    assert bumped() == (True, True)
+    with django_capture_on_commit_callbacks(execute=True):
+        StockHold.release(last)
+    assert bumped() == (True, True)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("upsert", [True, False])
+def test_add_clamps_to_stock_and_moves_the_count_in_two_statements(
+    cart_setup, upsert, django_assert_num_queries
+):
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product1.pk).update(quantity=4)
+    add = cart.add if upsert else cart._add_with_update
+
+    def assert_counted():
+        # The stored count moved by each line's change matches a recount
+        if upsert:
+            cart.refresh_from_db()
+            assert cart.item_count == cart.count()
+
+    if upsert:
+        # One statement moves item_count and one writes the line, on SQLite;
+        # the others bracket the change in a savepoint
+        with django_assert_num_queries(4):
+            add(product1, 3, False)
+        cart.refresh_from_db()
+        assert cart.item_count == 3
+    else:
+        add(product1, 3, False)
+    add(product1, 3, False)
+    assert CartItem.objects.get(cart=cart, product=product1).quantity == 4
+    assert_counted()
+    add(product1, 0, True)
+    assert CartItem.objects.get(cart=cart, product=product1).quantity == 1
+    assert_counted()
+    # Products out of stock still keep one unit in the cart, like SessionCart
+    add(product2, 5, False)
+    assert_counted()
+    Product.objects.filter(pk=product2.pk).update(quantity=0)
+    add(product2, 1, False)
+    assert CartItem.objects.get(cart=cart, product=product2).quantity == 1
+    assert_counted()
+    # A product that no longer exists leaves the cart as it was
+    add(Product(pk=0), 1, False)
+    assert_counted()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("upsert", [True, False])
+def test_add_leaves_held_units_out(cart_setup, rf, upsert):
+    from django.contrib.sessions.backends.base import SessionBase
+    from cart.session_cart import SessionCart
+
+    cart, product1, product2 = cart_setup
+    Product.objects.filter(pk=product1.pk).update(quantity=5, reserved_quantity=3)
+    product1.refresh_from_db()
+    assert product1.available_quantity == 2
+
+    (cart.add if upsert else cart._add_with_update)(product1, 4, False)
+    assert CartItem.objects.get(cart=cart, product=product1).quantity == 2
+    request = rf.get("/")
+    request.session = SessionBase()
+    session_cart = SessionCart(request)
+    session_cart.add(product1, 4)
+    assert session_cart.count() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_adds_never_lose_an_increment(django_user_model):
+    from cart.models import Cart
+
+    user = django_user_model.objects.create_user(username="hammer")
+    cart = Cart.objects.create(account=user)
+    category = Category.objects.create(name="Keyboards")
+    product = Product.objects.create(
+        name="Keycaps", price=1000, quantity=500, category=category
+    )
+    adders = 24
+    barrier = threading.Barrier(adders)
+
+    def add():
+        try:
+            barrier.wait()
+            for _ in range(5):
+                while True:
+                    try:
+                        cart.add(product, quantity=2)
+                    except OperationalError:
+                        # The shared in-memory test database reports a lock held
+                        # by another thread instead of waiting for it
+                        time.sleep(0.001)
+                        continue
+                    break
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=add) for _ in range(adders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert CartItem.objects.get(cart=cart, product=product).quantity == adders * 10
+    cart.refresh_from_db()
+    assert cart.item_count == adders * 10
+
+
+@pytest.mark.django_db
+def test_cart_totals_are_single_aggregates(cart_item_setup, django_assert_num_queries):
+    cart, product = cart_item_setup
+    products = Product.objects.bulk_create(
+        Product(
+            name=f"Line {i}",
+            price=1000,
+            discount_percentage=10 if i % 2 else 0,
+            quantity=10,
+            category=product.category,
+        )
+        for i in range(100)
+    )
+    CartItem.objects.bulk_create(
+        CartItem(cart=cart, product=line, quantity=2) for line in products
+    )
+    with django_assert_num_queries(1):
+        assert cart.count() == 200
+    with django_assert_num_queries(1):
+        assert cart.subtotal_cents() == 50 * 2 * 1000 + 50 * 2 * 900
+    with django_assert_num_queries(1):
+        lines = [item.line_cents for item in cart.items()]
+    assert sum(lines) == 50 * 2 * 1000 + 50 * 2 * 900
@@ -6,9 +6,11 @@ from django.test import RequestFactory
 from django.urls import reverse
 from django.contrib.messages import get_messages
 
-from account.models import Account
+from account.context_processors import wishlist_info
+from account.models import Account, Wishlist
 from inventory.models import Category, Product
-from cart.models import Order, Cart
+from cart import models as cart_models
+from cart.models import Order, OrderItem, Cart
 from cart.session_cart import SessionCart
 from cart.context_processors import cart_info
 
@@ -335,6 +337,50 @@ def test_stripe_webhook_completion_guest(
     assert order.shipping_address_line1 == "200 Ship Ave"
 
 
+@pytest.mark.django_db
+@patch("stripe.Webhook.construct_event")
+def test_stripe_webhook_takes_stock_once_and_reports_shortages(
+    mock_construct: MagicMock,
+    test_client: Client,
+    order_user: Account,
+) -> None:
+    """stripe_webhook decrements stock once per order and answers 409 when it is short."""
+    category = Category.objects.create(name="Keyboards")
+    product = Product.objects.create(
+        name="Board", price=1000, quantity=3, category=category
+    )
+    orders = []
+    for quantity in (2, 2):
+        order = Order.objects.create(user=order_user, total_cents=1000 * quantity)
+        OrderItem.objects.create(
+            order=order, product=product, quantity=quantity, unit_price_cents=1000
+        )
+        orders.append(order)
+
+    def deliver(order):
+        mock_construct.return_value = {
+            "type": "checkout.session.completed",
+            "data": {
+                "object": {
+                    "client_reference_id": str(order.id),
+                    "payment_intent": f"pi_stock_{order.id}",
+                }
+            },
+        }
+        with patch.dict(os.environ, {"STRIPE_WEBHOOK_SECRET": "whsec_mock"}):
+            return test_client.post(
+                reverse("cart:fulfill_stripe_checkout_webhook"),
+                HTTP_STRIPE_SIGNATURE="mock_sig",
+            )
+
+    assert deliver(orders[0]).status_code == 200
+    assert deliver(orders[0]).status_code == 200
+    assert deliver(orders[1]).status_code == 409
+    product.refresh_from_db()
+    assert product.quantity == 1
+    assert [Order.objects.get(pk=o.pk).status for o in orders] == ["paid", "pending"]
+
+
 @pytest.mark.django_db
 @patch("stripe.Webhook.construct_event")
 def test_stripe_webhook_nonexistent_order(
@@ -416,3 +462,142 @@ def test_stripe_webhook_failure_nonexistent_order(
             HTTP_STRIPE_SIGNATURE="mock_sig",
         )
     assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_session_and_account_carts_price_alike(
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+) -> None:
+    """Both cart kinds price lines at the sale price, in the order they were added."""
+    _, p1, p2, _ = seed_data
+    session = test_client.session
+    session["cart"] = {
+        str(p2.id): {"qty": 1},
+        str(p1.id): {"qty": 2},
+        "99999": {"qty": 1},
+    }
+    session.save()
+    request = RequestFactory().get("/")
+    request.session = session
+    session_priced = SessionCart(request).priced()
+
+    user = Account.objects.create_user(username="pricer", email="pricer@example.com")
+    cart = Cart.objects.create(account=user)
+    cart.add(p2, quantity=1)
+    cart.add(p1, quantity=2)
+    account_priced = cart.priced()
+
+    for priced in (session_priced, account_priced):
+        assert [
+            (line.product, line.quantity, line.unit_cents, line.line_cents)
+            for line in priced
+        ] == [(p2, 1, 9900, 9900), (p1, 2, 13500, 27000)]
+        assert priced.subtotal_cents == 9900 + 27000
+        assert priced.count == 3
+
+
+@pytest.mark.django_db
+@patch("stripe.checkout.Session.create")
+def test_cart_pages_price_the_cart_once(
+    mock_stripe_create: MagicMock,
+    test_client: Client,
+    seed_data: tuple[Category, Product, Product, Product],
+) -> None:
+    """The cart, checkout and checkout session views price the cart once per request."""
+    _, p1, p2, _ = seed_data
+    user = Account.objects.create_user(username="once", email="once@example.com")
+    cart = Cart.objects.create(account=user)
+    cart.add(p1, quantity=1)
+    cart.add(p2, quantity=2)
+    test_client.force_login(user)
+    mock_stripe_create.return_value = MagicMock(
+        id="cs_once", url="https://checkout.stripe.com/pay/cs_once"
+    )
+
+    for name in ("cart:cart_detail", "cart:checkout", "cart:create_checkout_session"):
+        with patch.object(
+            cart_models, "price_lines", wraps=cart_models.price_lines
+        ) as price_lines:
+            response = test_client.get(reverse(name))
+        assert response.status_code in (200, 302)
+        assert price_lines.call_count == 1
+
+    order = Order.objects.get(user=user)
+    assert order.total_cents == 13500 + 2 * 9900
+    assert sorted(order.items.values_list("unit_price_cents", flat=True)) == [
+        9900,
+        13500,
+    ]
+
+
+@pytest.mark.django_db
+def test_badge_counts_are_cached_and_follow_changes(
+    seed_data: tuple[Category, Product, Product, Product],
+    django_assert_num_queries,
+) -> None:
+    """The header badges read stored counts once, then cost no query until a change."""
+    _, p1, p2, _ = seed_data
+    user = Account.objects.create_user(username="badges", email="badges@example.com")
+    cart = Cart.objects.create(account=user)
+    wishlist = Wishlist.objects.create(account=user)
+    request = RequestFactory().get("/")
+    request.user = user
+
+    def badges():
+        return cart_info(request)["cart_count"], wishlist_info(request)[
+            "wishlist_count"
+        ]
+
+    with django_assert_num_queries(1):
+        assert badges() == (0, 0)
+    with django_assert_num_queries(0):
+        assert badges() == (0, 0)
+
+    cart.add(p1, quantity=2)
+    cart.add(p2, quantity=1)
+    wishlist.add(p1)
+    assert badges() == (3, 1)
+    with django_assert_num_queries(0):
+        assert badges() == (3, 1)
+
+    cart.remove(p1)
+    wishlist.add(p2)
+    assert badges() == (1, 2)
+    wishlist.remove(p1)
+    assert badges() == (1, 1)
+    cart.clear()
+    wishlist.clear()
+    assert badges() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_badge_counts_follow_a_product_delete(
+    seed_data: tuple[Category, Product, Product, Product],
+) -> None:
+    """Lines and wishes removed by a product's cascade are recounted in the badges."""
+    _, p1, p2, _ = seed_data
+    user = Account.objects.create_user(username="cascade", email="cascade@example.com")
+    cart = Cart.objects.create(account=user)
+    wishlist = Wishlist.objects.create(account=user)
+    request = RequestFactory().get("/")
+    request.user = user
+    cart.add(p1, quantity=2)
+    cart.add(p2, quantity=1)
+    wishlist.add(p1)
+    wishlist.add(p2)
+    assert cart_info(request)["cart_count"] == 3
+    assert wishlist_info(request)["wishlist_count"] == 2
+
+    p1.delete()
+    assert cart_info(request)["cart_count"] == 1
+    assert wishlist_info(request)["wishlist_count"] == 1
+    cart.refresh_from_db()
+    wishlist.refresh_from_db()
+    assert (cart.item_count, wishlist.item_count) == (1, 1)
+
+    Product.objects.filter(pk=p2.pk).delete()
+    cart.refresh_from_db()
+    wishlist.refresh_from_db()
+    assert (cart.item_count, wishlist.item_count) == (0, 0)
+    assert cart_info(request)["cart_count"] == 0
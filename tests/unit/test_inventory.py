@@ -1,7 +1,42 @@
+import gzip
 import pytest
+from django.core.cache import cache
+from unittest.mock import patch
+from io import BytesIO, StringIO
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from django.core.management import call_command
 from inventory.models import Product, Category
 from review.models import Review
 from account.models import Account
+from inventory.cache import (
+    SEARCH_CHANGE_KEY,
+    ProcessIndex,
+    catalog_version,
+    search_change_count,
+)
+from inventory.pagination import KeysetPaginator, InvalidCursor
+from inventory.autocomplete import (
+    PrefixIndex,
+    build_autocomplete_index,
+    patch_autocomplete_index,
+)
+from inventory.context_processors import categories_processor
+from inventory.facets import compute_facets, get_facets, price_bucket
+from inventory.recommender import also_bought, also_bought_with, build_recommendations
+from inventory.related import (
+    rebuild_related_products,
+    refresh_related_products,
+    related_products,
+)
+from cart.models import Order, OrderItem
+from inventory.trigram import (
+    TrigramIndex,
+    build_trigram_index,
+    get_trigram_index,
+    patch_trigram_index,
+)
 
 
 @pytest.mark.django_db
@@ -154,3 +189,599 @@ def test_search_by_name(product_setup):
 def test_product_str(product_setup: tuple[Category, Product, Product, Product]) -> None:
     cat, prod1, prod2, prod3 = product_setup
     assert str(prod1) == "Keyboard X"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("sort_criteria", list(Product.SORT_ORDERINGS))
+def test_keyset_pagination_walks_every_sort(models_logic_category, sort_criteria):
+    for i in range(7):
+        Product.objects.create(
+            name=f"Switch {i % 3}",
+            price=1000 * (i % 2),
+            discount_percentage=5 * (i % 4),
+            category=models_logic_category,
+        )
+    products = Product.sort_by(sort_criteria)
+    expected = list(products)
+    paginator = KeysetPaginator(products, per_page=3)
+
+    seen, pages, page = [], [], paginator.page()
+    while True:
+        pages.append(page)
+        seen.extend(page)
+        if not page.has_next:
+            break
+        page = paginator.page(page.next_cursor)
+    assert seen == expected
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert not pages[0].has_previous
+
+    back = paginator.page(pages[-1].previous_cursor)
+    assert list(back) == expected[3:6]
+    back = paginator.page(back.previous_cursor)
+    assert list(back) == expected[:3]
+    assert not back.has_previous
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_rejects_bad_cursor(product_setup):
+    paginator = KeysetPaginator(Product.sort_by("a-z"), per_page=2)
+    with pytest.raises(InvalidCursor):
+        paginator.page("not-a-cursor")
+
+
+@pytest.mark.django_db
+def test_listing_queries_use_indexes():
+    out = StringIO()
+    call_command("benchmark_listings", products=2000, repeat=1, stdout=out)
+    assert "Every listing query walks an index." in out.getvalue()
+    assert not Product.objects.exists()
+
+
+@pytest.mark.django_db
+def test_search_is_ranked_and_folds_case_and_accents(models_logic_category):
+    in_description = Product.objects.create(
+        name="Switch Tester",
+        description="Includes a Gateron Yellow sample",
+        category=models_logic_category,
+    )
+    in_name = Product.objects.create(
+        name="Gatéron Yellow Pro",
+        description="Linear switch",
+        category=models_logic_category,
+    )
+    results = list(Product.search_by_name("GATERON yell").order_by("-search_rank"))
+    assert results == [in_name, in_description]
+    assert list(Product.search_by_name("???")) == []
+
+
+@pytest.mark.django_db
+def test_search_index_follows_product_changes(product_setup):
+    cat, prod1, prod2, prod3 = product_setup
+    prod1.name = "Holy Panda"
+    prod1.save()
+    assert list(Product.search_by_name("panda")) == [prod1]
+    assert list(Product.search_by_name("Keyboard X")) == []
+
+    prod1.delete()
+    assert list(Product.search_by_name("panda")) == []
+
+
+def test_trigram_index_ranks_typos_and_follows_updates():
+    index = TrigramIndex()
+    index.add(1, "Gateron Yellow")
+    index.add(2, "Cherry MX Red")
+    index.add(3, "Cherry MX Brown")
+    index.add(4, "Cherry Keycap Set")
+    index.add(5, "Cherry MX Browns")
+
+    assert index.search("gaterom") == [1]
+    assert index.search("cherri mx") == [5, 3, 2]
+    assert index.search("cherri mx brown") == [3, 5]
+    assert index.search("zzz") == []
+
+    index.add(2, "Durock Red")
+    index.remove(3)
+    assert index.search("cherri mx") == [5]
+    assert index.search("durok") == [2]
+
+
+@pytest.mark.django_db
+def test_search_falls_back_to_typo_tolerant_matches(product_setup):
+    cat, prod1, prod2, prod3 = product_setup
+    assert list(Product.search_by_name("keybord")) == [prod1]
+
+    get_trigram_index()
+    prod2.name = "Gateron Milky Yellow"
+    prod2.save()
+    assert list(Product.search_by_name("gaterom yelow")) == [prod2]
+    prod2.delete()
+    assert list(Product.search_by_name("gaterom")) == []
+
+
+@pytest.mark.django_db
+def test_other_processes_patch_their_indexes_from_the_change_log(
+    product_setup, django_capture_on_commit_callbacks
+):
+    cat, prod1, prod2, prod3 = product_setup
+    # Indexes as another process holds them; signals only patch this one's
+    trigrams = ProcessIndex(build_trigram_index, patch_trigram_index)
+    completions = ProcessIndex(build_autocomplete_index, patch_autocomplete_index)
+    trigrams.check_interval = completions.check_interval = 0
+    assert trigrams.get().search("keybord") == [prod1.pk]
+    assert completions.get().complete("switch") == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        prod1.name = "Gateron Milky Yellow"
+        prod1.save()
+        prod3.delete()
+        switches = Category.objects.create(name="Switches")
+    assert trigrams.get().search("gaterom") == [prod1.pk]
+    assert trigrams.get().search("keybord") == []
+    assert ("product", prod1.pk, "Gateron Milky Yellow") in completions.get().complete(
+        "gateron"
+    )
+    assert completions.get().complete("switch") == [
+        ("category", switches.pk, "Switches")
+    ]
+    assert completions.get().complete("cable") == []
+
+    # A change that expired from the log makes the process rebuild instead
+    with django_capture_on_commit_callbacks(execute=True):
+        prod2.name = "Durock Red"
+        prod2.save()
+    cache.delete(SEARCH_CHANGE_KEY.format(search_change_count()))
+    assert trigrams.get().search("durok") == [prod2.pk]
+
+
+def test_prefix_index_ranks_by_popularity_and_follows_updates():
+    index = PrefixIndex()
+    index.load(
+        [
+            ("product", 1, "Gateron Yellow", 3),
+            ("product", 2, "Yellow Keycap Set", 10),
+            ("category", 1, "Switches", 50),
+        ]
+    )
+    assert index.complete("yel") == [
+        ("product", 2, "Yellow Keycap Set"),
+        ("product", 1, "Gateron Yellow"),
+    ]
+    assert index.complete("GATERON y") == [("product", 1, "Gateron Yellow")]
+    assert index.complete("sw") == [("category", 1, "Switches")]
+    assert index.complete("  ") == []
+
+    index.add("product", 1, "Gateron Yellow Pro", 30)
+    index.remove("product", 2)
+    assert index.complete("yel") == [("product", 1, "Gateron Yellow Pro")]
+
+
+@pytest.mark.django_db
+def test_facets_are_counted_in_one_query(seed_data, django_assert_num_queries):
+    category, p1, p2, p3 = seed_data
+    other = Category.objects.create(name="Switches")
+    Product.objects.create(name="Gateron Yellow", price=40, quantity=3, category=other)
+
+    with django_assert_num_queries(1):
+        facets = compute_facets(Product.objects.all(), ["quantity"])
+    assert facets["total"] == 3
+    assert facets["filters"] == {
+        "quantity": 3,
+        "discount_percentage": 1,
+        "created_recently": 3,
+    }
+    assert facets["categories"] == [
+        (category.id, "Keyboards", 2),
+        (other.id, "Switches", 1),
+    ]
+    assert [count for _label, count in facets["price_buckets"]] == [1, 1, 1, 0]
+
+
+@pytest.mark.django_db
+def test_facets_follow_the_selected_price_bucket(seed_data):
+    category, p1, p2, p3 = seed_data
+    other = Category.objects.create(name="Switches")
+    Product.objects.create(name="Gateron Yellow", price=40, quantity=3, category=other)
+    price_range = price_bucket("2")
+
+    facets = get_facets(Product.objects.all(), [], ("index",), price_range)
+    assert facets["total"] == 1
+    assert facets["categories"] == [(category.id, "Keyboards", 1)]
+    assert facets["filters"]["quantity"] == 1
+    unpriced = get_facets(Product.objects.all(), [], ("index",))
+    assert facets["price_buckets"] == unpriced["price_buckets"]
+    assert unpriced["total"] == 4
+
+
+@pytest.mark.django_db
+def test_cached_facets_follow_catalog_changes(seed_data):
+    category, p1, p2, p3 = seed_data
+    assert get_facets(Product.objects.all(), [], ("index",))["total"] == 3
+    p3.delete()
+    assert get_facets(Product.objects.all(), [], ("index",))["total"] == 2
+
+
+@pytest.mark.django_db
+def test_navigation_categories_are_lazy_and_cached(
+    category_setup, rf, django_assert_num_queries
+):
+    with django_assert_num_queries(0):
+        context = categories_processor(rf.get("/"))
+    with django_assert_num_queries(1):
+        assert [c.name for c in context["categories"]] == ["Test Category"]
+    with django_assert_num_queries(0):
+        assert len(categories_processor(rf.get("/"))["categories"]) == 1
+
+    Category.objects.create(name="Switches")
+    assert [c.name for c in categories_processor(rf.get("/"))["categories"]] == [
+        "Test Category",
+        "Switches",
+    ]
+
+
+def _jpeg_upload(name, size=(1600, 900)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@pytest.mark.django_db
+def test_uploaded_images_get_responsive_variants(
+    models_logic_category, settings, tmp_path, django_capture_on_commit_callbacks
+):
+    settings.MEDIA_ROOT = tmp_path
+    settings.CATALOG_IMAGE_VARIANTS_ASYNC = False
+    with django_capture_on_commit_callbacks(execute=True):
+        product = Product.objects.create(
+            name="Gateron Yellow",
+            category=models_logic_category,
+            image=_jpeg_upload("gateron.jpg"),
+        )
+
+    product.refresh_from_db()
+    meta = product.image_variants
+    assert (meta["width"], meta["height"]) == (1600, 900)
+    assert meta["variants"]["card"]["width"] == 480
+    assert meta["placeholder"].startswith("data:image/jpeg;base64,")
+    assert (tmp_path / meta["variants"]["thumbnail"]["webp"]).exists()
+
+    html = Template(
+        "{% load responsive_images %}{% responsive_image product alt=product.name %}"
+    ).render(Context({"product": product}))
+    assert '<source type="image/webp"' in html
+    assert "-thumbnail.webp 160w" in html and "-detail.jpeg 1200w" in html
+    assert 'width="480" height="270"' in html
+
+
+@pytest.mark.django_db
+def test_generate_image_variants_backfills_missing_variants(
+    models_logic_category, settings, tmp_path, django_capture_on_commit_callbacks
+):
+    settings.MEDIA_ROOT = tmp_path
+    Product.objects.bulk_create(
+        Product(name=f"Switch {i}", category=models_logic_category, image=name)
+        for i, name in enumerate(["a.jpg", "missing.jpg"])
+    )
+    (tmp_path / "a.jpg").write_bytes(_jpeg_upload("a.jpg", (100, 50)).read())
+
+    version = catalog_version()
+
+    out = StringIO()
+    # One row per chunk, so failures are collected across several chunks
+    with (
+        patch("inventory.management.commands.generate_image_variants.CHUNK_SIZE", 1),
+        django_capture_on_commit_callbacks(execute=True),
+    ):
+        call_command("generate_image_variants", workers=1, stdout=out)
+    assert "products: 1 rendered, 1 failed" in out.getvalue()
+    # Cached listings move on to the new variants
+    assert catalog_version() != version
+    variants = Product.objects.get(image="a.jpg").image_variants["variants"]
+    assert variants["detail"]["width"] == 100
+
+
+@pytest.mark.django_db
+def test_import_catalog_upserts_products_by_sku(models_logic_category, tmp_path):
+    Product.objects.create(
+        sku="GAT-Y", name="Old name", price=100, category=models_logic_category
+    )
+    (tmp_path / "catalog.jsonl").write_text(
+        '{"sku": "GAT-Y", "name": "Gateron Yellow", "category": "Switches", "price": 45}\n'
+        "\n"
+        '{"sku": "AKKO-1", "name": "Akko Keycaps", "category": "Keycaps", "price": "3900",'
+        ' "quantity": 4, "discount_percentage": 10}\n'
+        '{"sku": "BAD", "name": "Broken", "category": "Switches", "price": "free"}\n'
+    )
+
+    out, err = StringIO(), StringIO()
+    call_command(
+        "import_catalog",
+        str(tmp_path / "catalog.jsonl"),
+        batch_size=1,
+        skip_images=True,
+        stdout=out,
+        stderr=err,
+    )
+
+    assert "Imported 2 rows" in out.getvalue()
+    assert "row 3: price is not an integer" in err.getvalue()
+    updated = Product.objects.get(sku="GAT-Y")
+    assert (updated.name, updated.price, updated.category.name) == (
+        "Gateron Yellow",
+        45,
+        "Switches",
+    )
+    assert Product.objects.get(sku="AKKO-1").discount_percentage == 10
+    assert list(Product.search_by_name("akko")) == [Product.objects.get(sku="AKKO-1")]
+    assert Product.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_import_refreshes_only_affected_related_products(models_logic_category):
+    from inventory.importer import CatalogImporter
+    from inventory.models import RelatedProduct
+
+    mice = Category.objects.create(name="Mice")
+    Product.objects.bulk_create(
+        Product(name=f"Mouse {i}", price=1000 + i, category=mice) for i in range(3)
+    )
+    rebuild_related_products()
+    untouched = set(
+        RelatedProduct.objects.filter(product__category=mice).values_list(
+            "pk", flat=True
+        )
+    )
+
+    importer = CatalogImporter()
+    list(
+        importer.run(
+            {"sku": f"SW-{i}", "name": f"Switch {i}", "category": "Switches"}
+            for i in range(3)
+        )
+    )
+
+    # Other categories keep their rows; the imported products get theirs
+    assert untouched == set(
+        RelatedProduct.objects.filter(product__category=mice).values_list(
+            "pk", flat=True
+        )
+    )
+    for product in Product.objects.filter(sku__startswith="SW-"):
+        assert len(related_products(product)) == 2
+        assert product.related_entries.count() == 2
+
+
+@pytest.mark.django_db
+def test_import_refreshes_related_products_in_batches(models_logic_category, settings):
+    from inventory.importer import CatalogImporter
+
+    rows = [
+        {"sku": f"SW-{i}", "name": f"Switch {i}", "category": "Switches"}
+        for i in range(5)
+    ]
+    with patch(
+        "inventory.importer.refresh_related_products",
+        wraps=refresh_related_products,
+    ) as refresh:
+        list(CatalogImporter(batch_size=2).run(rows))
+    assert [len(call.args[0]) for call in refresh.call_args_list] == [2, 2, 1]
+    for product in Product.objects.filter(sku__startswith="SW-"):
+        assert product.related_entries.count() == 4
+
+    settings.CATALOG_RELATED_REFRESH_LIMIT = 4
+    with (
+        patch("inventory.importer.refresh_related_products") as refresh,
+        patch(
+            "inventory.importer.rebuild_related_products",
+            wraps=rebuild_related_products,
+        ) as rebuild,
+    ):
+        list(CatalogImporter(batch_size=2).run(rows))
+    refresh.assert_not_called()
+    rebuild.assert_called_once_with()
+
+
+@pytest.mark.django_db
+def test_export_feed_writes_cached_xml_feed(models_logic_category, settings, tmp_path):
+    settings.CATALOG_FEED_DIR = tmp_path / "feeds"
+    Product.objects.create(
+        sku="GAT-Y",
+        name="Switches <Yellow>",
+        price=4500,
+        category=models_logic_category,
+    )
+
+    out = StringIO()
+    call_command(
+        "export_feed",
+        format="xml",
+        base_url="https://shop.example",
+        output=str(tmp_path / "feed.xml.gz"),
+        stdout=out,
+    )
+
+    feed = gzip.decompress((tmp_path / "feed.xml.gz").read_bytes()).decode()
+    assert "<title>Switches &lt;Yellow&gt;</title>" in feed
+    assert "<sku>GAT-Y</sku><title>" in feed
+    assert "<link>https://shop.example/en/product/" in feed
+    assert out.getvalue().strip().startswith(str(tmp_path / "feeds" / "products-"))
+
+
+@pytest.mark.django_db
+def test_related_products_rank_category_price_and_co_purchases(
+    models_logic_category, django_assert_num_queries
+):
+    other_category = Category.objects.create(name="Keycaps")
+    product, near, far, bought = Product.objects.bulk_create(
+        [
+            Product(name="Base", price=10000, category=models_logic_category),
+            Product(name="Near", price=9500, category=models_logic_category),
+            Product(name="Far", price=1000, category=models_logic_category),
+            Product(name="Bought", price=2000, category=other_category),
+        ]
+    )
+    order = Order.objects.create(total_cents=1, status=Order.STATUS_PAID)
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=p, quantity=1, unit_price_cents=1)
+        for p in (product, bought)
+    )
+
+    assert rebuild_related_products(limit=2) == 4
+    with django_assert_num_queries(1):
+        assert related_products(product, limit=2) == [bought, near]
+
+    far.price = 9900
+    far.save()
+    assert refresh_related_products([far.pk], limit=2) == 3
+    assert related_products(near, limit=2) == [far, product]
+
+
+@pytest.mark.django_db
+def test_related_products_refresh_after_save_and_delete(
+    models_logic_category, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        first = Product.objects.create(
+            name="First", price=1000, category=models_logic_category
+        )
+        second = Product.objects.create(
+            name="Second", price=1100, category=models_logic_category
+        )
+    assert related_products(first) == [second]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        third = Product.objects.create(
+            name="Third", price=1050, category=models_logic_category
+        )
+        second.delete()
+    assert related_products(first) == [third]
+    assert first.related_entries.count() == 1
+
+
+@pytest.mark.django_db
+def test_build_recommendations_ranks_by_cosine_and_updates_incrementally(
+    models_logic_category,
+):
+    a, b, c = Product.objects.bulk_create(
+        Product(name=name, category=models_logic_category) for name in "ABC"
+    )
+    for basket in ([a, b], [a, b], [a, c], [b]):
+        order = Order.objects.create(total_cents=1, status=Order.STATUS_PAID)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=p, quantity=1, unit_price_cents=1)
+            for p in basket
+        )
+
+    run = build_recommendations(chunk_size=1)
+    assert (run.full, run.orders) == (True, 4)
+    assert also_bought(a) == [b, c]
+    assert also_bought(b) == [a]
+    assert a.neighbour_entries.get(rank=0).similarity == pytest.approx(2 / 3)
+
+    order = Order.objects.create(total_cents=1)
+    OrderItem.objects.bulk_create(
+        OrderItem(order=order, product=p, quantity=1, unit_price_cents=1)
+        for p in (b, c)
+    )
+    order.set_status("paid")
+    run = build_recommendations()
+    assert (run.full, run.orders, run.products) == (False, 1, 3)
+    assert also_bought(b) == [a, c]
+    assert also_bought(c) == [a, b]
+    assert also_bought_with([a.pk, b.pk]) == [c]
+
+
+@pytest.mark.django_db
+def test_product_page_queries_do_not_grow_with_reviews(client, models_logic_category):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from review.models import Comment
+
+    product = Product.objects.create(name="Board", category=models_logic_category)
+    url = reverse("inventory:product", args=[product.pk])
+
+    def page_queries():
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(url).status_code == 200
+        return len(queries)
+
+    def add_reviews(start, count):
+        for i in range(start, start + count):
+            user = Account.objects.create_user(username=f"reader{i}")
+            review = Review.objects.create(user=user, product=product, rating=5)
+            Comment.objects.create(review=review, user=user, message="Agreed")
+
+    add_reviews(0, 2)
+    page_queries()  # warm the navigation and listing caches
+    baseline = page_queries()
+    add_reviews(2, 30)
+    assert page_queries() == baseline
+
+
+@pytest.mark.django_db
+def test_product_page_answers_conditional_gets(
+    client, models_logic_category, django_assert_max_num_queries
+):
+    from django.urls import reverse
+    from django.utils.http import http_date
+    from review.models import Comment
+
+    product = Product.objects.create(name="Board", category=models_logic_category)
+    reader = Account.objects.create_user(username="reader")
+    review = Review.objects.create(user=reader, product=product, rating=5)
+    url = reverse("inventory:product", args=[product.pk])
+
+    client.get(url)  # sets the CSRF cookie, which the validators include
+    response = client.get(url)
+    etag = response["ETag"]
+    assert "no-cache" in response["Cache-Control"]
+    assert response["Last-Modified"]
+    with django_assert_max_num_queries(2):
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert (
+        client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code
+        == 304
+    )
+
+    # Comments only move the product's updated_at, not the catalog version
+    Comment.objects.create(review=review, user=reader, message="Agreed")
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    assert (
+        client.get(f"{url}?review_sort=newest", HTTP_IF_NONE_MATCH=etag).status_code
+        == 200
+    )
+    french = reverse("inventory:product", args=[product.pk]).replace("/en/", "/fr/")
+    assert client.get(french, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    # Logging in changes the navigation, so neither validator may match
+    client.force_login(reader)
+    response = client.get(
+        url,
+        HTTP_IF_NONE_MATCH=etag,
+        HTTP_IF_MODIFIED_SINCE=http_date(),
+    )
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+    assert "Last-Modified" not in response
+    assert client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code == 304
+
+
+@pytest.mark.django_db
+def test_listing_validators_follow_catalog_changes(client, models_logic_category):
+    from django.urls import reverse
+
+    url = reverse("inventory:index")
+    client.get(url)  # sets the CSRF cookie, which the validators include
+    etag = client.get(url)["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    Product.objects.create(name="Board", category=models_logic_category)
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    category_url = reverse("inventory:category", args=[models_logic_category.pk])
+    etag = client.get(category_url)["ETag"]
+    assert client.get(category_url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+    assert client.get(reverse("inventory:category", args=[0])).status_code == 404
@@ -34,6 +34,31 @@ def test_get_discounted_price(models_logic_category):
     assert prod_regular.get_discounted_price() == 15000
 
 
+@pytest.mark.django_db
+def test_get_discounted_price_follows_in_memory_edits(
+    models_logic_category, django_assert_num_queries
+):
+    """
+    Verify a loaded product uses its stored sale price until price or discount is edited.
+    """
+    Product.objects.create(
+        name="Edited Keyboard",
+        price=10000,
+        quantity=5,
+        category=models_logic_category,
+        discount_percentage=10,
+    )
+    product = Product.objects.get(name="Edited Keyboard")
+    with django_assert_num_queries(0):
+        assert product.get_discounted_price() == 9000
+
+    product.discount_percentage = 25
+    assert product.get_discounted_price() == 7500
+    product.price = 20000
+    assert product.get_discounted_price() == 15000
+    assert product.discounted_price_in_dollars == "$150.00"
+
+
 @pytest.mark.django_db
 def test_price_in_dollars_properties(models_logic_category):
     """
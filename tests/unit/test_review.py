@@ -1,6 +1,9 @@
 import pytest
+from django.contrib.auth import get_user_model
 from review.models import Review, Vote, Comment, Flag
 
+User = get_user_model()
+
 
 @pytest.mark.django_db
 def test_review_creation(review_setup):
@@ -69,3 +72,98 @@ def test_unique_flag_constraint(flag_setup):
     user1, review, flag1, flag2 = flag_setup
     with pytest.raises(Exception):
         Flag.objects.create(review=review, user=user1, flag_type="off-topic")
+
+
+@pytest.mark.django_db
+def test_stored_rating_follows_reviews(review_setup):
+    product1, product2, review1, review2, review3 = review_setup
+    product1.refresh_from_db()
+    assert (product1.rating_sum, product1.rating_count) == (9, 2)
+    assert product1.rating_average == 4.5
+
+    review1.delete()
+    product1.refresh_from_db()
+    assert (product1.rating_sum, product1.rating_count) == (4, 1)
+    assert product1.rating_average == 4
+
+
+@pytest.mark.django_db
+def test_stored_rating_excludes_over_flagged_reviews(review_setup):
+    product1, product2, review1, review2, review3 = review_setup
+    flaggers = [
+        User.objects.create_user(username=f"flagger{i}", password="pw")
+        for i in range(Review.FLAG_THRESHOLD + 1)
+    ]
+    for flagger in flaggers[:-1]:
+        Flag.create_flag(flagger, review1, "fake")
+    assert Review.rating_average(product1) == 4.5
+
+    flag, _ = Flag.create_flag(flaggers[-1], review1, "fake")
+    assert Review.rating_average(product1) == 4
+    product1.refresh_from_db()
+    assert product1.rating_count == 1
+
+    flag.delete()
+    assert Review.rating_average(product1) == 4.5
+
+    Flag.objects.create(review=review1, user=flaggers[-1], flag_type="fake")
+    review1.delete()
+    product1.refresh_from_db()
+    assert (product1.rating_sum, product1.rating_count) == (4, 1)
+
+
+def _add_reviews(product, start, count):
+    for i in range(start, start + count):
+        user = User.objects.create_user(username=f"reviewer{i}")
+        review = Review.objects.create(user=user, product=product, rating=4)
+        Vote.objects.create(user=user, review=review)
+        Flag.objects.create(user=user, review=review, flag_type="fake")
+        for n in range(i % 5):
+            Comment.objects.create(review=review, user=user, message=f"comment {n}")
+
+
+@pytest.mark.django_db
+def test_review_feed_pages_in_one_query_per_page(
+    review_setup, django_assert_num_queries
+):
+    from inventory.pagination import KeysetPaginator
+
+    product1, product2, review1, review2, review3 = review_setup
+    _add_reviews(product1, 0, 23)
+    Vote.objects.create(user=review2.user, review=review1)
+    Vote.objects.create(user=review3.user, review=review1)
+    Vote.objects.create(user=review1.user, review=review1)
+    Vote.objects.filter(user=review1.user, review=review1).delete()
+
+    paginator = KeysetPaginator(Review.feed(product1, "helpful"), per_page=10)
+    seen = []
+    cursor = None
+    while True:
+        with django_assert_num_queries(1):
+            page = paginator.page(cursor)
+            # The author is selected with the page, not loaded per review
+            for review in page:
+                seen.append(
+                    (
+                        review.pk,
+                        review.user.username,
+                        review.flags_count,
+                        review.comments_count,
+                    )
+                )
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    assert len(seen) == 25
+    assert seen[0][:2] == (review1.pk, review1.user.username)
+    review1.refresh_from_db()
+    assert review1.votes_count == 2
+    busiest = Review.feed(product1).get(user__username="reviewer4")
+    assert (busiest.votes_count, busiest.flags_count, busiest.comments_count) == (
+        1,
+        1,
+        4,
+    )
+    assert [r.rating for r in Review.feed(product1, "rating")][:1] == [5]
+    newest = Review.feed(product1, "newest").first()
+    assert newest.user.username == "reviewer22"
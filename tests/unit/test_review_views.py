@@ -281,3 +281,30 @@ def test_flag_submit_already_flagged(
     messages = list(get_messages(response.wsgi_request))
     assert len(messages) == 1
     assert "already flagged" in str(messages[0])
+
+
+@pytest.mark.django_db
+def test_comments_fragment_loads_in_pages(
+    test_client: Client,
+    comment_setup,
+    settings,
+) -> None:
+    """GET comments returns a page of a review's comments with a link to the next one."""
+    settings.REVIEW_COMMENTS_PAGE_SIZE = 2
+    review, comment1, comment2 = comment_setup
+    for n in range(3):
+        Comment.objects.create(review=review, user=comment1.user, message=f"extra {n}")
+    url = reverse("review:comments", kwargs={"review_id": review.id})
+
+    response = test_client.get(url)
+    assert response.status_code == 200
+    assert [c.message for c in response.context["page"]] == ["extra 2", "extra 1"]
+    next_url = f"{url}?cursor={response.context['page'].next_cursor}"
+    assert next_url in response.content.decode()
+
+    response = test_client.get(next_url)
+    assert [c.message for c in response.context["page"]] == [
+        "extra 0",
+        comment2.message,
+    ]
+    assert response.context["page"].has_next